@@ -0,0 +1,141 @@
+"""Segment write throughput against a moto backed dynamodb table.
+
+Compares one UpdateItem per segment (`upsert` in a TaskGroup) with the
+BatchWriteItem path (`upsert_multi`). `--throttle-rate` makes a fraction of the
+batch requests fail with ProvisionedThroughputExceededException and return half
+of their items as unprocessed, to exercise the retry and backoff path.
+
+    python benchmarks/batch_writes.py --segments 5000
+"""
+
+import asyncio
+import datetime as dt
+import os
+import random
+import time
+from typing import Any
+
+import boto3
+import numpy as np
+import typer
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from vidoso.repo.batch_writer import BatchWriter
+from vidoso.repo.clients import ThreadedDynamoDBClient
+from vidoso.repo.schemas import SegmentDb, encode_embedding
+from vidoso.repo.segments import TABLE_NAME, SegmentsRepo
+
+app = typer.Typer()
+
+
+class ThrottlingClient:
+    def __init__(self, dynamodb_client: Any, throttle_rate: float) -> None:
+        self.dynamodb_client = dynamodb_client
+        self.throttle_rate = throttle_rate
+        self.throttled = 0
+        self.unprocessed = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.dynamodb_client, name)
+
+    def batch_write_item(self, RequestItems: dict[str, Any]) -> dict[str, Any]:
+        if random.random() < self.throttle_rate:
+            self.throttled += 1
+            raise ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException"}},
+                "BatchWriteItem",
+            )
+        response = self.dynamodb_client.batch_write_item(RequestItems=RequestItems)
+        if random.random() < self.throttle_rate:
+            (table_name, requests), *_ = RequestItems.items()
+            unprocessed = requests[len(requests) // 2 :]
+            self.unprocessed += len(unprocessed)
+            response["UnprocessedItems"] = {table_name: unprocessed}
+        return response
+
+
+def create_segments_table(dynamodb_client: Any) -> None:
+    dynamodb_client.create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "transcript_id", "KeyType": "HASH"},
+            {"AttributeName": "segment_id", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "transcript_id", "AttributeType": "S"},
+            {"AttributeName": "segment_id", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def make_segments(n: int, dim: int, transcript_id: str) -> list[SegmentDb]:
+    rng = np.random.default_rng(0)
+    now = dt.datetime.now()
+    segments = []
+    for i in range(n):
+        embedding, embedding_format = encode_embedding(rng.random(dim))
+        segments.append(
+            SegmentDb(
+                transcript_id=transcript_id,
+                segment_id=i,
+                user="benchmark",
+                created_at=now,
+                stream_url="https://www.youtube.com/watch?v=benchmark",
+                start=i,
+                end=i + 1,
+                text=f"segment number {i}",
+                embedding=embedding,
+                embedding_format=embedding_format,
+            )
+        )
+    return segments
+
+
+async def write_one_by_one(repo: SegmentsRepo, segments: list[SegmentDb]) -> None:
+    async with asyncio.TaskGroup() as tg:
+        for segment in segments:
+            tg.create_task(repo.upsert(segment=segment))
+
+
+@app.command()
+def main(
+    segments: int = 2_000,
+    dim: int = 768,
+    max_in_flight: int = 8,
+    throttle_rate: float = 0.0,
+) -> None:
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb")
+        create_segments_table(dynamodb_client)
+        client = ThrottlingClient(dynamodb_client, throttle_rate=throttle_rate)
+        async_client = ThreadedDynamoDBClient(client)
+        repo = SegmentsRepo(
+            dynamodb_client=async_client,
+            batch_writer=BatchWriter(
+                dynamodb_client=async_client,
+                max_in_flight=max_in_flight,
+                backoff_base_ms=5,
+            ),
+        )
+
+        for name, write in [
+            ("update_item", write_one_by_one),
+            ("batch_write_item", lambda r, s: r.upsert_multi(segments=s)),
+        ]:
+            batch = make_segments(segments, dim=dim, transcript_id=name)
+            start = time.perf_counter()
+            asyncio.run(write(repo, batch))
+            elapsed = time.perf_counter() - start
+            typer.echo(
+                f"{name:>16}: {segments} segments in {elapsed:.2f}s "
+                f"({segments / elapsed:,.0f} segments/s)"
+            )
+        if throttle_rate:
+            typer.echo(f"throttled={client.throttled} unprocessed={client.unprocessed}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,205 @@
+"""Synthetic corpora, moto backed tables and stub models for the benchmarks.
+
+Imported by the benchmark scripts (`from corpus import ...`), not a script of
+its own. The stubs stand in for whisper and the sentence transformer so the
+benchmarks measure the code around the models, with no model download.
+"""
+
+import contextlib
+import datetime as dt
+import hashlib
+import json
+import os
+import random
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+from vidoso.config import Settings
+from vidoso.repo import jobs, segments
+from vidoso.repo.schemas import SegmentDb, encode_embedding
+from vidoso.services.transcription import Transcript, transcript_segment
+
+WORDS = (
+    "the a video about how to make build learn quick easy guide best new "
+    "python code cooking travel music game review first time world people "
+    "really going think know just like right now today here there"
+).split()
+
+
+def create_segments_table(dynamodb_client: Any) -> None:
+    dynamodb_client.create_table(
+        TableName=segments.TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "transcript_id", "KeyType": "HASH"},
+            {"AttributeName": "segment_id", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "transcript_id", "AttributeType": "S"},
+            {"AttributeName": "segment_id", "AttributeType": "N"},
+            {"AttributeName": "user", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "N"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "user-index",
+                "KeySchema": [
+                    {"AttributeName": "user", "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def create_jobs_table(dynamodb_client: Any) -> None:
+    dynamodb_client.create_table(
+        TableName=jobs.TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "job_id", "KeyType": "HASH"},
+            {"AttributeName": "created_at", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "job_id", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "N"},
+            {"AttributeName": "user", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "user-index",
+                "KeySchema": [
+                    {"AttributeName": "user", "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+@contextlib.contextmanager
+def moto_tables() -> Iterator[Any]:
+    # an in memory dynamodb with the `segments` and `jobs` tables
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb")
+        create_segments_table(dynamodb_client)
+        create_jobs_table(dynamodb_client)
+        yield dynamodb_client
+
+
+def benchmark_settings(**overrides: Any) -> Settings:
+    settings = Settings(
+        version="benchmark",
+        base_url="",
+        docs_url="",
+        openapi_url="",
+        whisper_model="base",
+        **overrides,
+    )
+    return settings
+
+
+def random_text(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 40)))
+
+
+def random_embeddings(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    # gaussian vectors, L2-normalized on encode like the real ones
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def make_segments(
+    user: str,
+    n: int,
+    dim: int = 768,
+    segments_per_transcript: int = 200,
+    seed: int = 0,
+    legacy: bool = False,
+) -> list[SegmentDb]:
+    # `n` segments of `user`, split in transcripts like ingested videos.
+    # `legacy` stores the embeddings as json lists instead of binary float32
+    rng = random.Random(seed)
+    now = dt.datetime.now()
+    corpus = []
+    for i, embedding in enumerate(random_embeddings(n, dim, seed=seed)):
+        transcript, segment_id = divmod(i, segments_per_transcript)
+        if legacy:
+            embedding_data, embedding_format = json.dumps(embedding.tolist()), None
+        else:
+            embedding_data, embedding_format = encode_embedding(embedding)
+        corpus.append(
+            SegmentDb(
+                transcript_id=f"{user}-{transcript}",
+                segment_id=segment_id,
+                user=user,
+                created_at=now + dt.timedelta(microseconds=i),
+                stream_url=f"https://www.youtube.com/watch?v={user}-{transcript}",
+                start=segment_id * 5,
+                end=segment_id * 5 + 5,
+                text=random_text(rng),
+                embedding=embedding_data,
+                embedding_format=embedding_format,
+            )
+        )
+    return corpus
+
+
+class StubTranscriber:
+    # yields `segments` random segments for any audio, instantly
+    def __init__(self, segments: int, seed: int = 0) -> None:
+        self.segments = segments
+        self.seed = seed
+
+    def transcribe(self, audio: str | np.ndarray, language: str = "en") -> Transcript:
+        segments = list(self.iter_segments(audio, language=language))
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "language": language,
+            "segments": segments,
+        }
+
+    def iter_segments(
+        self, audio: str | np.ndarray, language: str = "en"
+    ) -> Iterator[dict]:
+        rng = random.Random(self.seed)
+        for i in range(self.segments):
+            yield transcript_segment(i, i * 5, i * 5 + 5, random_text(rng))
+
+
+class StubEncoder:
+    # deterministic per text, so the embedding cache and the searches behave as
+    # with a real model
+    def __init__(self, dim: int = 768) -> None:
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+        return np.vstack(
+            [
+                np.random.default_rng(
+                    int.from_bytes(hashlib.sha256(text.encode()).digest()[:8])
+                ).standard_normal(self.dim, dtype=np.float32)
+                for text in texts
+            ]
+        ).reshape(len(texts), self.dim)
+
+
+class StubAudioCache:
+    # every stream url resolves to the same (never read) path
+    def fetch(self, stream_url: str) -> Path:
+        return Path(os.devnull)
+
+    @contextlib.contextmanager
+    def pin(self, path: Path) -> Iterator[Path]:
+        yield path
@@ -0,0 +1,157 @@
+"""DynamoDB read latency per client backend, against a local moto server.
+
+Runs `JobsRepo.get_by_job_id` with `--concurrency` callers for each of:
+
+- `boto3-per-call`: a new boto3 client per call run through `asyncio.to_thread`,
+  the api behaviour before the process wide client
+- `boto3`: one shared boto3 client, calls run through `asyncio.to_thread`
+- `aiobotocore`: one shared aiobotocore client with its own connection pool
+
+    python benchmarks/dynamodb_latency.py --requests 2000 --concurrency 32
+"""
+
+import asyncio
+import datetime as dt
+import logging
+import os
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+import boto3
+import typer
+from moto.server import ThreadedMotoServer
+
+from vidoso.config import DynamoDBBackend, Settings
+from vidoso.repo.clients import DynamoDBClientPool, ThreadedDynamoDBClient
+from vidoso.repo.jobs import TABLE_NAME, JobsRepo
+from vidoso.repo.schemas import JobDb, JobStatus
+
+app = typer.Typer()
+
+
+def create_jobs_table(endpoint_url: str) -> None:
+    boto3.client("dynamodb", endpoint_url=endpoint_url).create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "job_id", "KeyType": "HASH"},
+            {"AttributeName": "created_at", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "job_id", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+async def measure(
+    get: Callable[[str], Awaitable[JobDb]],
+    job_ids: list[str],
+    requests: int,
+    concurrency: int,
+) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await get(job_ids[i % len(job_ids)])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_backend(
+    name: str,
+    settings: Settings,
+    jobs: list[JobDb],
+    requests: int,
+    concurrency: int,
+) -> None:
+    dynamodb_client_pool = DynamoDBClientPool()
+    if name == "boto3-per-call":
+
+        async def get(job_id: str) -> JobDb:
+            dynamodb_client = ThreadedDynamoDBClient(boto3.client("dynamodb"))
+            return await JobsRepo(dynamodb_client).get_by_job_id(job_id=job_id)
+
+    else:
+        jobs_repo = JobsRepo(await dynamodb_client_pool.open(settings=settings))
+        get = jobs_repo.get_by_job_id
+
+    job_ids = [job.job_id for job in jobs if job.job_id]
+    await measure(get, job_ids, requests=concurrency, concurrency=concurrency)
+    latencies, elapsed = await measure(
+        get, job_ids, requests=requests, concurrency=concurrency
+    )
+    await dynamodb_client_pool.close()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    typer.echo(
+        f"{name:>15}: p50={quantiles[49]:6.2f}ms p95={quantiles[94]:6.2f}ms "
+        f"p99={quantiles[98]:6.2f}ms {requests / elapsed:8,.0f} req/s"
+    )
+
+
+@app.command()
+def main(
+    requests: int = 1_000,
+    concurrency: int = 16,
+    port: int = 5_055,
+) -> None:
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    endpoint_url = f"http://127.0.0.1:{port}"
+    os.environ["AWS_ENDPOINT_URL"] = endpoint_url
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    try:
+        create_jobs_table(endpoint_url)
+        jobs = [
+            JobDb(
+                user="benchmark",
+                created_at=dt.datetime.now(),
+                status=JobStatus.DONE,
+                stream_url=f"https://www.youtube.com/watch?v={i}",
+            )
+            for i in range(100)
+        ]
+        seed_repo = JobsRepo(ThreadedDynamoDBClient(boto3.client("dynamodb")))
+        asyncio.run(seed_repo.upsert_multi(jobs=jobs))
+
+        for name, backend in [
+            ("boto3-per-call", DynamoDBBackend.BOTO3),
+            ("boto3", DynamoDBBackend.BOTO3),
+            ("aiobotocore", DynamoDBBackend.AIOBOTOCORE),
+        ]:
+            settings = Settings(
+                version="benchmark",
+                base_url="",
+                docs_url="",
+                openapi_url="",
+                whisper_model="base",
+                dynamodb_backend=backend,
+                dynamodb_max_pool_connections=concurrency,
+            )
+            asyncio.run(
+                run_backend(
+                    name,
+                    settings=settings,
+                    jobs=jobs,
+                    requests=requests,
+                    concurrency=concurrency,
+                )
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    app()
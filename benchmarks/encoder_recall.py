@@ -0,0 +1,155 @@
+"""Search recall of the onnx encoder backends against the torch fp32 baseline.
+
+Encodes the fixture corpus (`fixtures/encoder_recall.json`, or `--fixture`) with
+every backend, writes it as one user per backend to a moto backed segments
+table and runs the fixture queries through `SearchService`. Reports the mean
+top-k overlap of each backend's hits with the torch hits, and the query encode
+time. Exits with status 1 when a backend's overlap is below `--min-overlap`.
+
+The onnx backends load the graphs of `vidoso export-encoder`, export them first:
+
+    vidoso export-encoder --export-dir /tmp/vidoso/encoders
+    python benchmarks/encoder_recall.py --export-dir /tmp/vidoso/encoders --k 5
+"""
+
+import asyncio
+import datetime as dt
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import boto3
+import typer
+from corpus import benchmark_settings, moto_tables
+
+from vidoso.config import EncoderBackend, Settings
+from vidoso.repo.batch_writer import BatchWriter
+from vidoso.repo.clients import ThreadedDynamoDBClient
+from vidoso.repo.schemas import SegmentDb, encode_embedding
+from vidoso.repo.segments import SegmentsRepo
+from vidoso.services.embedding_cache import EmbeddingCache
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.index_builder import IndexBuilder
+from vidoso.services.index_cache import IndexCache
+from vidoso.services.search import SearchService
+from vidoso.services.sentence_encoding import encoder_name, load_sentence_transformer
+
+FIXTURE = Path(__file__).parent / "fixtures" / "encoder_recall.json"
+
+app = typer.Typer()
+
+
+async def backend_hits(
+    segments_repo: SegmentsRepo,
+    settings: Settings,
+    backend: EncoderBackend,
+    texts: list[str],
+    queries: list[str],
+    k: int,
+    **options: Any,
+) -> tuple[list[list[int]], float]:
+    sentence_transformer = load_sentence_transformer(
+        settings.sentence_transformer_model, backend, device="cpu", **options
+    )
+    embedding_cache = EmbeddingCache(
+        model_name=encoder_name(settings.sentence_transformer_model, backend),
+        max_items=0,
+    )
+    encode = partial(embedding_cache.encode, sentence_transformer)
+
+    now = dt.datetime.now()
+    segments = []
+    for i, (text, embedding) in enumerate(zip(texts, encode(texts))):
+        embedding, embedding_format = encode_embedding(embedding)
+        segments.append(
+            SegmentDb(
+                transcript_id=f"{backend}",
+                segment_id=i,
+                user=f"{backend}",
+                created_at=now,
+                stream_url="https://www.youtube.com/watch?v=fixture",
+                start=i,
+                end=i + 1,
+                text=text,
+                embedding=embedding,
+                embedding_format=embedding_format,
+            )
+        )
+    await segments_repo.upsert_multi(segments=segments)
+
+    search_svc = SearchService(
+        segments_repo=segments_repo,
+        encode_batcher=EncodeBatcher(encode=encode, max_batch_size=64, max_wait_ms=0),
+        index_cache=IndexCache(max_users=8, max_segments=100_000, ttl_seconds=300),
+        index_builder=IndexBuilder(settings=settings),
+        executor=ThreadPoolExecutor(max_workers=1),
+    )
+    start = time.perf_counter()
+    results = await search_svc.search(
+        users=[f"{backend}"], k=k, text=queries, embeddings=[]
+    )
+    elapsed = time.perf_counter() - start
+    hits = [[hit["segment_id"] for hit in row] for row in results["text"]]
+    return hits, elapsed
+
+
+@app.command()
+def main(
+    fixture: Path = FIXTURE,
+    k: int = 5,
+    backend: list[EncoderBackend] = [EncoderBackend.ONNX, EncoderBackend.ONNX_INT8],
+    export_dir: str = Settings.model_fields["sentence_transformer_export_dir"].default,
+    quantization: str = Settings.model_fields[
+        "sentence_transformer_quantization"
+    ].default,
+    min_overlap: float = 0.8,
+) -> None:
+    settings = benchmark_settings()
+    corpus = json.loads(fixture.read_text())
+    texts, queries = corpus["segments"], corpus["queries"]
+
+    with moto_tables():
+        async_client = ThreadedDynamoDBClient(boto3.client("dynamodb"))
+        segments_repo = SegmentsRepo(
+            dynamodb_client=async_client,
+            batch_writer=BatchWriter(dynamodb_client=async_client),
+        )
+
+        # torch fp32 first, it is the baseline
+        backends = [EncoderBackend.TORCH] + [
+            b for b in dict.fromkeys(backend) if b != EncoderBackend.TORCH
+        ]
+        hits: dict[EncoderBackend, list[list[int]]] = {}
+        failed = False
+        for b in backends:
+            hits[b], elapsed = asyncio.run(
+                backend_hits(
+                    segments_repo,
+                    settings,
+                    b,
+                    texts,
+                    queries,
+                    k,
+                    export_dir=export_dir,
+                    quantization=quantization,
+                )
+            )
+            overlaps = [
+                len(set(row) & set(baseline)) / max(1, len(baseline))
+                for row, baseline in zip(hits[b], hits[EncoderBackend.TORCH])
+            ]
+            overlap = sum(overlaps) / len(overlaps)
+            failed |= overlap < min_overlap
+            typer.echo(
+                f"{b:>10}: top-{k} overlap {overlap:.3f} (min {min(overlaps):.2f}), "
+                f"{len(queries)} queries searched in {elapsed * 1000:.0f}ms"
+            )
+    if failed:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
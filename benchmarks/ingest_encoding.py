@@ -0,0 +1,131 @@
+"""Ingest encoding throughput, per job vs coalesced across jobs.
+
+Simulates `--jobs` concurrent ingest jobs (short videos, `--min-segments` to
+`--max-segments` segments each) whose transcriber hands segments to the embed
+stage a few at a time, and encodes them with the sentence transformer:
+
+- `per-job`: every job encodes its own small batches, the ingest behaviour
+  before the shared batcher
+- `coalesced`: the jobs' batches go through an `EncodeBatcher`, encoded together
+  in calls of up to `--max-batch-size` texts, `--batch-size` per forward pass
+
+Segment texts are unique and the embedding cache is disabled, every segment is
+encoded. Reports segments/s overall and per torch thread.
+
+    python benchmarks/ingest_encoding.py --jobs 32 --threads 4
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import typer
+
+from vidoso.config import Settings
+from vidoso.services.embedding_cache import EmbeddingCache
+from vidoso.services.encode_batcher import EncodeBatcher
+
+WORDS = (
+    "the a video about how to make build learn quick easy guide best new "
+    "python code cooking travel music game review first time world people "
+    "really going think know just like right now today here there"
+).split()
+
+app = typer.Typer()
+
+
+def job_texts(job: int, segments: int) -> list[str]:
+    return [
+        f"{job} {i} " + " ".join(random.choices(WORDS, k=random.randint(3, 40)))
+        for i in range(segments)
+    ]
+
+
+async def run_job(
+    texts: list[str],
+    encode: Callable[[list[str]], Awaitable[np.ndarray]],
+) -> None:
+    # segments arrive in small, uneven batches, as the transcriber produces them
+    i = 0
+    while i < len(texts):
+        n = random.randint(1, 8)
+        await encode(texts[i : i + n])
+        i += n
+
+
+async def measure(
+    jobs: list[list[str]],
+    encode: Callable[[list[str]], Awaitable[np.ndarray]],
+) -> float:
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as tg:
+        for texts in jobs:
+            tg.create_task(run_job(texts, encode))
+    return time.perf_counter() - start
+
+
+@app.command()
+def main(
+    model: str = Settings.model_fields["sentence_transformer_model"].default,
+    jobs: int = 32,
+    min_segments: int = 5,
+    max_segments: int = 60,
+    threads: int = 4,
+    batch_size: int = 64,
+    max_batch_size: int = 256,
+    max_wait_ms: float = 20,
+    seed: int = 0,
+) -> None:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    random.seed(seed)
+    sentence_transformer = SentenceTransformer(model, device="cpu")
+    sentence_transformer.encode(["warmup"])
+
+    # one encode thread, as in the worker, the torch threads do the work
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+    calls: list[int] = []
+
+    def encode(texts: list[str], batch_size: int = 32) -> np.ndarray:
+        calls.append(len(texts))
+        embedding_cache = EmbeddingCache(model_name=model, max_items=0)
+        return embedding_cache.encode(sentence_transformer, texts, batch_size)
+
+    async def per_job(texts: list[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, encode, texts)
+
+    encode_batcher = EncodeBatcher(
+        encode=partial(encode, batch_size=batch_size),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        executor=executor,
+    )
+
+    corpus = [
+        job_texts(job, random.randint(min_segments, max_segments))
+        for job in range(jobs)
+    ]
+    segments = sum(len(texts) for texts in corpus)
+    typer.echo(f"{jobs} jobs, {segments} segments, {threads} torch threads")
+    for name, encode_func in [
+        ("per-job", per_job),
+        ("coalesced", encode_batcher.encode),
+    ]:
+        calls.clear()
+        elapsed = asyncio.run(measure(corpus, encode_func))
+        typer.echo(
+            f"{name:>10}: {segments / elapsed:8.1f} segments/s, "
+            f"{segments / elapsed / threads:7.1f} segments/s/thread, "
+            f"{len(calls)} encode calls (mean {np.mean(calls):.1f} texts)"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,326 @@
+"""Micro-benchmarks of the search and ingest hot paths, stored as json.
+
+`run` measures, on synthetic users of `--sizes` segments (`--dim` dimensional
+embeddings) in moto backed `segments`/`jobs` tables and with stub models:
+
+- `decode`: `decode_embeddings` of a user's segments, binary and legacy json
+- `index_build`: `IndexBuilder.build` of a user's index from decoded embeddings
+- `write`: `SegmentsRepo.upsert_multi` of a user's segments
+- `index_load`: a cold `SearchService.get_user_index` (read, decode, build)
+- `search`: a warm `SearchService.search` of one text query, per `--ks`
+- `ingest`: `StreamProcessorService.process_stream` of `--ingest-segments`
+
+and writes the timings (milliseconds, with the commit and parameters) to
+`--output`. `compare` matches the results of two runs and exits with status 1
+when a median got slower than `--threshold`.
+
+    python benchmarks/suite.py run --output main.json
+    python benchmarks/suite.py run --output branch.json
+    python benchmarks/suite.py compare main.json branch.json --threshold 0.1
+"""
+
+import asyncio
+import datetime as dt
+import json
+import platform
+import statistics
+import subprocess
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import boto3
+import numpy as np
+import typer
+from corpus import (
+    StubAudioCache,
+    StubEncoder,
+    StubTranscriber,
+    benchmark_settings,
+    make_segments,
+    moto_tables,
+)
+
+from vidoso.config import SearchIndexType
+from vidoso.core.logger import logger
+from vidoso.repo.batch_writer import BatchWriter
+from vidoso.repo.clients import ThreadedDynamoDBClient
+from vidoso.repo.jobs import JobsRepo
+from vidoso.repo.schemas import JobDb, JobStatus, decode_embeddings
+from vidoso.repo.segments import SegmentsRepo
+from vidoso.services.embedding_cache import EmbeddingCache
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.index_builder import IndexBuilder
+from vidoso.services.index_cache import IndexCache
+from vidoso.services.search import SearchService
+from vidoso.services.stream_processor import StreamProcessorService
+
+app = typer.Typer()
+
+
+def timings(func: Callable[[], Any], repeats: int) -> list[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def a_timings(func: Callable[[], Awaitable[Any]], repeats: int) -> list[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def result(
+    name: str, params: dict[str, Any], samples: list[float], items: int | None = None
+) -> dict[str, Any]:
+    # `items` processed per sample give a throughput next to the latencies
+    median = statistics.median(samples)
+    stats = {
+        "name": name,
+        "params": params,
+        "repeats": len(samples),
+        "min_ms": min(samples),
+        "median_ms": median,
+        "p95_ms": float(np.percentile(samples, 95)),
+        "mean_ms": statistics.fmean(samples),
+    }
+    if items is not None:
+        stats["items_per_s"] = items / (median / 1000)
+    typer.echo(
+        f"{name:>12} {json.dumps(params):<36} median {median:9.2f}ms "
+        f"p95 {stats['p95_ms']:9.2f}ms"
+        + (f" ({stats['items_per_s']:,.0f}/s)" if items is not None else "")
+    )
+    return stats
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_repo_and_search(
+    segments_repo: SegmentsRepo,
+    index_builder: IndexBuilder,
+    sizes: list[int],
+    ks: list[int],
+    dim: int,
+    repeats: int,
+) -> list[dict[str, Any]]:
+    results = []
+    encode_batcher = EncodeBatcher(
+        encode=partial(
+            EmbeddingCache(model_name="stub", max_items=1_000).encode,
+            StubEncoder(dim),
+        ),
+        max_batch_size=32,
+        max_wait_ms=0,
+    )
+    for n in sizes:
+        user = f"user-{n}"
+        segments = make_segments(user, n, dim=dim)
+        # writes are measured once, every repeat would add n more items
+        samples = await a_timings(
+            lambda: segments_repo.upsert_multi(segments=segments), repeats=1
+        )
+        results.append(result("write", {"segments": n}, samples, items=n))
+
+        index_cache = IndexCache(max_users=8, max_segments=10 * n, ttl_seconds=3600)
+        search_svc = SearchService(
+            segments_repo=segments_repo,
+            encode_batcher=encode_batcher,
+            index_cache=index_cache,
+            index_builder=index_builder,
+            executor=ThreadPoolExecutor(max_workers=4),
+        )
+
+        async def load_index() -> None:
+            index_cache.invalidate(user)
+            await search_svc.get_user_index(user)
+
+        samples = await a_timings(load_index, repeats=max(1, repeats // 10))
+        results.append(result("index_load", {"segments": n}, samples, items=n))
+
+        for k in ks:
+            # the same query every time, hits the embedding cache like a repeated
+            # search would, so the encoder is out of the measure
+            samples = await a_timings(
+                partial(
+                    search_svc.search,
+                    users=[user],
+                    k=k,
+                    text=["how to make a quick video"],
+                    embeddings=[],
+                ),
+                repeats=repeats,
+            )
+            results.append(result("search", {"segments": n, "k": k}, samples))
+    return results
+
+
+async def bench_ingest(
+    segments_repo: SegmentsRepo,
+    jobs_repo: JobsRepo,
+    segments: int,
+    dim: int,
+    repeats: int,
+) -> list[dict[str, Any]]:
+    stream_processor_svc = StreamProcessorService(
+        jobs_repo=jobs_repo,
+        segments_repo=segments_repo,
+        transcriber=StubTranscriber(segments),
+        encode_batcher=EncodeBatcher(
+            # no cache, every segment is encoded
+            encode=partial(
+                EmbeddingCache(model_name="stub", max_items=0).encode,
+                StubEncoder(dim),
+            ),
+            max_batch_size=256,
+            max_wait_ms=0,
+        ),
+        audio_cache=StubAudioCache(),
+        transcripts_repo=None,
+        transcript_version="benchmark",
+    )
+
+    async def ingest() -> None:
+        job = JobDb(
+            user="ingest",
+            created_at=dt.datetime.now(),
+            status=JobStatus.PROCESSING,
+            stream_url="https://www.youtube.com/watch?v=ingest",
+        )
+        job = await jobs_repo.upsert(job=job)
+        await stream_processor_svc.process_stream(
+            stream_url=job.stream_url, user=job.user, job=job
+        )
+
+    samples = await a_timings(ingest, repeats=repeats)
+    return [result("ingest", {"segments": segments}, samples, items=segments)]
+
+
+@app.command()
+def run(
+    output: Path = Path("benchmark-results.json"),
+    sizes: list[int] = [1_000, 10_000],
+    ks: list[int] = [1, 10, 100],
+    dim: int = 768,
+    repeats: int = 20,
+    index_type: SearchIndexType = SearchIndexType.FLAT,
+    ingest_segments: int = 1_000,
+) -> None:
+    """Run the benchmarks and write their results to `output`."""
+    # per segment logs would be measured with the code
+    logger.setLevel("WARNING")
+    settings = benchmark_settings(search_index_type=index_type)
+    index_builder = IndexBuilder(settings=settings)
+
+    results = []
+    for n in sizes:
+        for legacy in (False, True):
+            segments = make_segments(f"user-{n}", n, dim=dim, legacy=legacy)
+            samples = timings(lambda: decode_embeddings(segments), repeats=repeats)
+            results.append(
+                result(
+                    "decode",
+                    {"segments": n, "format": "json" if legacy else "binary"},
+                    samples,
+                    items=n,
+                )
+            )
+        segments = make_segments(f"user-{n}", n, dim=dim)
+        embeddings = decode_embeddings(segments)
+        samples = timings(
+            lambda: index_builder.build(f"user-{n}", segments, embeddings),
+            repeats=max(1, repeats // 10),
+        )
+        results.append(result("index_build", {"segments": n}, samples, items=n))
+
+    with moto_tables():
+        dynamodb_client = ThreadedDynamoDBClient(boto3.client("dynamodb"))
+        batch_writer = BatchWriter(dynamodb_client=dynamodb_client)
+        segments_repo = SegmentsRepo(
+            dynamodb_client=dynamodb_client, batch_writer=batch_writer
+        )
+        jobs_repo = JobsRepo(dynamodb_client=dynamodb_client, batch_writer=batch_writer)
+        results += asyncio.run(
+            bench_repo_and_search(
+                segments_repo, index_builder, sizes, ks, dim=dim, repeats=repeats
+            )
+        )
+        results += asyncio.run(
+            bench_ingest(
+                segments_repo,
+                jobs_repo,
+                ingest_segments,
+                dim=dim,
+                repeats=max(1, repeats // 10),
+            )
+        )
+
+    report = {
+        "commit": git_commit(),
+        "created_at": dt.datetime.now(dt.UTC).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {
+            "sizes": sizes,
+            "ks": ks,
+            "dim": dim,
+            "repeats": repeats,
+            "index_type": index_type,
+            "ingest_segments": ingest_segments,
+        },
+        "results": results,
+    }
+    output.write_text(json.dumps(report, indent=2))
+    typer.echo(f"results written to {output}")
+
+
+@app.command()
+def compare(baseline: Path, current: Path, threshold: float = 0.1) -> None:
+    """Compare the medians of two runs, fail on regressions over `threshold`."""
+
+    def medians(path: Path) -> tuple[str | None, dict[str, float]]:
+        report = json.loads(path.read_text())
+        return report["commit"], {
+            f"{r['name']} {json.dumps(r['params'], sort_keys=True)}": r["median_ms"]
+            for r in report["results"]
+        }
+
+    baseline_commit, baseline_medians = medians(baseline)
+    current_commit, current_medians = medians(current)
+    typer.echo(f"{baseline_commit} -> {current_commit}")
+    regressions = 0
+    for key, median in current_medians.items():
+        if key not in baseline_medians:
+            continue
+        ratio = median / baseline_medians[key]
+        regressed = ratio > 1 + threshold
+        regressions += regressed
+        typer.echo(
+            f"{key:<50} {baseline_medians[key]:9.2f}ms -> {median:9.2f}ms "
+            f"({ratio - 1:+.1%}){' REGRESSION' if regressed else ''}"
+        )
+    if regressions:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
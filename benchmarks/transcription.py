@@ -0,0 +1,113 @@
+"""Transcription speed and accuracy per backend.
+
+Transcribes every audio file in `FIXTURES` with each backend and reports the
+real time factor (transcription time / audio duration, lower is faster) and
+the word error rate. The reference for `clip.mp3` is `clip.txt` when present,
+otherwise the output of the `whisper` backend, so the WER is then the drift of
+the quantized backends from full precision whisper.
+
+    python benchmarks/transcription.py fixtures/ --size base \
+        --backend whisper --backend whisper_int8 --backend faster_whisper
+"""
+
+import re
+import time
+from pathlib import Path
+
+import typer
+
+from vidoso.config import TranscriptionBackend
+from vidoso.services.transcription import SAMPLE_RATE, load_transcriber
+
+AUDIO_SUFFIXES = {".mp3", ".mp4", ".m4a", ".wav", ".webm", ".ogg", ".flac"}
+
+app = typer.Typer()
+
+
+def words(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    # word level levenshtein distance over the reference length
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        current = [i]
+        for j, h in enumerate(hyp, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+@app.command()
+def main(
+    fixtures: Path,
+    size: str = "base",
+    backend: list[TranscriptionBackend] = [
+        TranscriptionBackend.WHISPER,
+        TranscriptionBackend.WHISPER_INT8,
+    ],
+    device: str = "cpu",
+    compute_type: str = "int8",
+    beam_size: int = 5,
+    cpu_threads: int = 0,
+) -> None:
+    import whisper
+
+    paths = sorted(p for p in fixtures.iterdir() if p.suffix in AUDIO_SUFFIXES)
+    if not paths:
+        raise typer.BadParameter(f"no audio files in {fixtures}")
+    audios = {path: whisper.load_audio(str(path)) for path in paths}
+    references = {
+        path: path.with_suffix(".txt").read_text()
+        for path in paths
+        if path.with_suffix(".txt").exists()
+    }
+
+    # full precision whisper first, it is the reference of unlabelled fixtures
+    backends = sorted(set(backend), key=lambda b: b != TranscriptionBackend.WHISPER)
+    texts: dict[TranscriptionBackend, dict[Path, str]] = {}
+    for b in backends:
+        start = time.perf_counter()
+        transcriber = load_transcriber(
+            b,
+            size,
+            device=device,
+            compute_type=compute_type,
+            beam_size=beam_size,
+            cpu_threads=cpu_threads,
+        )
+        load_seconds = time.perf_counter() - start
+
+        texts[b] = {}
+        elapsed = duration = 0.0
+        for path, audio in audios.items():
+            start = time.perf_counter()
+            texts[b][path] = transcriber.transcribe(audio, language="en")["text"]
+            elapsed += time.perf_counter() - start
+            duration += len(audio) / SAMPLE_RATE
+
+        errors = [
+            word_error_rate(reference, texts[b][path])
+            for path in paths
+            if (
+                reference := references.get(
+                    path, texts.get(TranscriptionBackend.WHISPER, {}).get(path)
+                )
+            )
+            is not None
+        ]
+        wer = f"{sum(errors) / len(errors):.3f}" if errors else "n/a"
+        typer.echo(
+            f"{b:>15}: load {load_seconds:.1f}s, {duration:.0f}s of audio in "
+            f"{elapsed:.1f}s (rtf {elapsed / duration:.3f}), wer {wer}"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,51 @@
+import asyncio
+
+import typer
+
+from vidoso.deps import (
+    get_dynamodb_client_dep,
+    get_segments_repo_dep,
+    get_settings_dep,
+)
+from vidoso.services.sentence_encoding import export_sentence_transformer
+
+app = typer.Typer()
+
+
+@app.callback()
+def main() -> None:
+    """Vidoso admin commands."""
+
+
+async def a_migrate_embeddings() -> int:
+    dynamodb_client = get_dynamodb_client_dep()
+    segments_repo = await get_segments_repo_dep(dynamodb_client=dynamodb_client)
+    migrated = await segments_repo.migrate_legacy_embeddings()
+    return migrated
+
+
+@app.command()
+def migrate_embeddings() -> None:
+    """Rewrite legacy json segment embeddings as binary float32."""
+    migrated = asyncio.run(a_migrate_embeddings())
+    typer.echo(f"migrated {migrated} segments")
+
+
+@app.command()
+def export_encoder(
+    model: str | None = None,
+    export_dir: str | None = None,
+    quantization: str | None = None,
+) -> None:
+    """Export the sentence transformer to onnx, fp32 and int8 quantized."""
+    settings = get_settings_dep()
+    path = export_sentence_transformer(
+        model or settings.sentence_transformer_model,
+        directory=export_dir or settings.sentence_transformer_export_dir,
+        quantization=quantization or settings.sentence_transformer_quantization,
+    )
+    typer.echo(f"exported to {path}")
+
+
+if __name__ == "__main__":
+    app()
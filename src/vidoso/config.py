@@ -11,6 +11,30 @@ class WhisperModelSize(StrEnum):
     LARGE = auto()
 
 
+class TranscriptionBackend(StrEnum):
+    WHISPER = auto()
+    WHISPER_INT8 = auto()
+    FASTER_WHISPER = auto()
+
+
+class EncoderBackend(StrEnum):
+    TORCH = auto()
+    ONNX = auto()
+    ONNX_INT8 = auto()
+
+
+class SearchIndexType(StrEnum):
+    FLAT = auto()
+    HNSW = auto()
+    IVF_FLAT = auto()
+    IVF_PQ = auto()
+
+
+class DynamoDBBackend(StrEnum):
+    BOTO3 = auto()
+    AIOBOTOCORE = auto()
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(case_sensitive=False, extra="ignore")
 
@@ -24,4 +48,117 @@ class Settings(BaseSettings):
     openapi_url: str
 
     whisper_model: WhisperModelSize
+    transcription_backend: TranscriptionBackend = TranscriptionBackend.WHISPER
+    # faster-whisper only
+    transcription_compute_type: str = "int8"
+    transcription_beam_size: int = 5
+    transcription_cpu_threads: int = 0
+    # long audio is split at silences and transcribed in parallel by a process
+    # pool, unset transcribes each file in a single call
+    transcription_chunk_seconds: float | None = None
+    transcription_chunk_overlap_seconds: float = 1
+    transcription_chunk_min_silence_ms: int = 300
+    transcription_chunk_silence_thresh_db: float = -16
+    transcription_workers: int = 2
     sentence_transformer_model: str = "paraphrase-mpnet-base-v2"
+    sentence_transformer_backend: EncoderBackend = EncoderBackend.TORCH
+    # onnx graphs written by `vidoso export-encoder`, the int8 one quantized for
+    # `sentence_transformer_quantization` (arm64, avx2, avx512 or avx512_vnni)
+    sentence_transformer_export_dir: str = "/tmp/vidoso/encoders"
+    sentence_transformer_quantization: str = "avx2"
+    # e.g. cpu, cuda, cuda:1. unset lets each library pick
+    model_device: str | None = None
+
+    audio_cache_dir: str = "/tmp/vidoso/audio"
+    audio_cache_max_bytes: int = 4 * 1024**3
+    # audio of up to `audio_prefetch_depth` queued jobs is downloaded while the
+    # current one is processed, at most `audio_prefetch_max_bytes` ahead
+    audio_prefetch_depth: int = 2
+    audio_prefetch_max_bytes: int = 1024**3
+
+    # ingestion pipeline: segments are embedded and written in batches of at
+    # most `ingest_embed_batch_size`, with up to `ingest_queue_batches` batches
+    # buffered between stages
+    ingest_embed_batch_size: int = 32
+    ingest_queue_batches: int = 4
+
+    # a stream url is transcribed once per model versions, later jobs copy the
+    # segments. jobs submitted while it is transcribed are retried every
+    # `transcript_wait_seconds`. the transcribing job refreshes its claim with
+    # every batch of segments written, one not refreshed for
+    # `transcript_claim_ttl_seconds` is taken over
+    transcript_dedupe: bool = True
+    transcript_wait_seconds: int = 30
+    transcript_claim_ttl_seconds: int = 1800
+
+    # worker runtime: io bound work (downloads, dynamodb), transcription and
+    # encoding run on separately sized pools. torch threads default to the cores
+    # divided among the transcription and encoding threads, so concurrent tasks
+    # don't oversubscribe them
+    worker_io_threads: int = 32
+    worker_transcribe_threads: int = 1
+    worker_encode_threads: int = 1
+    torch_threads: int | None = None
+    torch_interop_threads: int | None = None
+
+    # stage timings are served in the prometheus text format, by the api on
+    # /metrics and by the worker on `worker_metrics_port`. `metrics_emf` also
+    # prints them to stdout as cloudwatch embedded metrics
+    metrics_emf: bool = False
+    metrics_namespace: str = "vidoso"
+    worker_metrics_port: int | None = None
+
+    redis_url: str = "redis://redis:6379/0"
+
+    # job status transitions are published by the worker on a redis channel, the
+    # api fans them out to its server-sent events and long-poll clients
+    job_events_channel: str = "vidoso:job-events"
+    job_events_max_queued: int = 100
+    job_events_max_jobs: int = 10_000
+    job_events_keepalive_seconds: float = 15
+    job_events_max_wait_seconds: float = 60
+    # segments written by the worker, appended to the api's resident indexes
+    index_updates_channel: str = "vidoso:index-updates"
+
+    dynamodb_backend: DynamoDBBackend = DynamoDBBackend.BOTO3
+    dynamodb_max_pool_connections: int = 50
+    dynamodb_tcp_keepalive: bool = True
+    dynamodb_keepalive_timeout_seconds: float = 60
+    dynamodb_page_size: int | None = None
+    dynamodb_prefetch_pages: int = 2
+    dynamodb_parallel_ranges: int = 1
+    dynamodb_batch_max_in_flight: int = 8
+    dynamodb_batch_max_attempts: int = 8
+    dynamodb_batch_backoff_base_ms: float = 50
+    dynamodb_batch_backoff_max_ms: float = 5_000
+
+    embedding_cache_max_items: int = 100_000
+    embedding_cache_redis: bool = False
+    embedding_cache_redis_ttl_seconds: int = 7 * 24 * 3600
+
+    search_encode_max_batch_size: int = 32
+    search_encode_max_wait_ms: float = 5
+
+    # segments of the jobs a worker runs concurrently are encoded together, up
+    # to `max_batch_size` texts per call, `batch_size` per forward pass
+    ingest_encode_max_batch_size: int = 256
+    ingest_encode_max_wait_ms: float = 20
+    ingest_encode_batch_size: int = 64
+
+    index_cache_max_users: int = 256
+    index_cache_max_segments: int = 2_000_000
+    index_cache_ttl_seconds: int = 300
+
+    search_index_type: SearchIndexType = SearchIndexType.FLAT
+    search_index_train_threshold: int = 10_000
+    search_index_nlist: int | None = None
+    search_index_nprobe: int = 16
+    search_index_hnsw_m: int = 32
+    search_index_ef_construction: int = 40
+    search_index_ef_search: int = 64
+    search_index_pq_m: int = 16
+    search_index_pq_nbits: int = 8
+    search_index_dir: str = "/tmp/vidoso/indexes"
+
+    search_shard_size: int = 100_000
+    search_shard_workers: int = 4
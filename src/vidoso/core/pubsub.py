@@ -0,0 +1,40 @@
+import asyncio
+import inspect
+from collections.abc import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from vidoso.core.logger import logger
+
+MessageHandler = Callable[[bytes | str], Awaitable[None] | None]
+
+
+async def listen(
+    redis_client: Redis,
+    channel: str,
+    handle: MessageHandler,
+    reconnect_max_seconds: float = 30,
+) -> None:
+    # runs until cancelled: `handle` is called with the data of every message on
+    # the channel. a lost connection is retried with a backoff, a message
+    # `handle` fails on is logged and dropped, the subscription lives on
+    backoff = 0.5
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        result = handle(message["data"])
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception:
+                        logger.exception(f"pubsub message dropped [{channel=}]")
+        except RedisError as e:
+            logger.warning(f"pubsub subscription lost [{channel=}, {e=}, {backoff=}]")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, reconnect_max_seconds)
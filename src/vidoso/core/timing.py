@@ -0,0 +1,212 @@
+import bisect
+import contextlib
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+
+from vidoso.core.logger import logger, tracer
+
+# histogram upper bounds in seconds: prometheus' defaults, extended to the
+# minutes a transcription takes
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+    900,
+    math.inf,
+)
+LABELS = ("stage", "user", "size")
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# labels bound by the request or job being processed, tasks inherit them
+bound_labels: ContextVar[dict[str, str]] = ContextVar("bound_labels", default={})
+# stage durations of the current request, for its Server-Timing header
+request_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def size_bucket(size: int | None) -> str:
+    # corpus sizes as the next power of ten, bounds the label values
+    if size is None:
+        return ""
+    return str(10 ** math.ceil(math.log10(max(size, 1))))
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class StageTimings:
+    def __init__(self) -> None:
+        # one histogram per (stage, user, size bucket). job ids would make one
+        # per job, they only go to emf metadata and trace spans
+        self.buckets: dict[tuple[str, str, str], list[int]] = {}
+        self.sums: dict[tuple[str, str, str], float] = {}
+        self.emf_namespace: str | None = None
+        self.lock = threading.Lock()
+
+    def configure(self, emf_namespace: str | None = None) -> None:
+        # every observation is also printed to stdout as an emf metric
+        self.emf_namespace = emf_namespace
+
+    def observe(
+        self,
+        stage: str,
+        seconds: float,
+        user: str | None = None,
+        job: str | None = None,
+        size: int | None = None,
+    ) -> None:
+        labels = bound_labels.get()
+        user = user or labels.get("user")
+        job = job or labels.get("job")
+        key = (stage, user or "", size_bucket(size))
+        with self.lock:
+            buckets = self.buckets.setdefault(key, [0] * len(BUCKETS))
+            buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.sums[key] = self.sums.get(key, 0.0) + seconds
+
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+        if self.emf_namespace:
+            with single_metric(
+                name=f"{stage}_duration",
+                unit=MetricUnit.Seconds,
+                value=seconds,
+                namespace=self.emf_namespace,
+            ) as metric:
+                if user:
+                    metric.add_dimension(name="user", value=user)
+                if job:
+                    metric.add_metadata(key="job", value=job)
+                if size is not None:
+                    metric.add_metadata(key="size", value=size)
+
+    def render_prometheus(self) -> str:
+        name = "vidoso_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of the api and worker processing stages.",
+            f"# TYPE {name} histogram",
+        ]
+        with self.lock:
+            histograms = [
+                (key, list(buckets), self.sums[key])
+                for key, buckets in sorted(self.buckets.items())
+            ]
+        for key, buckets, total in histograms:
+            labels = ",".join(
+                f'{label}="{escape_label(value)}"'
+                for label, value in zip(LABELS, key)
+                if value
+            )
+            count = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                count += bucket
+                le = "+Inf" if bound == math.inf else str(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {total}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+stage_timings = StageTimings()
+
+
+@contextlib.contextmanager
+def bind_labels(**labels: str | None) -> Iterator[None]:
+    token = bound_labels.set(
+        bound_labels.get() | {k: v for k, v in labels.items() if v is not None}
+    )
+    try:
+        yield
+    finally:
+        bound_labels.reset(token)
+
+
+@contextlib.contextmanager
+def timed(stage: str, size: int | None = None) -> Iterator[dict[str, Any]]:
+    # a trace span and a stage timing. the size can be set on the yielded span
+    # once known, e.g. the segments a transcription produced
+    span: dict[str, Any] = {"size": size}
+    with contextlib.ExitStack() as stack:
+        if not tracer.disabled:
+            subsegment = stack.enter_context(
+                tracer.provider.in_subsegment(name=f"## {stage}")
+            )
+            for label, value in bound_labels.get().items():
+                subsegment.put_annotation(key=label, value=value)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["seconds"] = seconds = time.perf_counter() - start
+            stage_timings.observe(stage, seconds, size=span["size"])
+            logger.debug(
+                f"span [{stage=}, {seconds=:.4f}, {span=}, {bound_labels.get()=}]"
+            )
+
+
+@contextlib.contextmanager
+def collect_timings() -> Iterator[list[tuple[str, float]]]:
+    timings: list[tuple[str, float]] = []
+    token = request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        request_timings.reset(token)
+
+
+def server_timing(timings: list[tuple[str, float]]) -> str:
+    # durations of a stage summed (concurrent shard searches add up), in
+    # milliseconds
+    totals: dict[str, list[float]] = {}
+    for stage, seconds in timings:
+        totals.setdefault(stage, []).append(seconds)
+    return ", ".join(
+        f'{stage};dur={sum(durations) * 1000:.1f};desc="{len(durations)}x"'
+        for stage, durations in totals.items()
+    )
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        body = stage_timings.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # scrapes are not worth a log line
+        pass
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    # the worker has no http server of its own, prometheus scrapes this one
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"metrics served [{port=}]")
+    return server
@@ -0,0 +1,22 @@
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
+
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com"}
+YOUTUBE_PATH_PREFIXES = ("/shorts/", "/embed/", "/live/", "/v/")
+
+
+def normalize_stream_url(stream_url: str) -> str:
+    # urls of the same video map to the same string: youtube urls to their video
+    # id, other urls drop the fragment and get their host and query normalized
+    url = urlsplit(stream_url.strip())
+    host = url.netloc.lower().removeprefix("www.")
+    video_id = None
+    if host == "youtu.be":
+        video_id = url.path.strip("/").split("/")[0]
+    elif host in YOUTUBE_HOSTS and url.path == "/watch":
+        video_id = parse_qs(url.query).get("v", [None])[0]
+    elif host in YOUTUBE_HOSTS and url.path.startswith(YOUTUBE_PATH_PREFIXES):
+        video_id = url.path.split("/")[2]
+    if video_id:
+        return f"youtube:{video_id}"
+    query = urlencode(sorted(parse_qsl(url.query)))
+    return urlunsplit((url.scheme.lower(), host, url.path.rstrip("/"), query, ""))
@@ -1,21 +1,58 @@
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
 from functools import lru_cache
-from typing import Annotated
+from typing import TYPE_CHECKING, Annotated, Any
 
-import boto3
-import whisper
 from fastapi import Depends
-from mypy_boto3_dynamodb.client import DynamoDBClient
-from sentence_transformers import SentenceTransformer
-from whisper import Whisper
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 from vidoso.config import Settings
+from vidoso.repo.batch_writer import BatchWriter, batch_writer_fct
+from vidoso.repo.clients import (
+    AsyncDynamoDBClient,
+    DynamoDBClientPool,
+    threaded_dynamodb_client,
+)
 from vidoso.repo.jobs import JobsRepo, jobs_repo_fct
+from vidoso.repo.schemas import EMBEDDING_FORMAT_VERSION
 from vidoso.repo.segments import SegmentsRepo, segments_repo_fct
+from vidoso.repo.transcripts import TranscriptsRepo, transcripts_repo_fct
+from vidoso.services.audio_cache import (
+    AudioCache,
+    AudioPrefetcher,
+    audio_cache_fct,
+    audio_prefetcher_fct,
+)
+from vidoso.services.chunked_transcription import ChunkingOptions
+from vidoso.services.embedding_cache import EmbeddingCache, embedding_cache_fct
+from vidoso.services.encode_batcher import EncodeBatcher, encode_batcher_fct
+from vidoso.services.index_builder import IndexBuilder, index_builder_fct
+from vidoso.services.index_cache import IndexCache, index_cache_fct
+from vidoso.services.index_updates import (
+    IndexUpdatePublisher,
+    IndexUpdateSubscriber,
+    index_update_publisher_fct,
+    index_update_subscriber_fct,
+)
+from vidoso.services.job_events import (
+    JobEventHub,
+    JobEventPublisher,
+    job_event_hub_fct,
+    job_event_publisher_fct,
+)
+from vidoso.services.model_registry import ModelRegistry, model_registry_fct
 from vidoso.services.search import SearchService, search_service_fct
+from vidoso.services.sentence_encoding import encoder_name
 from vidoso.services.stream_processor import (
     StreamProcessorService,
     stream_processor_service_fct,
 )
+from vidoso.services.transcription import Transcriber
+
+if TYPE_CHECKING:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
 
 # settings
 
@@ -26,76 +63,383 @@ def get_settings_dep() -> Settings:
     return settings
 
 
-# whisper
+# models
+
 
+@lru_cache
+def get_model_registry_dep() -> ModelRegistry:
+    settings = get_settings_dep()
+    model_registry = model_registry_fct(device=settings.model_device)
+    return model_registry
 
-def get_whisper_model_dep(
+
+def transcriber_options(settings: Settings) -> dict[str, Any]:
+    chunking = None
+    if settings.transcription_chunk_seconds:
+        chunking = ChunkingOptions(
+            chunk_seconds=settings.transcription_chunk_seconds,
+            overlap_seconds=settings.transcription_chunk_overlap_seconds,
+            min_silence_ms=settings.transcription_chunk_min_silence_ms,
+            silence_thresh_db=settings.transcription_chunk_silence_thresh_db,
+            workers=settings.transcription_workers,
+        )
+    return {
+        "chunking": chunking,
+        "compute_type": settings.transcription_compute_type,
+        "beam_size": settings.transcription_beam_size,
+        "cpu_threads": settings.transcription_cpu_threads,
+    }
+
+
+def encoder_options(settings: Settings) -> dict[str, Any]:
+    return {
+        "export_dir": settings.sentence_transformer_export_dir,
+        "quantization": settings.sentence_transformer_quantization,
+    }
+
+
+def transcript_version(settings: Settings) -> str:
+    # the models a transcript depends on, a new version transcribes again
+    return ":".join(
+        [
+            settings.transcription_backend,
+            settings.whisper_model,
+            encoder_name(
+                settings.sentence_transformer_model,
+                settings.sentence_transformer_backend,
+            ),
+            str(EMBEDDING_FORMAT_VERSION),
+        ]
+    )
+
+
+def get_transcriber_dep(
     settings: Annotated[Settings, Depends(get_settings_dep)],
-) -> Whisper:
-    whisper_model: Whisper = whisper.load_model(settings.whisper_model)
-    return whisper_model
+) -> Transcriber:
+    transcriber = get_model_registry_dep().transcriber(
+        settings.transcription_backend,
+        settings.whisper_model,
+        **transcriber_options(settings),
+    )
+    return transcriber
 
 
 def get_sentence_transformer_dep(
     settings: Annotated[Settings, Depends(get_settings_dep)],
-) -> SentenceTransformer:
-    sentence_transformer = SentenceTransformer(settings.sentence_transformer_model)
+) -> "SentenceTransformer":
+    sentence_transformer = get_model_registry_dep().sentence_transformer(
+        settings.sentence_transformer_model,
+        backend=settings.sentence_transformer_backend,
+        **encoder_options(settings),
+    )
     return sentence_transformer
 
 
-sentence_transformer_model = SentenceTransformer("paraphrase-mpnet-base-v2")
+@lru_cache
+def get_embedding_cache_dep() -> EmbeddingCache:
+    settings = get_settings_dep()
+    redis_client = (
+        Redis.from_url(settings.redis_url) if settings.embedding_cache_redis else None
+    )
+    embedding_cache = embedding_cache_fct(
+        model_name=encoder_name(
+            settings.sentence_transformer_model,
+            settings.sentence_transformer_backend,
+        ),
+        max_items=settings.embedding_cache_max_items,
+        redis_client=redis_client,
+        redis_ttl_seconds=settings.embedding_cache_redis_ttl_seconds,
+    )
+    return embedding_cache
+
+
+@lru_cache
+def get_audio_cache_dep() -> AudioCache:
+    settings = get_settings_dep()
+    audio_cache = audio_cache_fct(
+        directory=settings.audio_cache_dir,
+        max_bytes=settings.audio_cache_max_bytes,
+    )
+    return audio_cache
+
+
+@lru_cache
+def get_audio_prefetcher_dep() -> AudioPrefetcher:
+    # the worker module imports this one, its queue is read through a late import
+    from vidoso.worker import pending_stream_urls
+
+    settings = get_settings_dep()
+    audio_prefetcher = audio_prefetcher_fct(
+        audio_cache=get_audio_cache_dep(),
+        pending_stream_urls=pending_stream_urls,
+        depth=settings.audio_prefetch_depth,
+        max_bytes=settings.audio_prefetch_max_bytes,
+    )
+    return audio_prefetcher
+
+
+def lazy_encode(
+    settings: Settings, **options: Any
+) -> Callable[[list[str]], "np.ndarray"]:
+    # the encoder is resolved by the first batch, on the batcher's executor:
+    # lexical searches never wait for the model to load
+    def encode(texts: list[str]) -> "np.ndarray":
+        sentence_transformer = get_sentence_transformer_dep(settings=settings)
+        return get_embedding_cache_dep().encode(sentence_transformer, texts, **options)
+
+    return encode
+
+
+@lru_cache
+def get_encode_batcher_dep() -> EncodeBatcher:
+    settings = get_settings_dep()
+    encode_batcher = encode_batcher_fct(
+        encode=lazy_encode(settings),
+        max_batch_size=settings.search_encode_max_batch_size,
+        max_wait_ms=settings.search_encode_max_wait_ms,
+    )
+    return encode_batcher
+
+
+@lru_cache
+def get_ingest_encode_batcher_dep() -> EncodeBatcher:
+    settings = get_settings_dep()
+    encode_batcher = encode_batcher_fct(
+        encode=lazy_encode(settings, batch_size=settings.ingest_encode_batch_size),
+        max_batch_size=settings.ingest_encode_max_batch_size,
+        max_wait_ms=settings.ingest_encode_max_wait_ms,
+        executor=get_encode_executor_dep(),
+    )
+    return encode_batcher
+
+
+# search index cache
+
+
+@lru_cache
+def get_index_cache_dep() -> IndexCache:
+    settings = get_settings_dep()
+    index_cache = index_cache_fct(
+        max_users=settings.index_cache_max_users,
+        max_segments=settings.index_cache_max_segments,
+        ttl_seconds=settings.index_cache_ttl_seconds,
+    )
+    return index_cache
+
+
+@lru_cache
+def get_index_builder_dep() -> IndexBuilder:
+    settings = get_settings_dep()
+    index_builder = index_builder_fct(settings=settings)
+    return index_builder
+
+
+@lru_cache
+def get_io_executor_dep() -> Executor:
+    settings = get_settings_dep()
+    executor = ThreadPoolExecutor(
+        max_workers=settings.worker_io_threads,
+        thread_name_prefix="io",
+    )
+    return executor
+
+
+@lru_cache
+def get_transcribe_executor_dep() -> Executor:
+    settings = get_settings_dep()
+    executor = ThreadPoolExecutor(
+        max_workers=settings.worker_transcribe_threads,
+        thread_name_prefix="transcribe",
+    )
+    return executor
+
+
+@lru_cache
+def get_encode_executor_dep() -> Executor:
+    settings = get_settings_dep()
+    executor = ThreadPoolExecutor(
+        max_workers=settings.worker_encode_threads,
+        thread_name_prefix="encode",
+    )
+    return executor
+
+
+@lru_cache
+def get_search_executor_dep() -> Executor:
+    settings = get_settings_dep()
+    executor = ThreadPoolExecutor(
+        max_workers=settings.search_shard_workers,
+        thread_name_prefix="search-shard",
+    )
+    return executor
+
+
+# job events
+
+
+@lru_cache
+def get_async_redis_dep() -> AsyncRedis:
+    settings = get_settings_dep()
+    redis_client = AsyncRedis.from_url(settings.redis_url)
+    return redis_client
+
+
+@lru_cache
+def get_job_event_publisher_dep() -> JobEventPublisher:
+    settings = get_settings_dep()
+    job_event_publisher = job_event_publisher_fct(
+        redis_client=get_async_redis_dep(),
+        channel=settings.job_events_channel,
+    )
+    return job_event_publisher
+
+
+@lru_cache
+def get_job_event_hub_dep() -> JobEventHub:
+    settings = get_settings_dep()
+    job_event_hub = job_event_hub_fct(
+        redis_client=get_async_redis_dep(),
+        channel=settings.job_events_channel,
+        max_queued=settings.job_events_max_queued,
+        max_jobs=settings.job_events_max_jobs,
+    )
+    return job_event_hub
+
+
+@lru_cache
+def get_index_update_publisher_dep() -> IndexUpdatePublisher:
+    settings = get_settings_dep()
+    index_update_publisher = index_update_publisher_fct(
+        redis_client=get_async_redis_dep(),
+        channel=settings.index_updates_channel,
+    )
+    return index_update_publisher
+
+
+@lru_cache
+def get_index_update_subscriber_dep() -> IndexUpdateSubscriber:
+    settings = get_settings_dep()
+    index_update_subscriber = index_update_subscriber_fct(
+        redis_client=get_async_redis_dep(),
+        channel=settings.index_updates_channel,
+        index_cache=get_index_cache_dep(),
+    )
+    return index_update_subscriber
 
 
 # aws dynamodb / repos
 
 
-def get_dynamodb_client_dep() -> DynamoDBClient:
-    dynamodb_client = boto3.client("dynamodb")
-    return dynamodb_client
+@lru_cache
+def get_dynamodb_client_pool_dep() -> DynamoDBClientPool:
+    dynamodb_client_pool = DynamoDBClientPool()
+    return dynamodb_client_pool
+
+
+def get_dynamodb_client_dep() -> AsyncDynamoDBClient:
+    # the process wide client opened by the api lifespan or the worker startup,
+    # anything running outside of those (e.g. the cli) gets a threaded boto3 one
+    dynamodb_client_pool = get_dynamodb_client_pool_dep()
+    if dynamodb_client_pool.client is None:
+        return threaded_dynamodb_client(get_settings_dep())
+    return dynamodb_client_pool.client
+
+
+@lru_cache
+def get_batch_writer_dep(dynamodb_client: AsyncDynamoDBClient) -> BatchWriter:
+    # one per client, the repos of every request write through it
+    settings = get_settings_dep()
+    batch_writer = batch_writer_fct(
+        dynamodb_client=dynamodb_client,
+        max_in_flight=settings.dynamodb_batch_max_in_flight,
+        max_attempts=settings.dynamodb_batch_max_attempts,
+        backoff_base_ms=settings.dynamodb_batch_backoff_base_ms,
+        backoff_max_ms=settings.dynamodb_batch_backoff_max_ms,
+    )
+    return batch_writer
 
 
 async def get_jobs_repo_dep(
-    dynamodb_client: Annotated[DynamoDBClient, Depends(get_dynamodb_client_dep)],
+    dynamodb_client: Annotated[AsyncDynamoDBClient, Depends(get_dynamodb_client_dep)],
 ) -> JobsRepo:
-    jobs_repo = await jobs_repo_fct(dynamodb_client=dynamodb_client)
+    settings = get_settings_dep()
+    jobs_repo = await jobs_repo_fct(
+        dynamodb_client=dynamodb_client,
+        page_size=settings.dynamodb_page_size,
+        prefetch_pages=settings.dynamodb_prefetch_pages,
+        parallel_ranges=settings.dynamodb_parallel_ranges,
+        batch_writer=get_batch_writer_dep(dynamodb_client=dynamodb_client),
+    )
     return jobs_repo
 
 
 async def get_segments_repo_dep(
-    dynamodb_client: Annotated[DynamoDBClient, Depends(get_dynamodb_client_dep)],
+    dynamodb_client: Annotated[AsyncDynamoDBClient, Depends(get_dynamodb_client_dep)],
 ) -> SegmentsRepo:
-    segments_repo = await segments_repo_fct(dynamodb_client=dynamodb_client)
+    settings = get_settings_dep()
+    segments_repo = await segments_repo_fct(
+        dynamodb_client=dynamodb_client,
+        page_size=settings.dynamodb_page_size,
+        prefetch_pages=settings.dynamodb_prefetch_pages,
+        parallel_ranges=settings.dynamodb_parallel_ranges,
+        batch_writer=get_batch_writer_dep(dynamodb_client=dynamodb_client),
+    )
     return segments_repo
 
 
+async def get_transcripts_repo_dep(
+    dynamodb_client: Annotated[AsyncDynamoDBClient, Depends(get_dynamodb_client_dep)],
+) -> TranscriptsRepo:
+    transcripts_repo = await transcripts_repo_fct(dynamodb_client=dynamodb_client)
+    return transcripts_repo
+
+
 # services
 
 
 async def get_stream_processor_service_dep(
     jobs_repo: Annotated[JobsRepo, Depends(get_jobs_repo_dep)],
     segments_repo: Annotated[SegmentsRepo, Depends(get_segments_repo_dep)],
-    whisper_model: Annotated[Whisper, Depends(get_whisper_model_dep)],
-    sentence_transformer: Annotated[
-        SentenceTransformer, Depends(get_sentence_transformer_dep)
+    transcriber: Annotated[Transcriber, Depends(get_transcriber_dep)],
+    encode_batcher: Annotated[EncodeBatcher, Depends(get_ingest_encode_batcher_dep)],
+    audio_cache: Annotated[AudioCache, Depends(get_audio_cache_dep)],
+    transcripts_repo: Annotated[TranscriptsRepo, Depends(get_transcripts_repo_dep)],
+    job_events: Annotated[JobEventPublisher, Depends(get_job_event_publisher_dep)],
+    index_updates: Annotated[
+        IndexUpdatePublisher, Depends(get_index_update_publisher_dep)
     ],
+    settings: Annotated[Settings, Depends(get_settings_dep)],
 ) -> StreamProcessorService:
     stream_processor_svc = await stream_processor_service_fct(
         jobs_repo=jobs_repo,
         segments_repo=segments_repo,
-        whisper_model=whisper_model,
-        sentence_transformer=sentence_transformer,
+        transcriber=transcriber,
+        encode_batcher=encode_batcher,
+        audio_cache=audio_cache,
+        transcripts_repo=transcripts_repo,
+        transcript_version=transcript_version(settings),
+        embed_batch_size=settings.ingest_embed_batch_size,
+        queue_batches=settings.ingest_queue_batches,
+        claim_ttl_seconds=settings.transcript_claim_ttl_seconds,
+        transcribe_executor=get_transcribe_executor_dep(),
+        job_events=job_events,
+        index_updates=index_updates,
     )
     return stream_processor_svc
 
 
 async def get_search_service_dep(
     segments_repo: Annotated[SegmentsRepo, Depends(get_segments_repo_dep)],
-    sentence_transformer: Annotated[
-        SentenceTransformer, Depends(get_sentence_transformer_dep)
-    ],
+    encode_batcher: Annotated[EncodeBatcher, Depends(get_encode_batcher_dep)],
+    index_cache: Annotated[IndexCache, Depends(get_index_cache_dep)],
+    index_builder: Annotated[IndexBuilder, Depends(get_index_builder_dep)],
+    executor: Annotated[Executor, Depends(get_search_executor_dep)],
 ) -> SearchService:
     search_svc = await search_service_fct(
         segments_repo=segments_repo,
-        sentence_transformer=sentence_transformer,
+        encode_batcher=encode_batcher,
+        index_cache=index_cache,
+        index_builder=index_builder,
+        executor=executor,
     )
     return search_svc
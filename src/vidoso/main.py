@@ -1,15 +1,62 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware import Middleware
 
 from vidoso.config import Settings
-from vidoso.deps import get_settings_dep
+from vidoso.core.timing import stage_timings
+from vidoso.deps import (
+    encoder_options,
+    get_async_redis_dep,
+    get_dynamodb_client_pool_dep,
+    get_index_update_subscriber_dep,
+    get_job_event_hub_dep,
+    get_model_registry_dep,
+    get_settings_dep,
+)
 from vidoso.routes.v1 import routers
 
 
 def create_app(settings: Settings | None = None) -> FastAPI:
     settings = settings or get_settings_dep()
 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        dynamodb_client_pool = get_dynamodb_client_pool_dep()
+        await dynamodb_client_pool.open(settings=settings)
+        stage_timings.configure(
+            emf_namespace=settings.metrics_namespace if settings.metrics_emf else None
+        )
+        # job events published by the worker, fanned out to the api's clients
+        job_event_hub = get_job_event_hub_dep()
+        job_event_hub.start()
+        # segments written by the worker, appended to the resident indexes
+        index_update_subscriber = get_index_update_subscriber_dep()
+        index_update_subscriber.start()
+        # the query encoder is loaded in the background, /health reports ready
+        # once it is warm
+        preload = asyncio.create_task(
+            asyncio.to_thread(
+                get_model_registry_dep().preload,
+                sentence_transformers=[
+                    (
+                        settings.sentence_transformer_backend,
+                        settings.sentence_transformer_model,
+                    )
+                ],
+                encoder_options=encoder_options(settings),
+            )
+        )
+        yield
+        await preload
+        await job_event_hub.close()
+        await index_update_subscriber.close()
+        await get_async_redis_dep().aclose()
+        await dynamodb_client_pool.close()
+
     middlewares = [
         Middleware(
             CORSMiddleware,
@@ -29,6 +76,7 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         docs_url=settings.docs_url,
         openapi_url=settings.openapi_url,
         middleware=middlewares,
+        lifespan=lifespan,
     )
 
     app.include_router(
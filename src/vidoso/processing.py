@@ -0,0 +1,115 @@
+from vidoso.core.logger import logger
+from vidoso.deps import (
+    get_audio_cache_dep,
+    get_audio_prefetcher_dep,
+    get_dynamodb_client_dep,
+    get_index_builder_dep,
+    get_index_update_publisher_dep,
+    get_ingest_encode_batcher_dep,
+    get_job_event_publisher_dep,
+    get_jobs_repo_dep,
+    get_segments_repo_dep,
+    get_settings_dep,
+    get_transcribe_executor_dep,
+    get_transcriber_dep,
+    get_transcripts_repo_dep,
+    transcript_version,
+)
+from vidoso.repo.schemas import JobProgress, JobStatus
+from vidoso.services.index_builder import TRAINED_INDEX_TYPES
+from vidoso.services.stream_processor import (
+    IngestOutcome,
+    stream_processor_service_fct,
+)
+from vidoso.worker import process_video_stream, train_user_index
+
+
+async def a_process_video_stream(job_id: str) -> None:
+    logger.info(f"a_process_video_stream [{job_id=}]")
+
+    settings = get_settings_dep()
+    dynamodb_client = get_dynamodb_client_dep()
+    transcriber = get_transcriber_dep(settings=settings)
+    jobs_repo = await get_jobs_repo_dep(dynamodb_client=dynamodb_client)
+    segments_repo = await get_segments_repo_dep(dynamodb_client=dynamodb_client)
+
+    job_db = await jobs_repo.get_by_job_id(job_id=job_id)
+    # the next jobs' audio downloads while this one is transcribed
+    get_audio_prefetcher_dep().prefetch()
+
+    stream_processor_svc = await stream_processor_service_fct(
+        jobs_repo=jobs_repo,
+        segments_repo=segments_repo,
+        transcriber=transcriber,
+        encode_batcher=get_ingest_encode_batcher_dep(),
+        audio_cache=get_audio_cache_dep(),
+        transcripts_repo=await get_transcripts_repo_dep(
+            dynamodb_client=dynamodb_client
+        ),
+        transcript_version=transcript_version(settings),
+        embed_batch_size=settings.ingest_embed_batch_size,
+        queue_batches=settings.ingest_queue_batches,
+        claim_ttl_seconds=settings.transcript_claim_ttl_seconds,
+        transcribe_executor=get_transcribe_executor_dep(),
+        job_events=get_job_event_publisher_dep(),
+        index_updates=get_index_update_publisher_dep(),
+    )
+    try:
+        if settings.transcript_dedupe:
+            outcome = await stream_processor_svc.process_job(job=job_db)
+        else:
+            await stream_processor_svc.process_stream(
+                stream_url=job_db.stream_url,
+                user=job_db.user,
+                job=job_db,
+            )
+            outcome = IngestOutcome.TRANSCRIBED
+    except Exception:
+        # the job stays processing, clients waiting on it are told it failed
+        await stream_processor_svc.set_progress(
+            job_db, JobProgress.FAILED, persist=True
+        )
+        raise
+    if outcome == IngestOutcome.IN_PROGRESS:
+        # coalesced with the job transcribing the same stream, the segments are
+        # copied once it is done
+        logger.info(f"a_process_video_stream waiting [{job_id=}]")
+        if job_db.progress != JobProgress.WAITING:
+            await stream_processor_svc.set_progress(
+                job_db, JobProgress.WAITING, persist=True
+            )
+        process_video_stream.schedule(
+            kwargs={"job_id": job_id, "stream_url": job_db.stream_url},
+            delay=settings.transcript_wait_seconds,
+        )
+        return
+
+    job_db.status = JobStatus.DONE
+    await stream_processor_svc.set_progress(job_db, JobProgress.DONE, persist=True)
+    logger.info(
+        f"a_process_video_stream done! [{outcome=}, "
+        f"{job_db.model_dump(exclude=['embedding'])=}]"
+    )
+
+    if settings.search_index_type in TRAINED_INDEX_TYPES:
+        train_user_index(user=job_db.user)
+
+
+async def a_train_user_index(user: str) -> None:
+    logger.info(f"a_train_user_index [{user=}]")
+
+    dynamodb_client = get_dynamodb_client_dep()
+    segments_repo = await get_segments_repo_dep(dynamodb_client=dynamodb_client)
+    index_builder = get_index_builder_dep()
+
+    # the segments are counted first, the corpus is only read and decoded when
+    # it grew enough since the last training
+    n = await segments_repo.count_by_user(user=user)
+    dim = await segments_repo.embedding_dim_by_user(user=user)
+    if dim is not None and not index_builder.needs_training(user=user, n=n, dim=dim):
+        logger.info(f"a_train_user_index skipped [{user=}, {n=}]")
+        return
+
+    segments_db = await segments_repo.get_multi_by_user(user=user)
+    trained = index_builder.train(user=user, segments=segments_db.segments)
+    logger.info(f"a_train_user_index done! [{user=}, {trained=}]")
@@ -0,0 +1,154 @@
+import asyncio
+import random
+import weakref
+from functools import partial
+from typing import Any
+
+from botocore.exceptions import ClientError
+
+from vidoso.core.logger import logger
+from vidoso.repo.clients import AsyncDynamoDBClient
+
+# dynamodb limit of items per BatchWriteItem request
+BATCH_WRITE_MAX_ITEMS = 25
+
+THROTTLING_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
+
+class BatchWriteError(Exception):
+    pass
+
+
+class AdaptiveLimiter:
+    def __init__(self, max_limit: int) -> None:
+        # aimd: the limit grows by one per successful request and is halved on
+        # throttling, it always stays in [1, max_limit]
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                logger.warning(f"batch write throttled [{self.limit=}]")
+            else:
+                self.limit = min(self.max_limit, self.limit + 1)
+            self.condition.notify_all()
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        dynamodb_client: AsyncDynamoDBClient,
+        max_in_flight: int = 8,
+        max_attempts: int = 8,
+        backoff_base_ms: float = 50,
+        backoff_max_ms: float = 5_000,
+    ) -> None:
+        self.dynamodb_client = dynamodb_client
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.backoff_base_ms = backoff_base_ms
+        self.backoff_max_ms = backoff_max_ms
+        # shared by all the writes, so the limit learned from throttling holds
+        # across calls. one per loop, asyncio primitives are bound to the loop
+        # they are first used on (the api's, the worker's resident one, a cli's)
+        self.limiters: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, AdaptiveLimiter
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        loop = asyncio.get_running_loop()
+        limiter = self.limiters.get(loop)
+        if limiter is None:
+            limiter = self.limiters[loop] = AdaptiveLimiter(self.max_in_flight)
+        return limiter
+
+    def backoff_seconds(self, attempt: int) -> float:
+        # full jitter exponential backoff
+        cap = min(self.backoff_max_ms, self.backoff_base_ms * 2**attempt)
+        return random.uniform(0, cap) / 1000
+
+    async def _write_batch(
+        self,
+        table_name: str,
+        limiter: AdaptiveLimiter,
+        requests: list[dict[str, Any]],
+    ) -> None:
+        for attempt in range(self.max_attempts):
+            await limiter.acquire()
+            throttled = False
+            try:
+                batch_write_items = partial(
+                    self.dynamodb_client.batch_write_item,
+                    RequestItems={table_name: requests},
+                )
+                response = await batch_write_items()
+                requests = response.get("UnprocessedItems", {}).get(table_name, [])
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in THROTTLING_ERROR_CODES:
+                    raise
+                throttled = True
+            finally:
+                await limiter.release(throttled=throttled)
+
+            if not requests:
+                return
+            logger.info(
+                f"batch write retry [{table_name=}, {attempt=}, "
+                f"{len(requests)=}, {throttled=}]"
+            )
+            await asyncio.sleep(self.backoff_seconds(attempt))
+
+        raise BatchWriteError(
+            f"{len(requests)} items not written to {table_name} "
+            f"after {self.max_attempts} attempts"
+        )
+
+    async def put_items(self, table_name: str, items: list[dict[str, Any]]) -> None:
+        # `items` are dynamodb serialized, with unique keys
+        limiter = self.limiter
+        requests = [{"PutRequest": {"Item": item}} for item in items]
+        async with asyncio.TaskGroup() as tg:
+            for start in range(0, len(requests), BATCH_WRITE_MAX_ITEMS):
+                tg.create_task(
+                    self._write_batch(
+                        table_name,
+                        limiter,
+                        requests[start : start + BATCH_WRITE_MAX_ITEMS],
+                    )
+                )
+        logger.info(f"batch write done [{table_name=}, {len(items)=}]")
+
+
+# factories
+
+
+def batch_writer_fct(
+    dynamodb_client: AsyncDynamoDBClient,
+    max_in_flight: int,
+    max_attempts: int,
+    backoff_base_ms: float,
+    backoff_max_ms: float,
+) -> BatchWriter:
+    batch_writer = BatchWriter(
+        dynamodb_client=dynamodb_client,
+        max_in_flight=max_in_flight,
+        max_attempts=max_attempts,
+        backoff_base_ms=backoff_base_ms,
+        backoff_max_ms=backoff_max_ms,
+    )
+    return batch_writer
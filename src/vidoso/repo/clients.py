@@ -0,0 +1,99 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from contextlib import AsyncExitStack
+from functools import partial
+from typing import Any, Protocol
+
+import boto3
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.config import Config
+
+from vidoso.config import DynamoDBBackend, Settings
+from vidoso.core.logger import logger
+
+
+class AsyncDynamoDBClient(Protocol):
+    # the subset of the dynamodb api used by the repos, both backends expose it
+    # with awaitable methods taking the boto3 keyword arguments
+    async def query(self, **kwargs: Any) -> dict[str, Any]: ...
+
+    async def scan(self, **kwargs: Any) -> dict[str, Any]: ...
+
+    async def get_item(self, **kwargs: Any) -> dict[str, Any]: ...
+
+    async def put_item(self, **kwargs: Any) -> dict[str, Any]: ...
+
+    async def update_item(self, **kwargs: Any) -> dict[str, Any]: ...
+
+    async def batch_write_item(self, **kwargs: Any) -> dict[str, Any]: ...
+
+
+class ThreadedDynamoDBClient:
+    def __init__(self, dynamodb_client: Any) -> None:
+        # blocking boto3 client, every call runs on the default executor
+        self.dynamodb_client = dynamodb_client
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[dict[str, Any]]]:
+        method = getattr(self.dynamodb_client, name)
+
+        async def call(**kwargs: Any) -> dict[str, Any]:
+            return await asyncio.to_thread(partial(method, **kwargs))
+
+        return call
+
+
+def boto_config(settings: Settings) -> Config:
+    return Config(
+        max_pool_connections=settings.dynamodb_max_pool_connections,
+        tcp_keepalive=settings.dynamodb_tcp_keepalive,
+    )
+
+
+def threaded_dynamodb_client(settings: Settings) -> ThreadedDynamoDBClient:
+    dynamodb_client = boto3.client("dynamodb", config=boto_config(settings))
+    return ThreadedDynamoDBClient(dynamodb_client)
+
+
+class DynamoDBClientPool:
+    def __init__(self) -> None:
+        # one long lived client per process, opened by the api lifespan and the
+        # worker startup. aiobotocore clients are bound to the loop they were
+        # opened on
+        self.client: AsyncDynamoDBClient | None = None
+        self.exit_stack: AsyncExitStack | None = None
+        self.lock = asyncio.Lock()
+
+    async def open(self, settings: Settings) -> AsyncDynamoDBClient:
+        async with self.lock:
+            if self.client is None:
+                self.client = await self._open(settings)
+            return self.client
+
+    async def _open(self, settings: Settings) -> AsyncDynamoDBClient:
+        client: AsyncDynamoDBClient
+        match settings.dynamodb_backend:
+            case DynamoDBBackend.BOTO3:
+                client = threaded_dynamodb_client(settings)
+            case DynamoDBBackend.AIOBOTOCORE:
+                config = AioConfig(
+                    max_pool_connections=settings.dynamodb_max_pool_connections,
+                    tcp_keepalive=settings.dynamodb_tcp_keepalive,
+                    connector_args={
+                        "keepalive_timeout": settings.dynamodb_keepalive_timeout_seconds
+                    },
+                )
+                self.exit_stack = AsyncExitStack()
+                client = await self.exit_stack.enter_async_context(
+                    get_session().create_client("dynamodb", config=config)
+                )
+        logger.info(f"dynamodb client opened [{settings.dynamodb_backend=}]")
+        return client
+
+    async def close(self) -> None:
+        async with self.lock:
+            if self.exit_stack is not None:
+                await self.exit_stack.aclose()
+            self.client = None
+            self.exit_stack = None
+        logger.info("dynamodb client closed")
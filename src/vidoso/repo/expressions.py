@@ -0,0 +1,29 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+
+def projected_attributes(
+    model: type[BaseModel],
+    attributes: list[str] | None,
+) -> list[str] | None:
+    # required fields are always projected, so items still validate as `model`
+    if attributes is None:
+        return None
+    required = [name for name, f in model.model_fields.items() if f.is_required()]
+    return list(dict.fromkeys(required + attributes))
+
+
+def build_projection(
+    attributes: list[str] | None,
+    attribute_names: dict[str, str],
+) -> dict[str, Any]:
+    # every attribute goes through a placeholder, most of ours (user, start, end,
+    # text, ...) are dynamodb reserved words
+    if attributes is None:
+        return {"ExpressionAttributeNames": attribute_names}
+    names = {f"#p{i}": attribute for i, attribute in enumerate(attributes)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": attribute_names | names,
+    }
@@ -1,14 +1,20 @@
 import asyncio
 import datetime as dt
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from decimal import Decimal
 from functools import partial
 from typing import Any
 from uuid import uuid4
 
 from boto3.dynamodb.conditions import ConditionExpressionBuilder, Key
 from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
-from mypy_boto3_dynamodb.client import DynamoDBClient
 
 from vidoso.core.logger import logger
+from vidoso.repo.batch_writer import BatchWriter
+from vidoso.repo.clients import AsyncDynamoDBClient
+from vidoso.repo.expressions import build_projection, projected_attributes
+from vidoso.repo.pagination import Paginator, before, chain_pages, split_range
 from vidoso.repo.schemas import JobDb, JobsDb
 
 TABLE_NAME = "jobs"
@@ -22,9 +28,17 @@ DESERIALIZER = TypeDeserializer()
 class JobsRepo:
     def __init__(
         self,
-        dynamodb_client: DynamoDBClient,
+        dynamodb_client: AsyncDynamoDBClient,
+        page_size: int | None = None,
+        prefetch_pages: int = 1,
+        parallel_ranges: int = 1,
+        batch_writer: BatchWriter | None = None,
     ) -> None:
         self.dynamodb_client = dynamodb_client
+        self.batch_writer = batch_writer or BatchWriter(dynamodb_client)
+        self.page_size = page_size
+        self.prefetch_pages = prefetch_pages
+        self.parallel_ranges = parallel_ranges
 
     def deserialize_values(
         self,
@@ -41,6 +55,7 @@ class JobsRepo:
     async def get_by_job_id(
         self,
         job_id: str,
+        attributes: list[str] | None = None,
     ) -> JobDb:
         logger.info(f"get_by_job_id {job_id=}")
 
@@ -52,26 +67,42 @@ class JobsRepo:
             self.dynamodb_client.query,
             TableName=TABLE_NAME,
             KeyConditionExpression=expr.condition_expression,
-            ExpressionAttributeNames=expr.attribute_name_placeholders,
             ExpressionAttributeValues=self.serialize_values(
                 expr.attribute_value_placeholders
             ),
+            **build_projection(
+                projected_attributes(JobDb, attributes),
+                expr.attribute_name_placeholders,
+            ),
         )
-        response = await asyncio.to_thread(get_items)
+        response = await get_items()
         job = JobDb.model_validate(self.deserialize_values(response["Items"][0]))
         return job
 
-    async def get_multi_by_user(
+    async def get_multi_by_job_ids(
         self,
-        user: str,
-        created_after: dt.datetime | None = None,
-        created_before: dt.datetime | None = None,
+        job_ids: list[str],
+        attributes: list[str] | None = None,
     ) -> JobsDb:
-        logger.info(f"get_multi_by_user {user=}")
+        # one query per job, concurrently. unknown ids are left out
+        async def get(job_id: str) -> JobDb | None:
+            try:
+                return await self.get_by_job_id(job_id=job_id, attributes=attributes)
+            except IndexError:
+                return None
 
-        start = int(created_after.timestamp()) if created_after else 0
-        end = int(created_before.timestamp()) if created_before else None
+        found = await asyncio.gather(*(get(job_id) for job_id in job_ids))
+        jobs = JobsDb(jobs=[job for job in found if job is not None])
+        return jobs
 
+    def query_by_user(
+        self,
+        user: str,
+        start: int | Decimal,
+        end: int | Decimal | None = None,
+        attributes: list[str] | None = None,
+        limit: int | None = None,
+    ) -> Callable[..., Awaitable[dict[str, Any]]]:
         key_cond = Key("user").eq(user)
         if end is None:
             key_cond &= Key("created_at").gte(start)
@@ -86,15 +117,81 @@ class JobsRepo:
             TableName=TABLE_NAME,
             IndexName="user-index",
             KeyConditionExpression=expr.condition_expression,
-            ExpressionAttributeNames=expr.attribute_name_placeholders,
             ExpressionAttributeValues=self.serialize_values(
                 expr.attribute_value_placeholders
             ),
+            **build_projection(
+                projected_attributes(JobDb, attributes),
+                expr.attribute_name_placeholders,
+            ),
+            **({"Limit": limit} if limit else {}),
         )
-        response = await asyncio.to_thread(get_items)
+        return get_items
+
+    async def paginators_by_user(
+        self,
+        user: str,
+        start: int,
+        end: int | None = None,
+        attributes: list[str] | None = None,
+    ) -> list[Paginator]:
+        ranges: list[tuple[int | Decimal, int | Decimal | None]] = [(start, end)]
+        if self.parallel_ranges > 1:
+            # the range is narrowed to the user's first job, so sub-ranges don't
+            # get spent on empty stretches of time
+            first = await self.query_by_user(user, start, end, attributes=[], limit=1)()
+            if first["Items"]:
+                first_at = self.deserialize_values(first["Items"][0])["created_at"]
+                split_end = Decimal(end if end is not None else int(time.time()))
+                if split_end > first_at:
+                    ranges = list(
+                        split_range(first_at, split_end, parts=self.parallel_ranges)
+                    )
+                    # newer jobs than the split end belong to the last range
+                    ranges[-1] = (ranges[-1][0], end)
+        return [
+            Paginator(
+                self.query_by_user(user, range_start, range_end, attributes),
+                page_size=self.page_size,
+                prefetch_pages=self.prefetch_pages,
+                # the last range holds its end, the others' is the next's start
+                keep=before("created_at", range_end) if i < len(ranges) - 1 else None,
+            )
+            for i, (range_start, range_end) in enumerate(ranges)
+        ]
+
+    async def iter_by_user(
+        self,
+        user: str,
+        created_after: dt.datetime | None = None,
+        created_before: dt.datetime | None = None,
+        attributes: list[str] | None = None,
+    ) -> AsyncIterator[JobDb]:
+        logger.info(f"iter_by_user {user=}, {attributes=}")
+
+        start = int(created_after.timestamp()) if created_after else 0
+        end = int(created_before.timestamp()) if created_before else None
+        paginators = await self.paginators_by_user(user, start, end, attributes)
+
+        async for items in chain_pages(paginators):
+            for item in items:
+                yield JobDb.model_validate(self.deserialize_values(item))
+
+    async def get_multi_by_user(
+        self,
+        user: str,
+        created_after: dt.datetime | None = None,
+        created_before: dt.datetime | None = None,
+        attributes: list[str] | None = None,
+    ) -> JobsDb:
         results = [
-            JobDb.model_validate(self.deserialize_values(item))
-            for item in response["Items"]
+            job
+            async for job in self.iter_by_user(
+                user=user,
+                created_after=created_after,
+                created_before=created_before,
+                attributes=attributes,
+            )
         ]
         jobs = JobsDb(jobs=results)
         return jobs
@@ -136,15 +233,43 @@ class JobsRepo:
             ExpressionAttributeValues=values,
             **condition_expression,
         )
-        await asyncio.to_thread(update_func)
+        await update_func()
         return job
 
+    async def upsert_multi(
+        self,
+        jobs: list[JobDb],
+    ) -> list[JobDb]:
+        # BatchWriteItem puts, items are replaced as a whole rather than updated
+        # attribute by attribute like `upsert` does
+        for job in jobs:
+            if not job.job_id:
+                job.job_id = str(uuid4())
+        unique = {(j.job_id, j.created_at): j for j in jobs}
+        logger.info(f"upsert_multi [{len(jobs)=}, {len(unique)=}]")
+        items = [
+            self.serialize_values(job.model_dump(exclude_none=True))
+            for job in unique.values()
+        ]
+        await self.batch_writer.put_items(table_name=TABLE_NAME, items=items)
+        return jobs
+
 
 # factories
 
 
 async def jobs_repo_fct(
-    dynamodb_client: DynamoDBClient,
+    dynamodb_client: AsyncDynamoDBClient,
+    page_size: int | None = None,
+    prefetch_pages: int = 1,
+    parallel_ranges: int = 1,
+    batch_writer: BatchWriter | None = None,
 ) -> JobsRepo:
-    jobs_repo = JobsRepo(dynamodb_client=dynamodb_client)
+    jobs_repo = JobsRepo(
+        dynamodb_client=dynamodb_client,
+        page_size=page_size,
+        prefetch_pages=prefetch_pages,
+        parallel_ranges=parallel_ranges,
+        batch_writer=batch_writer,
+    )
     return jobs_repo
@@ -0,0 +1,107 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from decimal import Decimal
+from typing import Any
+
+from vidoso.core.logger import logger
+
+# marks the end of a paginated query in the prefetch queue
+END_OF_PAGES = None
+
+
+class Paginator:
+    def __init__(
+        self,
+        query: Callable[..., Awaitable[dict[str, Any]]],
+        page_size: int | None = None,
+        prefetch_pages: int = 1,
+        keep: Callable[[dict[str, Any]], bool] | None = None,
+    ) -> None:
+        # `query` is a partially applied dynamodb query/scan, it is called once
+        # per page with `Limit` and `ExclusiveStartKey`. `keep` drops the items
+        # a key condition can't, e.g. the exclusive end of a range
+        self.query = query
+        self.page_size = page_size
+        self.keep = keep
+        self.queue: asyncio.Queue[list[dict[str, Any]] | BaseException | None] = (
+            asyncio.Queue(maxsize=max(prefetch_pages, 1))
+        )
+        self.task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        # pages are fetched in the background, at most `prefetch_pages` ahead of
+        # the consumer
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._fetch())
+
+    async def _fetch(self) -> None:
+        limit = {"Limit": self.page_size} if self.page_size else {}
+        exclusive_start_key: dict[str, Any] = {}
+        try:
+            while True:
+                response = await self.query(**limit, **exclusive_start_key)
+                items = response["Items"]
+                if self.keep is not None:
+                    items = [item for item in items if self.keep(item)]
+                await self.queue.put(items)
+                if "LastEvaluatedKey" not in response:
+                    break
+                exclusive_start_key = {
+                    "ExclusiveStartKey": response["LastEvaluatedKey"]
+                }
+        except Exception as e:
+            await self.queue.put(e)
+            return
+        await self.queue.put(END_OF_PAGES)
+
+    async def pages(self) -> AsyncIterator[list[dict[str, Any]]]:
+        self.start()
+        try:
+            while True:
+                page = await self.queue.get()
+                if page is END_OF_PAGES:
+                    return
+                if isinstance(page, BaseException):
+                    raise page
+                yield page
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+async def chain_pages(
+    paginators: list[Paginator],
+) -> AsyncIterator[list[dict[str, Any]]]:
+    # every paginator prefetches concurrently, pages are drained in order
+    for paginator in paginators:
+        paginator.start()
+    try:
+        for paginator in paginators:
+            async for page in paginator.pages():
+                yield page
+    finally:
+        for paginator in paginators:
+            paginator.cancel()
+
+
+def split_range(
+    start: Decimal, end: Decimal, parts: int
+) -> list[tuple[Decimal, Decimal]]:
+    # contiguous ranges covering [start, end], each one [lo, hi) but the last
+    # [lo, hi]. the bounds are sort key values as stored (fractional seconds),
+    # every item falls in exactly one range
+    parts = max(1, parts)
+    step = (end - start) / parts
+    bounds = [start + i * step for i in range(parts)] + [end]
+    ranges = list(zip(bounds, bounds[1:]))
+    logger.debug(f"split_range [{start=}, {end=}, {ranges=}]")
+    return ranges
+
+
+def before(attribute: str, end: Decimal) -> Callable[[dict[str, Any]], bool]:
+    # key conditions take a single sort key comparison, ranges are queried with
+    # an inclusive `between` and the items at their exclusive end dropped
+    return lambda item: Decimal(item[attribute]["N"]) < end
@@ -1,7 +1,10 @@
 import datetime as dt
+import json
 from decimal import Decimal
 from enum import StrEnum, auto
+from typing import Any
 
+import numpy as np
 from pydantic import BaseModel, field_serializer
 
 
@@ -10,12 +13,25 @@ class JobStatus(StrEnum):
     DONE = auto()
 
 
+class JobProgress(StrEnum):
+    # the stage a job is in, pushed to the clients as it changes
+    QUEUED = auto()
+    DOWNLOADING = auto()
+    TRANSCRIBING = auto()
+    # another job is transcribing the same stream
+    WAITING = auto()
+    DONE = auto()
+    FAILED = auto()
+
+
 class JobDb(BaseModel):
     job_id: str | None = None
     user: str
     created_at: dt.datetime
     status: JobStatus
     stream_url: str
+    segments_done: int = 0
+    progress: JobProgress | None = None
 
     @field_serializer("created_at")
     def serialize_dt(self, created_at: dt.datetime) -> float:
@@ -29,6 +45,80 @@ class JobsDb(BaseModel):
 # -------------#
 
 
+class TranscriptStatus(StrEnum):
+    PROCESSING = auto()
+    DONE = auto()
+    FAILED = auto()
+
+
+class TranscriptDb(BaseModel):
+    # `transcript_key` identifies a (normalized stream url, model versions) pair,
+    # `transcript_id` the segments transcribed for it by the job in `job_id`
+    transcript_key: str
+    transcript_id: str
+    stream_url: str
+    status: TranscriptStatus
+    job_id: str
+    updated_at: dt.datetime
+    segments: int = 0
+
+    @field_serializer("updated_at")
+    def serialize_dt(self, updated_at: dt.datetime) -> Decimal:
+        return Decimal(updated_at.timestamp())
+
+
+# -------------#
+
+# embeddings are stored as L2-normalized little-endian float32 bytes (dynamodb
+# Binary), tagged with `<dtype>:<dim>:<version>` in `embedding_format`. Items
+# without a tag are legacy json encoded lists of floats.
+EMBEDDING_DTYPE = np.dtype("<f4")
+EMBEDDING_FORMAT_VERSION = 1
+
+
+def embedding_format_tag(dim: int) -> str:
+    return f"{EMBEDDING_DTYPE.str}:{dim}:{EMBEDDING_FORMAT_VERSION}"
+
+
+def parse_embedding_format_tag(tag: str) -> tuple[np.dtype, int, int]:
+    dtype, dim, version = tag.split(":")
+    return np.dtype(dtype), int(dim), int(version)
+
+
+def encode_embedding(embedding: np.ndarray) -> tuple[bytes, str]:
+    vector = np.asarray(embedding, dtype=np.float64).ravel()
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return vector.astype(EMBEDDING_DTYPE).tobytes(), embedding_format_tag(len(vector))
+
+
+def decode_embedding(
+    embedding: bytes | str, embedding_format: str | None
+) -> np.ndarray:
+    if embedding_format is None:
+        vector = np.array(json.loads(embedding), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    dtype, dim, _ = parse_embedding_format_tag(embedding_format)
+    return np.frombuffer(embedding, dtype=dtype, count=dim)
+
+
+def decode_embeddings(segments: list["SegmentDb"]) -> np.ndarray:
+    formats = {segment.embedding_format for segment in segments}
+    if len(formats) == 1 and None not in formats:
+        # fast path: one contiguous buffer, decoded without per row copies
+        dtype, dim, _ = parse_embedding_format_tag(formats.pop())
+        buffer = b"".join(segment.embedding for segment in segments)
+        return np.frombuffer(buffer, dtype=dtype).reshape(len(segments), dim)
+
+    rows = [
+        decode_embedding(segment.embedding, segment.embedding_format)
+        for segment in segments
+    ]
+    return np.vstack(rows).astype(np.float32) if rows else np.empty((0, 0), np.float32)
+
+
 class SegmentDb(BaseModel):
     transcript_id: str
     segment_id: int
@@ -38,12 +128,26 @@ class SegmentDb(BaseModel):
     start: Decimal
     end: Decimal
     text: str
-    embedding: str
+    embedding: bytes | str | None = None
+    embedding_format: str | None = None
 
     @field_serializer("created_at")
     def serialize_dt(self, created_at: dt.datetime) -> Decimal:
         return Decimal(created_at.timestamp())
 
+    def decode_embedding(self) -> np.ndarray:
+        return decode_embedding(self.embedding, self.embedding_format)
+
+    def dump_for_read(self, exclude_embedding: bool = True) -> dict[str, Any]:
+        segment_dump = self.model_dump(exclude=["embedding", "embedding_format"])
+        if exclude_embedding or self.embedding is None:
+            return segment_dump
+        if self.embedding_format is None:
+            segment_dump["embedding"] = self.embedding
+        else:
+            segment_dump["embedding"] = json.dumps(self.decode_embedding().tolist())
+        return segment_dump
+
 
 class SegmentsDb(BaseModel):
     segments: list[SegmentDb]
@@ -1,19 +1,34 @@
-import asyncio
 import datetime as dt
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from decimal import Decimal
 from functools import partial
 from typing import Any
 
-from boto3.dynamodb.conditions import ConditionExpressionBuilder, Key
-from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
-from mypy_boto3_dynamodb.client import DynamoDBClient
+from boto3.dynamodb.conditions import Attr, ConditionExpressionBuilder, Key
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
 
 from vidoso.core.logger import logger
-from vidoso.repo.schemas import SegmentDb, SegmentsDb
+from vidoso.repo.batch_writer import BatchWriter
+from vidoso.repo.clients import AsyncDynamoDBClient
+from vidoso.repo.expressions import build_projection, projected_attributes
+from vidoso.repo.pagination import Paginator, before, chain_pages, split_range
+from vidoso.repo.schemas import (
+    SegmentDb,
+    SegmentsDb,
+    encode_embedding,
+    parse_embedding_format_tag,
+)
 
 TABLE_NAME = "segments"
 
 KEY_ATTRIBUTES = ["transcript_id", "segment_id"]
 
+EMBEDDING_ATTRIBUTES = ["embedding", "embedding_format"]
+ATTRIBUTES_WITHOUT_EMBEDDING = [
+    name for name in SegmentDb.model_fields if name not in EMBEDDING_ATTRIBUTES
+]
+
 SERIALIZER = TypeSerializer()
 DESERIALIZER = TypeDeserializer()
 
@@ -21,15 +36,24 @@ DESERIALIZER = TypeDeserializer()
 class SegmentsRepo:
     def __init__(
         self,
-        dynamodb_client: DynamoDBClient,
+        dynamodb_client: AsyncDynamoDBClient,
+        page_size: int | None = None,
+        prefetch_pages: int = 1,
+        parallel_ranges: int = 1,
+        batch_writer: BatchWriter | None = None,
     ) -> None:
         self.dynamodb_client = dynamodb_client
+        self.batch_writer = batch_writer or BatchWriter(dynamodb_client)
+        self.page_size = page_size
+        self.prefetch_pages = prefetch_pages
+        self.parallel_ranges = parallel_ranges
 
     def deserialize_values(
         self,
         item: dict[str, Any],
     ) -> dict[str, Any]:
-        return {k: DESERIALIZER.deserialize(value=v) for k, v in item.items()}
+        values = {k: DESERIALIZER.deserialize(value=v) for k, v in item.items()}
+        return {k: v.value if isinstance(v, Binary) else v for k, v in values.items()}
 
     def serialize_values(
         self,
@@ -40,6 +64,7 @@ class SegmentsRepo:
     async def get_multi_by_transcript_id(
         self,
         transcript_id: str,
+        attributes: list[str] | None = None,
     ) -> SegmentsDb:
         logger.info(f"get_multi_by_transcript_id {transcript_id=}")
 
@@ -53,30 +78,33 @@ class SegmentsRepo:
             TableName=TABLE_NAME,
             # IndexName="user-index",
             KeyConditionExpression=expr.condition_expression,
-            ExpressionAttributeNames=expr.attribute_name_placeholders,
             ExpressionAttributeValues=self.serialize_values(
                 expr.attribute_value_placeholders
             ),
+            **build_projection(
+                projected_attributes(SegmentDb, attributes),
+                expr.attribute_name_placeholders,
+            ),
+        )
+        paginator = Paginator(
+            get_items, page_size=self.page_size, prefetch_pages=self.prefetch_pages
         )
-        response = await asyncio.to_thread(get_items)
         results = [
             SegmentDb.model_validate(self.deserialize_values(item))
-            for item in response["Items"]
+            async for items in paginator.pages()
+            for item in items
         ]
         segments = SegmentsDb(segments=results)
         return segments
 
-    async def get_multi_by_user(
+    def query_by_user(
         self,
         user: str,
-        created_after: dt.datetime | None = None,
-        created_before: dt.datetime | None = None,
-    ) -> SegmentsDb:
-        logger.info(f"get_multi_by_user {user=}")
-
-        start = int(created_after.timestamp()) if created_after else 0
-        end = int(created_before.timestamp()) if created_before else None
-
+        start: int | Decimal,
+        end: int | Decimal | None = None,
+        attributes: list[str] | None = None,
+        limit: int | None = None,
+    ) -> Callable[..., Awaitable[dict[str, Any]]]:
         key_cond = Key("user").eq(user)
         if end is None:
             key_cond &= Key("created_at").gte(start)
@@ -91,17 +119,139 @@ class SegmentsRepo:
             TableName=TABLE_NAME,
             IndexName="user-index",
             KeyConditionExpression=expr.condition_expression,
-            ExpressionAttributeNames=expr.attribute_name_placeholders,
             ExpressionAttributeValues=self.serialize_values(
                 expr.attribute_value_placeholders
             ),
+            **build_projection(
+                projected_attributes(SegmentDb, attributes),
+                expr.attribute_name_placeholders,
+            ),
+            **({"Limit": limit} if limit else {}),
         )
-        response = await asyncio.to_thread(get_items)
+        return get_items
+
+    async def count_by_user(self, user: str) -> int:
+        # Select=COUNT pages through the index without returning the items
+        query = partial(self.query_by_user(user, start=0), Select="COUNT")
+        count = 0
+        page: dict[str, Any] = {}
+        while True:
+            response = await query(**page)
+            count += response["Count"]
+            if "LastEvaluatedKey" not in response:
+                return count
+            page = {"ExclusiveStartKey": response["LastEvaluatedKey"]}
+
+    async def embedding_dim_by_user(self, user: str) -> int | None:
+        # the dimension tagged on the user's first segment, None when there are
+        # no segments or they are legacy (untagged) ones
+        response = await self.query_by_user(
+            user, start=0, attributes=["embedding_format"], limit=1
+        )()
+        if not response["Items"]:
+            return None
+        segment = self.deserialize_values(response["Items"][0])
+        if segment.get("embedding_format") is None:
+            return None
+        _, dim, _ = parse_embedding_format_tag(segment["embedding_format"])
+        return dim
+
+    async def paginators_by_user(
+        self,
+        user: str,
+        start: int,
+        end: int | None = None,
+        attributes: list[str] | None = None,
+    ) -> list[Paginator]:
+        ranges: list[tuple[int | Decimal, int | Decimal | None]] = [(start, end)]
+        if self.parallel_ranges > 1:
+            # the range is narrowed to the user's first segment, so sub-ranges
+            # don't get spent on empty stretches of time
+            first = await self.query_by_user(user, start, end, attributes=[], limit=1)()
+            if first["Items"]:
+                first_at = self.deserialize_values(first["Items"][0])["created_at"]
+                split_end = Decimal(end if end is not None else int(time.time()))
+                if split_end > first_at:
+                    ranges = list(
+                        split_range(first_at, split_end, parts=self.parallel_ranges)
+                    )
+                    # newer segments than the split end belong to the last range
+                    ranges[-1] = (ranges[-1][0], end)
+        return [
+            Paginator(
+                self.query_by_user(user, range_start, range_end, attributes),
+                page_size=self.page_size,
+                prefetch_pages=self.prefetch_pages,
+                # the last range holds its end, the others' is the next's start
+                keep=before("created_at", range_end) if i < len(ranges) - 1 else None,
+            )
+            for i, (range_start, range_end) in enumerate(ranges)
+        ]
+
+    async def iter_pages_by_user(
+        self,
+        user: str,
+        created_after: dt.datetime | None = None,
+        created_before: dt.datetime | None = None,
+        attributes: list[str] | None = None,
+    ) -> AsyncIterator[list[SegmentDb]]:
+        logger.info(f"iter_pages_by_user {user=}, {attributes=}")
+
+        start = int(created_after.timestamp()) if created_after else 0
+        end = int(created_before.timestamp()) if created_before else None
+        paginators = await self.paginators_by_user(user, start, end, attributes)
+
+        # pages come ordered by created_at only, segments sharing the last
+        # timestamp of a page are held back until the next timestamp shows up,
+        # so each page can be ordered by (created_at, segment_id)
+        held: list[SegmentDb] = []
+        async for items in chain_pages(paginators):
+            segments = held + [
+                SegmentDb.model_validate(self.deserialize_values(item))
+                for item in items
+            ]
+            if not segments:
+                continue
+            last_created_at = segments[-1].created_at
+            held = [s for s in segments if s.created_at == last_created_at]
+            ready = [s for s in segments if s.created_at != last_created_at]
+            if ready:
+                yield sorted(ready, key=lambda x: (x.created_at, x.segment_id))
+        if held:
+            yield sorted(held, key=lambda x: x.segment_id)
+
+    async def iter_by_user(
+        self,
+        user: str,
+        created_after: dt.datetime | None = None,
+        created_before: dt.datetime | None = None,
+        attributes: list[str] | None = None,
+    ) -> AsyncIterator[SegmentDb]:
+        async for segments in self.iter_pages_by_user(
+            user=user,
+            created_after=created_after,
+            created_before=created_before,
+            attributes=attributes,
+        ):
+            for segment in segments:
+                yield segment
+
+    async def get_multi_by_user(
+        self,
+        user: str,
+        created_after: dt.datetime | None = None,
+        created_before: dt.datetime | None = None,
+        attributes: list[str] | None = None,
+    ) -> SegmentsDb:
         results = [
-            SegmentDb.model_validate(self.deserialize_values(item))
-            for item in response["Items"]
+            segment
+            async for segment in self.iter_by_user(
+                user=user,
+                created_after=created_after,
+                created_before=created_before,
+                attributes=attributes,
+            )
         ]
-        results.sort(key=lambda x: (x.created_at, x.segment_id))
         segments = SegmentsDb(segments=results)
         return segments
 
@@ -111,7 +261,9 @@ class SegmentsRepo:
         fail_if_exists: bool = False,
     ) -> SegmentDb:
         segment_dump = segment.model_dump(exclude_none=True)
-        segment_dump_excluding_embedding = segment.model_dump(exclude=["embedding"])
+        segment_dump_excluding_embedding = segment.model_dump(
+            exclude=["embedding", "embedding_format"]
+        )
         logger.info(f"segment {segment_dump_excluding_embedding=}")
         indexed_attrs = list(enumerate(segment_dump.items()))
         update_expr = ", ".join(
@@ -141,15 +293,75 @@ class SegmentsRepo:
             ExpressionAttributeValues=values,
             **condition_expression,
         )
-        await asyncio.to_thread(update_func)
+        await update_func()
         return segment
 
+    async def upsert_multi(
+        self,
+        segments: list[SegmentDb],
+    ) -> list[SegmentDb]:
+        # BatchWriteItem puts, items are replaced as a whole rather than updated
+        # attribute by attribute like `upsert` does
+        unique = {(s.transcript_id, s.segment_id): s for s in segments}
+        logger.info(f"upsert_multi [{len(segments)=}, {len(unique)=}]")
+        items = [
+            self.serialize_values(segment.model_dump(exclude_none=True))
+            for segment in unique.values()
+        ]
+        await self.batch_writer.put_items(table_name=TABLE_NAME, items=items)
+        return segments
+
+    async def migrate_legacy_embeddings(self) -> int:
+        # rewrites json encoded embeddings into the binary float32 format
+        logger.info("migrate_legacy_embeddings")
+
+        builder = ConditionExpressionBuilder()
+        expr = builder.build_expression(Attr("embedding_format").not_exists())
+
+        migrated = 0
+        exclusive_start_key: dict[str, Any] = {}
+        while True:
+            scan_items = partial(
+                self.dynamodb_client.scan,
+                TableName=TABLE_NAME,
+                FilterExpression=expr.condition_expression,
+                ExpressionAttributeNames=expr.attribute_name_placeholders,
+                **exclusive_start_key,
+            )
+            response = await scan_items()
+            segments = [
+                SegmentDb.model_validate(self.deserialize_values(item))
+                for item in response["Items"]
+            ]
+            for segment in segments:
+                segment.embedding, segment.embedding_format = encode_embedding(
+                    segment.decode_embedding()
+                )
+            await self.upsert_multi(segments=segments)
+            migrated += len(segments)
+            logger.info(f"migrate_legacy_embeddings [{migrated=}]")
+
+            if "LastEvaluatedKey" not in response:
+                break
+            exclusive_start_key = {"ExclusiveStartKey": response["LastEvaluatedKey"]}
+        return migrated
+
 
 # factories
 
 
 async def segments_repo_fct(
-    dynamodb_client: DynamoDBClient,
+    dynamodb_client: AsyncDynamoDBClient,
+    page_size: int | None = None,
+    prefetch_pages: int = 1,
+    parallel_ranges: int = 1,
+    batch_writer: BatchWriter | None = None,
 ) -> SegmentsRepo:
-    segments_repo = SegmentsRepo(dynamodb_client=dynamodb_client)
+    segments_repo = SegmentsRepo(
+        dynamodb_client=dynamodb_client,
+        page_size=page_size,
+        prefetch_pages=prefetch_pages,
+        parallel_ranges=parallel_ranges,
+        batch_writer=batch_writer,
+    )
     return segments_repo
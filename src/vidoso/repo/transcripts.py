@@ -0,0 +1,162 @@
+import datetime as dt
+from decimal import Decimal
+from functools import partial
+from typing import Any
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+from vidoso.core.logger import logger
+from vidoso.repo.clients import AsyncDynamoDBClient
+from vidoso.repo.schemas import TranscriptDb, TranscriptStatus
+
+TABLE_NAME = "transcripts"
+
+SERIALIZER = TypeSerializer()
+DESERIALIZER = TypeDeserializer()
+
+
+class TranscriptsRepo:
+    def __init__(self, dynamodb_client: AsyncDynamoDBClient) -> None:
+        self.dynamodb_client = dynamodb_client
+
+    def deserialize_values(
+        self,
+        item: dict[str, Any],
+    ) -> dict[str, Any]:
+        return {k: DESERIALIZER.deserialize(value=v) for k, v in item.items()}
+
+    def serialize_values(
+        self,
+        item: dict[str, Any],
+    ) -> dict[str, Any]:
+        return {k: SERIALIZER.serialize(value=v) for k, v in item.items()}
+
+    async def get_by_transcript_key(self, transcript_key: str) -> TranscriptDb | None:
+        logger.info(f"get_by_transcript_key {transcript_key=}")
+        get_item = partial(
+            self.dynamodb_client.get_item,
+            TableName=TABLE_NAME,
+            Key=self.serialize_values({"transcript_key": transcript_key}),
+            ConsistentRead=True,
+        )
+        response = await get_item()
+        if "Item" not in response:
+            return None
+        return TranscriptDb.model_validate(self.deserialize_values(response["Item"]))
+
+    async def claim(
+        self,
+        transcript: TranscriptDb,
+        stale_before: dt.datetime,
+    ) -> TranscriptDb | None:
+        # conditional put, only one job transcribes a given key at a time. the
+        # claim is taken over when the key is new, its transcription failed or
+        # its job stopped updating it before `stale_before`. returns None when
+        # claimed, the current transcript otherwise
+        put_item = partial(
+            self.dynamodb_client.put_item,
+            TableName=TABLE_NAME,
+            Item=self.serialize_values(transcript.model_dump()),
+            ConditionExpression=(
+                "attribute_not_exists(transcript_key) OR #status = :failed OR "
+                "(#status = :processing AND updated_at < :stale_before)"
+            ),
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues=self.serialize_values(
+                {
+                    ":failed": TranscriptStatus.FAILED.value,
+                    ":processing": TranscriptStatus.PROCESSING.value,
+                    ":stale_before": Decimal(stale_before.timestamp()),
+                }
+            ),
+        )
+        try:
+            await put_item()
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            existing = await self.get_by_transcript_key(transcript.transcript_key)
+            logger.info(f"transcript already claimed [{existing=}]")
+            return existing
+        logger.info(f"transcript claimed [{transcript=}]")
+        return None
+
+    async def refresh_claim(self, transcript: TranscriptDb) -> bool:
+        # the claim's `updated_at` is its heartbeat, other jobs only take over
+        # a claim that stopped moving. returns False when it was taken over
+        transcript.updated_at = dt.datetime.now()
+        update_item = partial(
+            self.dynamodb_client.update_item,
+            TableName=TABLE_NAME,
+            Key=self.serialize_values({"transcript_key": transcript.transcript_key}),
+            UpdateExpression="SET updated_at = :updated_at",
+            ConditionExpression="job_id = :job_id AND #status = :processing",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues=self.serialize_values(
+                {
+                    ":updated_at": Decimal(transcript.updated_at.timestamp()),
+                    ":job_id": transcript.job_id,
+                    ":processing": TranscriptStatus.PROCESSING.value,
+                }
+            ),
+        )
+        try:
+            await update_item()
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    async def update_status(
+        self,
+        transcript: TranscriptDb,
+        status: TranscriptStatus,
+        segments: int | None = None,
+    ) -> bool:
+        # only the job holding the claim updates it. returns False when it was
+        # taken over
+        transcript.status = status
+        transcript.updated_at = dt.datetime.now()
+        if segments is not None:
+            transcript.segments = segments
+        transcript_dump = transcript.model_dump()
+        update_item = partial(
+            self.dynamodb_client.update_item,
+            TableName=TABLE_NAME,
+            Key=self.serialize_values({"transcript_key": transcript.transcript_key}),
+            UpdateExpression=(
+                "SET #status = :status, updated_at = :updated_at, #segments = :segments"
+            ),
+            ConditionExpression="job_id = :job_id",
+            # status and segments are dynamodb reserved words
+            ExpressionAttributeNames={"#status": "status", "#segments": "segments"},
+            ExpressionAttributeValues=self.serialize_values(
+                {
+                    ":status": transcript_dump["status"],
+                    ":updated_at": transcript_dump["updated_at"],
+                    ":segments": transcript_dump["segments"],
+                    ":job_id": transcript_dump["job_id"],
+                }
+            ),
+        )
+        try:
+            await update_item()
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.warning(f"transcript claim lost [{transcript=}]")
+            return False
+        logger.info(f"transcript updated [{transcript=}]")
+        return True
+
+
+# factories
+
+
+async def transcripts_repo_fct(
+    dynamodb_client: AsyncDynamoDBClient,
+) -> TranscriptsRepo:
+    transcripts_repo = TranscriptsRepo(dynamodb_client=dynamodb_client)
+    return transcripts_repo
@@ -1,31 +1,50 @@
-import asyncio
 import datetime as dt
+from collections.abc import AsyncIterator
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends, Query, Response, status
+from fastapi import APIRouter, Body, Depends, Header, Query, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from vidoso import worker
 from vidoso.config import Settings
+from vidoso.core.timing import (
+    PROMETHEUS_CONTENT_TYPE,
+    collect_timings,
+    server_timing,
+    stage_timings,
+)
 from vidoso.deps import (
+    get_embedding_cache_dep,
+    get_job_event_hub_dep,
     get_jobs_repo_dep,
+    get_model_registry_dep,
     get_search_service_dep,
     get_segments_repo_dep,
     get_settings_dep,
     get_stream_processor_service_dep,
 )
 from vidoso.repo.jobs import JobsRepo
-from vidoso.repo.schemas import JobDb, JobStatus
-from vidoso.repo.segments import SegmentsRepo
+from vidoso.repo.schemas import JobDb, JobProgress, JobStatus
+from vidoso.repo.segments import ATTRIBUTES_WITHOUT_EMBEDDING, SegmentsRepo
 from vidoso.routes.v1.schemas import (
+    EmbeddingCacheStats,
     HealthCheck,
+    JobEventRead,
+    JobEventsRead,
     JobRead,
     JobsCreate,
     JobsRead,
     SearchQuery,
     SearchQueryResponse,
+    SegmentRead,
     SegmentsRead,
 )
-from vidoso.services.search import SearchService
+from vidoso.routes.v1.streaming import json_list_response, server_sent_events_response
+from vidoso.services.embedding_cache import EmbeddingCache
+from vidoso.services.index_cache import SegmentFilter
+from vidoso.services.job_events import JobEvent, JobEventHub
+from vidoso.services.model_registry import ModelRegistry
+from vidoso.services.search import SearchMode, SearchService
 from vidoso.services.stream_processor import StreamProcessorService
 
 router = APIRouter()
@@ -36,8 +55,37 @@ router = APIRouter()
     status_code=status.HTTP_200_OK,
     response_model=HealthCheck,
 )
-def health_check() -> HealthCheck:
-    return HealthCheck()
+def health_check(
+    model_registry: Annotated[ModelRegistry, Depends(get_model_registry_dep)],
+) -> HealthCheck:
+    # `ready` turns true once the models preloaded at startup are warm
+    return HealthCheck(
+        ready=model_registry.ready(),
+        models=model_registry.get_stats(),
+    )
+
+
+@router.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    response_class=PlainTextResponse,
+)
+def stage_metrics() -> PlainTextResponse:
+    # prometheus text format, stage timings of this api process
+    return PlainTextResponse(
+        stage_timings.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE
+    )
+
+
+@router.get(
+    "/embedding-cache",
+    status_code=status.HTTP_200_OK,
+    response_model=EmbeddingCacheStats,
+)
+def embedding_cache_stats(
+    embedding_cache: Annotated[EmbeddingCache, Depends(get_embedding_cache_dep)],
+) -> EmbeddingCacheStats:
+    return EmbeddingCacheStats.model_validate(embedding_cache.stats())
 
 
 # jobs
@@ -54,13 +102,16 @@ async def create_job(
     now = dt.datetime.now()
     jobs_db = [
         JobDb.model_validate(
-            job.model_dump() | {"created_at": now, "status": JobStatus.PROCESSING}
+            job.model_dump()
+            | {
+                "created_at": now,
+                "status": JobStatus.PROCESSING,
+                "progress": JobProgress.QUEUED,
+            }
         )
         for job in jobs_create.jobs
     ]
-    async with asyncio.TaskGroup() as tg:
-        tasks = [tg.create_task(jobs_repo.upsert(job=job)) for job in jobs_db]
-    jobs_db_upserted = [t.result() for t in tasks]
+    jobs_db_upserted = await jobs_repo.upsert_multi(jobs=jobs_db)
     jobs_read = JobsRead(
         jobs=[
             JobRead.model_validate(job, from_attributes=True)
@@ -69,15 +120,15 @@ async def create_job(
     )
 
     for job in jobs_db_upserted:
-        worker.process_video_stream(job_id=job.job_id)
+        worker.process_video_stream(job_id=job.job_id, stream_url=job.stream_url)
 
     return jobs_read
 
 
 @router.get(
     "/user-jobs",
-    response_model=JobsRead,
-    response_model_exclude_none=True,
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"model": JobsRead}},
 )
 async def list_user_jobs(
     settings: Annotated[Settings, Depends(get_settings_dep)],
@@ -94,14 +145,102 @@ async def list_user_jobs(
         dt.datetime | None,
         Query(description="Filter jobs by timestamp less than or equal"),
     ] = None,
-) -> JobsRead:
-    jobs_db = await jobs_repo.get_multi_by_user(
+) -> StreamingResponse:
+    # jobs are streamed out page by page, as they are read from the db
+    jobs = (
+        JobRead.model_validate(job, from_attributes=True)
+        async for job in jobs_repo.iter_by_user(
+            user=user,
+            created_after=created_after,
+            created_before=created_before,
+            attributes=list(JobRead.model_fields),
+        )
+    )
+    return await json_list_response(key="jobs", items=jobs)
+
+
+def job_event_read(event: JobEvent | None) -> JobEventRead | None:
+    return None if event is None else JobEventRead.model_validate(event)
+
+
+async def job_events_read(
+    events: AsyncIterator[JobEvent | None],
+) -> AsyncIterator[JobEventRead | None]:
+    async for event in events:
+        yield job_event_read(event)
+
+
+@router.get(
+    "/user-jobs/events",
+    response_class=StreamingResponse,
+)
+async def stream_user_job_events(
+    settings: Annotated[Settings, Depends(get_settings_dep)],
+    jobs_repo: Annotated[JobsRepo, Depends(get_jobs_repo_dep)],
+    job_event_hub: Annotated[JobEventHub, Depends(get_job_event_hub_dep)],
+    user: Annotated[
+        str,
+        Query(description="Constrain events to a specific user's jobs"),
+    ] = "anonymous",
+    job_ids: Annotated[
+        list[str] | None,
+        Query(description="Constrain events to these jobs, ends once all are done"),
+    ] = None,
+    last_event_id: Annotated[dt.datetime | None, Header()] = None,
+) -> StreamingResponse:
+    # server-sent events of the jobs' status and progress: their current state,
+    # then pushed as the worker publishes them. `Last-Event-ID` (sent by
+    # reconnecting clients) replays the ones published since
+    events = job_event_hub.events(
         user=user,
-        created_after=created_after,
-        created_before=created_before,
+        jobs_repo=jobs_repo,
+        job_ids=job_ids,
+        after=last_event_id,
+        keepalive_seconds=settings.job_events_keepalive_seconds,
+    )
+    return server_sent_events_response(
+        event="job",
+        items=job_events_read(events),
+        event_id=lambda event: event.published_at.isoformat(),
     )
-    jobs = JobsRead.model_validate(jobs_db, from_attributes=True)
-    return jobs
+
+
+@router.get(
+    "/user-jobs/wait",
+    response_model=JobEventsRead,
+    response_model_exclude_none=True,
+)
+async def wait_user_job_events(
+    settings: Annotated[Settings, Depends(get_settings_dep)],
+    jobs_repo: Annotated[JobsRepo, Depends(get_jobs_repo_dep)],
+    job_event_hub: Annotated[JobEventHub, Depends(get_job_event_hub_dep)],
+    user: Annotated[
+        str,
+        Query(description="Constrain events to a specific user's jobs"),
+    ] = "anonymous",
+    job_ids: Annotated[
+        list[str] | None,
+        Query(description="Constrain events to these jobs"),
+    ] = None,
+    after: Annotated[
+        dt.datetime | None,
+        Query(description="Only events published after, the last one seen"),
+    ] = None,
+    timeout: Annotated[
+        float,
+        Query(description="Seconds to wait for an event", ge=0),
+    ] = 30,
+) -> JobEventsRead:
+    # long-poll: returns as soon as there are events (right away for jobs done
+    # already), empty after `timeout`
+    events = await job_event_hub.wait(
+        user=user,
+        jobs_repo=jobs_repo,
+        job_ids=job_ids,
+        after=after,
+        timeout=min(timeout, settings.job_events_max_wait_seconds),
+    )
+    return JobEventsRead(events=[job_event_read(event) for event in events])
 
 
 # segments
@@ -109,8 +248,8 @@ async def list_user_jobs(
 
 @router.get(
     "/user-segments",
-    response_model=SegmentsRead,
-    response_model_exclude_none=True,
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"model": SegmentsRead}},
 )
 async def list_user_segments(
     settings: Annotated[Settings, Depends(get_settings_dep)],
@@ -131,18 +270,21 @@ async def list_user_segments(
         bool,
         Query(description="Whether to exclude the segment embedding, for readability"),
     ] = True,
-) -> SegmentsRead:
-    segments_db = await segments_repo.get_multi_by_user(
-        user=user,
-        created_after=created_after,
-        created_before=created_before,
+) -> StreamingResponse:
+    # segments are streamed out page by page, as they are read from the db
+    segments = (
+        SegmentRead.model_validate(
+            segment.dump_for_read(exclude_embedding=exclude_embeddings)
+        )
+        async for segment in segments_repo.iter_by_user(
+            user=user,
+            created_after=created_after,
+            created_before=created_before,
+            # embeddings are neither transferred nor deserialized unless asked for
+            attributes=ATTRIBUTES_WITHOUT_EMBEDDING if exclude_embeddings else None,
+        )
     )
-    segments = [
-        segment.model_dump(**({"exclude": ["embedding"]} if exclude_embeddings else {}))
-        for segment in segments_db.segments
-    ]
-    segments_read = SegmentsRead.model_validate({"segments": segments})
-    return segments_read
+    return await json_list_response(key="segments", items=segments)
 
 
 @router.post(
@@ -168,16 +310,28 @@ async def dev_process_streams(
 async def search(
     search_svc: Annotated[SearchService, Depends(get_search_service_dep)],
     search_query: Annotated[SearchQuery, Body],
+    response: Response,
 ) -> SearchQueryResponse:
     if not search_query.text and not search_query.embeddings:
         return SearchQueryResponse(text=[], embeddings=[])
 
-    results = await search_svc.search(
-        user=search_query.user,
-        k=search_query.k,
-        text=search_query.text,
-        embeddings=search_query.embeddings,
-        exclude_embeddings=search_query.exclude_embeddings,
-    )
+    with collect_timings() as timings:
+        results = await search_svc.search(
+            users=search_query.users or [search_query.user],
+            k=search_query.k,
+            text=search_query.text,
+            embeddings=search_query.embeddings,
+            exclude_embeddings=search_query.exclude_embeddings,
+            nprobe=search_query.nprobe,
+            ef_search=search_query.ef_search,
+            mode=SearchMode(search_query.mode),
+            segment_filter=SegmentFilter(
+                created_after=search_query.created_after,
+                created_before=search_query.created_before,
+                stream_urls=search_query.stream_urls,
+                transcript_ids=search_query.transcript_ids,
+            ),
+        )
+    response.headers["Server-Timing"] = server_timing(timings)
     search_query_response = SearchQueryResponse.model_validate(results)
     return search_query_response
@@ -4,9 +4,20 @@ from typing import Annotated, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
+from vidoso.services.model_registry import ModelStats
+
 
 class HealthCheck(BaseModel):
     status: Literal["OK"] = "OK"
+    ready: bool = True
+    models: list[ModelStats] = []
+
+
+class EmbeddingCacheStats(BaseModel):
+    size: int
+    local_hits: int
+    redis_hits: int
+    misses: int
 
 
 # job
@@ -17,6 +28,15 @@ class JobStatus(StrEnum):
     DONE = auto()
 
 
+class JobProgress(StrEnum):
+    QUEUED = auto()
+    DOWNLOADING = auto()
+    TRANSCRIBING = auto()
+    WAITING = auto()
+    DONE = auto()
+    FAILED = auto()
+
+
 class JobBase(BaseModel):
     user: str
 
@@ -27,6 +47,20 @@ class JobRead(JobBase):
     job_id: str
     created_at: Annotated[dt.datetime, Field(examples=["2023-10-24T11:30:00"])]
     status: JobStatus
+    # segments transcribed, embedded and written so far
+    segments_done: int = 0
+    progress: JobProgress | None = None
+
+
+class JobEventRead(JobRead):
+    model_config = ConfigDict(from_attributes=True)
+
+    created_at: dt.datetime | None = None
+    published_at: dt.datetime
+
+
+class JobEventsRead(BaseModel):
+    events: list[JobEventRead]
 
 
 class JobCreate(JobBase):
@@ -66,23 +100,85 @@ class SegmentsRead(BaseModel):
 # search
 
 
+class SearchMode(StrEnum):
+    LEXICAL = auto()
+    SEMANTIC = auto()
+    HYBRID = auto()
+
+
 class SearchQuery(BaseModel):
     user: Annotated[
         str,
         Field(description="Constrain search to segments from a specific user"),
     ] = "anonymous"
+    users: Annotated[
+        list[str] | None,
+        Field(
+            description="Search across the segments of several users (e.g. a team), "
+            "takes precedence over `user`"
+        ),
+    ] = None
     k: Annotated[
         int,
         Field(description="Pick the top `k` results", ge=2),
     ] = 3
     text: list[str]
     embeddings: list[str]
+    created_after: Annotated[
+        dt.datetime | None,
+        Field(description="Filter segments by timestamp greater than or equal"),
+    ] = None
+    created_before: Annotated[
+        dt.datetime | None,
+        Field(description="Filter segments by timestamp less than or equal"),
+    ] = None
+    stream_urls: Annotated[
+        list[str] | None,
+        Field(description="Constrain search to segments from these streams"),
+    ] = None
+    transcript_ids: Annotated[
+        list[str] | None,
+        Field(description="Constrain search to segments from these transcripts"),
+    ] = None
+    mode: Annotated[
+        SearchMode,
+        Field(
+            description="How `text` queries are matched: `lexical` (bm25 over the "
+            "segment text), `semantic` (vector search) or `hybrid` (both, fused). "
+            "`embeddings` queries are always semantic"
+        ),
+    ] = SearchMode.SEMANTIC
     exclude_embeddings: Annotated[
         bool,
         Field(description="Whether to exclude the segment embedding, for readability"),
     ] = True
+    nprobe: Annotated[
+        int | None,
+        Field(
+            description="IVF indexes only: number of lists to probe, higher values "
+            "trade latency for recall",
+            ge=1,
+        ),
+    ] = None
+    ef_search: Annotated[
+        int | None,
+        Field(
+            description="HNSW indexes only: search depth, higher values trade "
+            "latency for recall",
+            ge=1,
+        ),
+    ] = None
+
+
+class SearchShardStats(BaseModel):
+    user: str
+    shard: int | None = None
+    kind: SearchMode
+    size: int
+    latency_ms: float
 
 
 class SearchQueryResponse(BaseModel):
     text: list[list[SegmentRead]]
     embeddings: list[list[SegmentRead]]
+    shards: list[SearchShardStats] | None = None
@@ -0,0 +1,63 @@
+from collections.abc import AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+async def json_list_chunks(
+    key: str,
+    items: AsyncIterator[BaseModel],
+    first: BaseModel | None = None,
+) -> AsyncIterator[str]:
+    # renders `{"<key>": [item, ...]}` one item at a time, items without their
+    # None fields
+    yield f'{{"{key}":['
+    if first is not None:
+        yield first.model_dump_json(exclude_none=True)
+        async for item in items:
+            yield "," + item.model_dump_json(exclude_none=True)
+    yield "]}"
+
+
+async def json_list_response(
+    key: str,
+    items: AsyncIterator[BaseModel],
+) -> StreamingResponse:
+    # the first item (and the read of its page) is awaited before the response
+    # starts, its errors still get an error status. later ones end the stream
+    first = await anext(items, None)
+    return StreamingResponse(
+        json_list_chunks(key=key, items=items, first=first),
+        media_type="application/json",
+    )
+
+
+async def server_sent_event_chunks(
+    event: str,
+    items: AsyncIterator[BaseModel | None],
+    event_id: Callable[[BaseModel], str],
+    retry_ms: int = 3_000,
+) -> AsyncIterator[str]:
+    # one `event` per item, a comment for None items keeps idle connections (and
+    # the proxies in between) open
+    yield f"retry: {retry_ms}\n\n"
+    async for item in items:
+        if item is None:
+            yield ": keepalive\n\n"
+            continue
+        yield (
+            f"event: {event}\nid: {event_id(item)}\n"
+            f"data: {item.model_dump_json(exclude_none=True)}\n\n"
+        )
+
+
+def server_sent_events_response(
+    event: str,
+    items: AsyncIterator[BaseModel | None],
+    event_id: Callable[[BaseModel], str],
+) -> StreamingResponse:
+    return StreamingResponse(
+        server_sent_event_chunks(event=event, items=items, event_id=event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
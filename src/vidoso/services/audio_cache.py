@@ -0,0 +1,252 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+from weakref import WeakValueDictionary
+
+from vidoso.core.logger import logger
+from vidoso.core.urls import normalize_stream_url
+
+if TYPE_CHECKING:
+    from pytube import Stream
+
+
+def audio_stream(stream_url: str) -> "Stream":
+    from pytube import YouTube
+
+    yt = YouTube(stream_url)
+    audio_streams = yt.streams.filter(only_audio=True)
+
+    # extract the first audio stream
+    return audio_streams.get_by_itag(itag=audio_streams[0].itag)
+
+
+class AudioCache:
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        # downloaded audio streams, content addressed by video (the normalized
+        # stream url), so hits make no network request. the files are the cache
+        # state, so it survives restarts and is shared by the worker processes of
+        # a host. recency is the file mtime, refreshed on every hit
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # a lock per stream being fetched, dropped once no fetch holds it
+        self.key_locks: WeakValueDictionary[Path, threading.Lock] = (
+            WeakValueDictionary()
+        )
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, stream_url: str) -> Path:
+        key = hashlib.sha256(normalize_stream_url(stream_url).encode()).hexdigest()
+        return self.directory / key[:2] / key
+
+    def _download(self, stream: "Stream", path: Path) -> None:
+        # downloaded next to its final path and renamed, readers never see a
+        # partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as temp:
+            temp_path = Path(temp.name)
+        try:
+            stream.download(output_path=str(temp_path.parent), filename=temp_path.name)
+            os.replace(temp_path, path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    def cached(self, stream_url: str) -> Path | None:
+        # a hit refreshes the file's recency
+        path = self.path(stream_url)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, stream_url: str, stream: "Stream | None" = None) -> Path:
+        path = self.path(stream_url)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(path, threading.Lock())
+        # one download per stream, concurrent fetches wait for it
+        with key_lock:
+            if self.cached(stream_url) is not None:
+                with self.lock:
+                    self.hits += 1
+                return path
+            logger.info(f"audio cache miss [{stream_url=}]")
+            self._download(stream or audio_stream(stream_url), path)
+            with self.lock:
+                self.misses += 1
+        self.evict(keep=path)
+        return path
+
+    @contextlib.contextmanager
+    def pin(self, path: Path) -> Iterator[Path]:
+        # a shared flock on the file: evictions, by any process of the host, skip
+        # it while pinned. raises FileNotFoundError when it was evicted before
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(path)
+            yield path
+        finally:
+            os.close(fd)
+
+    @contextlib.contextmanager
+    def open(self, stream_url: str) -> Iterator[Path]:
+        with self.pin(self.fetch(stream_url)) as path:
+            yield path
+
+    def files(self) -> list[tuple[Path, os.stat_result]]:
+        files = []
+        if not self.directory.exists():
+            return files
+        for subdir in os.scandir(self.directory):
+            for entry in os.scandir(subdir.path) if subdir.is_dir() else []:
+                # skips in progress downloads
+                if not entry.is_file() or entry.name.startswith("tmp"):
+                    continue
+                try:
+                    files.append((Path(entry.path), entry.stat()))
+                except FileNotFoundError:
+                    # evicted by another process
+                    continue
+        return files
+
+    def size(self) -> int:
+        return sum(stat.st_size for _, stat in self.files())
+
+    def _unlink_unpinned(self, path: Path) -> bool:
+        # the exclusive flock fails while any process holds a pin
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        else:
+            # unless a download replaced it meanwhile
+            with contextlib.suppress(FileNotFoundError):
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    path.unlink()
+            return True
+        finally:
+            os.close(fd)
+
+    def evict(self, keep: Path | None = None) -> None:
+        # least recently used files first, until the cache fits in max_bytes.
+        # `keep` is the file just fetched, about to be pinned
+        files = sorted(self.files(), key=lambda file: file[1].st_mtime)
+        total = sum(stat.st_size for _, stat in files)
+        for path, stat in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep or not self._unlink_unpinned(path):
+                continue
+            total -= stat.st_size
+            logger.info(f"audio cache evict [{path=}, {total=}]")
+
+
+class AudioPrefetcher:
+    def __init__(
+        self,
+        audio_cache: AudioCache,
+        pending_stream_urls: Callable[[int], list[str]],
+        depth: int,
+        max_bytes: int,
+    ) -> None:
+        # downloads the audio of the next queued jobs while the current one is
+        # processed. `max_bytes` caps the audio prefetched ahead of its job
+        self.audio_cache = audio_cache
+        self.pending_stream_urls = pending_stream_urls
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, depth), thread_name_prefix="audio-prefetch"
+        )
+        self.prefetching: dict[str, Future[Path | None]] = {}
+        self.prefetched: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def _prefetch(self, stream_url: str) -> Path | None:
+        try:
+            if (path := self.audio_cache.cached(stream_url)) is not None:
+                return path
+            stream = audio_stream(stream_url)
+            # the budget is reserved before downloading, concurrent prefetches
+            # can't overshoot it
+            with self.lock:
+                budget = self.max_bytes - sum(self.prefetched.values())
+                if stream.filesize > budget:
+                    logger.info(
+                        f"audio prefetch over budget [{stream_url=}, {budget=}]"
+                    )
+                    return None
+                self.prefetched[stream_url] = stream.filesize
+            return self.audio_cache.fetch(stream_url, stream=stream)
+        except Exception as e:
+            # the job downloads its audio itself
+            logger.warning(f"audio prefetch failed [{stream_url=}, {e=}]")
+            with self.lock:
+                self.prefetched.pop(stream_url, None)
+            return None
+        finally:
+            with self.lock:
+                self.prefetching.pop(stream_url, None)
+
+    def prefetch(self) -> None:
+        if self.depth <= 0:
+            return
+        try:
+            stream_urls = self.pending_stream_urls(self.depth)
+        except Exception as e:
+            logger.warning(f"audio prefetch pending jobs failed [{e=}]")
+            return
+        # audio of jobs no longer queued (the current one, or taken by another
+        # worker) doesn't count against the budget anymore
+        with self.lock:
+            self.prefetched = {
+                stream_url: size
+                for stream_url, size in self.prefetched.items()
+                if stream_url in stream_urls
+            }
+        for stream_url in stream_urls:
+            with self.lock:
+                if stream_url in self.prefetching or stream_url in self.prefetched:
+                    continue
+                self.prefetching[stream_url] = self.executor.submit(
+                    self._prefetch, stream_url
+                )
+            logger.info(f"audio prefetch [{stream_url=}]")
+
+
+# factories
+
+
+def audio_cache_fct(directory: str, max_bytes: int) -> AudioCache:
+    audio_cache = AudioCache(directory=directory, max_bytes=max_bytes)
+    return audio_cache
+
+
+def audio_prefetcher_fct(
+    audio_cache: AudioCache,
+    pending_stream_urls: Callable[[int], list[str]],
+    depth: int,
+    max_bytes: int,
+) -> AudioPrefetcher:
+    audio_prefetcher = AudioPrefetcher(
+        audio_cache=audio_cache,
+        pending_stream_urls=pending_stream_urls,
+        depth=depth,
+        max_bytes=max_bytes,
+    )
+    return audio_prefetcher
@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel
+
+from vidoso.core.logger import logger
+from vidoso.services.transcription import (
+    SAMPLE_RATE,
+    Transcriber,
+    Transcript,
+    transcript_segment,
+)
+
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+# the transcriber of a pool process, set once by the pool initializer
+_transcriber: Transcriber | None = None
+
+
+class ChunkingOptions(BaseModel):
+    # chunks are at most `chunk_seconds` long, cut at the last silence in their
+    # final quarter (or hard cut when there is none) and overlap the next chunk
+    # by `overlap_seconds`
+    chunk_seconds: float = 30
+    overlap_seconds: float = 1
+    min_silence_ms: int = 300
+    # relative to the loudness of the chunk being cut
+    silence_thresh_db: float = -16
+    workers: int = 2
+
+
+class AudioChunk(BaseModel):
+    # `offset` is the chunk start in the audio, segments whose midpoint (in
+    # audio time) is within [keep_from, keep_until) belong to this chunk, the
+    # rest are transcribed by the neighbouring chunk too
+    offset: float
+    keep_from: float
+    keep_until: float
+
+
+def _init_worker(load: Callable[[], Transcriber], threads: int) -> None:
+    global _transcriber
+    # one model per process, with its share of the cores. set before the model
+    # library (and its thread pools) is imported
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _transcriber = load()
+
+
+def _transcribe_chunk(samples: np.ndarray, language: str) -> Transcript:
+    assert _transcriber is not None
+    return _transcriber.transcribe(samples, language=language)
+
+
+def load_window(
+    audio: str | np.ndarray, start: float, duration: float
+) -> "AudioSegment":
+    # only [start, start + duration] is decoded, ffmpeg seeks into the file
+    from pydub import AudioSegment
+
+    if isinstance(audio, str):
+        window = AudioSegment.from_file(audio, start_second=start, duration=duration)
+        return window.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    begin = int(start * SAMPLE_RATE)
+    samples = audio[begin : begin + int(duration * SAMPLE_RATE)]
+    return AudioSegment(
+        data=(np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes(),
+        sample_width=2,
+        frame_rate=SAMPLE_RATE,
+        channels=1,
+    )
+
+
+def to_samples(window: "AudioSegment") -> np.ndarray:
+    # 16 bit pcm to the float32 [-1, 1] arrays transcribers take
+    samples = np.array(window.get_array_of_samples(), dtype=np.float32)
+    return samples / 32768
+
+
+def cut_seconds(window: "AudioSegment", options: ChunkingOptions) -> float | None:
+    # middle of the last silence in the final quarter of the window
+    from pydub.silence import detect_silence
+
+    search_from_ms = int(len(window) * 0.75)
+    silences = detect_silence(
+        window[search_from_ms:],
+        min_silence_len=options.min_silence_ms,
+        silence_thresh=window.dBFS + options.silence_thresh_db,
+    )
+    if not silences:
+        return None
+    silence_start_ms, silence_end_ms = silences[-1]
+    return (search_from_ms + (silence_start_ms + silence_end_ms) / 2) / 1000
+
+
+def iter_chunks(
+    audio: str | np.ndarray, options: ChunkingOptions
+) -> Iterator[tuple[AudioChunk, np.ndarray]]:
+    # a single window is decoded at a time, memory doesn't grow with the audio
+    # length
+    start = keep_from = 0.0
+    while True:
+        window = load_window(audio, start, options.chunk_seconds)
+        window_seconds = len(window) / 1000
+        if window_seconds < options.chunk_seconds:
+            if window_seconds > 0:
+                chunk = AudioChunk(
+                    offset=start, keep_from=keep_from, keep_until=float("inf")
+                )
+                yield chunk, to_samples(window)
+            return
+
+        cut = cut_seconds(window, options) or options.chunk_seconds
+        # the overlap never reaches back before the chunk start
+        overlap = min(options.overlap_seconds, cut / 2)
+        keep_until = start + cut - overlap / 2
+        chunk = AudioChunk(offset=start, keep_from=keep_from, keep_until=keep_until)
+        yield chunk, to_samples(window[: int(cut * 1000)])
+        start, keep_from = start + cut - overlap, keep_until
+
+
+def stitch(results: Iterator[tuple[AudioChunk, Transcript]]) -> Iterator[dict]:
+    # chunk relative timestamps to audio time, segment ids contiguous. a segment
+    # goes to the chunk holding its midpoint: the first segment of a chunk
+    # usually starts at 0, inside the overlap, and still runs past it
+    segment_id = 0
+    for chunk, transcript in results:
+        for segment in transcript["segments"]:
+            start = chunk.offset + segment["start"]
+            end = chunk.offset + segment["end"]
+            if not chunk.keep_from <= (start + end) / 2 < chunk.keep_until:
+                continue
+            yield transcript_segment(segment_id, start, end, segment["text"])
+            segment_id += 1
+
+
+class ChunkedTranscriber:
+    def __init__(
+        self, load: Callable[[], Transcriber], options: ChunkingOptions
+    ) -> None:
+        # `load` is pickled to the pool processes, each loads its own model
+        self.options = options
+        self.workers = max(1, options.workers)
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # forking a process that already runs torch threads is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(load, threads),
+        )
+        # chunks decoded ahead of the pool, bounds the samples held in memory
+        self.max_pending = 2 * self.workers
+
+    def _results(
+        self, audio: str | np.ndarray, language: str
+    ) -> Iterator[tuple[AudioChunk, Transcript]]:
+        pending: deque[tuple[AudioChunk, Future[Transcript]]] = deque()
+        try:
+            for chunk, samples in iter_chunks(audio, self.options):
+                if len(pending) >= self.max_pending:
+                    done_chunk, future = pending.popleft()
+                    yield done_chunk, future.result()
+                future = self.executor.submit(_transcribe_chunk, samples, language)
+                pending.append((chunk, future))
+            while pending:
+                done_chunk, future = pending.popleft()
+                yield done_chunk, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def transcribe(self, audio: str | np.ndarray, language: str = "en") -> Transcript:
+        segments = list(self.iter_segments(audio, language=language))
+        logger.info(f"chunked transcription done [{len(segments)=}, {self.options=}]")
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "language": language,
+            "segments": segments,
+        }
+
+    def iter_segments(
+        self, audio: str | np.ndarray, language: str = "en"
+    ) -> Iterator[dict]:
+        # segments of a chunk are yielded once it (and the ones before it) is done
+        yield from stitch(self._results(audio, language))
+
+    def warmup(self, audio: np.ndarray) -> None:
+        # starts every pool process, models are loaded by the initializer
+        futures = [
+            self.executor.submit(_transcribe_chunk, audio, "en")
+            for _ in range(self.workers)
+        ]
+        for future in futures:
+            future.result()
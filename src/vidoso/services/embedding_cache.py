@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import numpy as np
+from redis import Redis, RedisError
+
+from vidoso.core.logger import logger
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+REDIS_KEY_PREFIX = "vidoso:embedding:"
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        model_name: str,
+        max_items: int,
+        redis_client: Redis | None = None,
+        redis_ttl_seconds: int | None = None,
+    ) -> None:
+        self.model_name = model_name
+        self.max_items = max_items
+        self.redis_client = redis_client
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def key(self, normalized_text: str) -> str:
+        content = f"{self.model_name}\0{normalized_text}".encode()
+        return hashlib.sha256(content).hexdigest()
+
+    def _get_local(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        with self.lock:
+            for key in keys:
+                embedding = self.embeddings.get(key)
+                if embedding is not None:
+                    self.embeddings.move_to_end(key)
+                    found[key] = embedding
+        return found
+
+    def _put_local(self, found: dict[str, np.ndarray]) -> None:
+        with self.lock:
+            self.embeddings.update(found)
+            for key in found:
+                self.embeddings.move_to_end(key)
+            while len(self.embeddings) > self.max_items:
+                self.embeddings.popitem(last=False)
+
+    def _get_redis(self, keys: list[str]) -> dict[str, np.ndarray]:
+        if self.redis_client is None or not keys:
+            return {}
+        try:
+            values = self.redis_client.mget([REDIS_KEY_PREFIX + key for key in keys])
+        except RedisError as e:
+            logger.warning(f"embedding cache redis get failed [{e=}]")
+            return {}
+        return {
+            key: np.frombuffer(value, dtype=np.float32)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    def _put_redis(self, found: dict[str, np.ndarray]) -> None:
+        if self.redis_client is None or not found:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, embedding in found.items():
+                pipeline.set(
+                    REDIS_KEY_PREFIX + key,
+                    embedding.astype(np.float32).tobytes(),
+                    ex=self.redis_ttl_seconds,
+                )
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning(f"embedding cache redis set failed [{e=}]")
+
+    def encode(
+        self,
+        sentence_transformer: "SentenceTransformer",
+        texts: list[str],
+        batch_size: int = 32,
+    ) -> np.ndarray:
+        normalized_texts = [normalize_text(text) for text in texts]
+        keys = [self.key(text) for text in normalized_texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        found = self._get_local(unique_keys)
+        local_hits = len(found)
+
+        missing = [key for key in unique_keys if key not in found]
+        found_redis = self._get_redis(missing)
+        found |= found_redis
+
+        missing = [key for key in unique_keys if key not in found]
+        if missing:
+            texts_by_key = dict(zip(keys, normalized_texts))
+            # sentence transformers sorts the texts by length and encodes them
+            # `batch_size` at a time, batches of similar lengths barely pad
+            encoded = sentence_transformer.encode(
+                [texts_by_key[k] for k in missing], batch_size=batch_size
+            )
+            found_encoded = {
+                key: np.asarray(embedding, dtype=np.float32)
+                for key, embedding in zip(missing, encoded)
+            }
+            found |= found_encoded
+            self._put_redis(found_encoded)
+        self._put_local(found_redis | {k: found[k] for k in missing})
+
+        with self.lock:
+            self.local_hits += local_hits
+            self.redis_hits += len(found_redis)
+            self.misses += len(missing)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack([found[key] for key in keys])
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "size": len(self.embeddings),
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+            }
+
+
+# factories
+
+
+def embedding_cache_fct(
+    model_name: str,
+    max_items: int,
+    redis_client: Redis | None = None,
+    redis_ttl_seconds: int | None = None,
+) -> EmbeddingCache:
+    embedding_cache = EmbeddingCache(
+        model_name=model_name,
+        max_items=max_items,
+        redis_client=redis_client,
+        redis_ttl_seconds=redis_ttl_seconds,
+    )
+    return embedding_cache
@@ -0,0 +1,100 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Executor
+
+import numpy as np
+
+from vidoso.core.logger import logger
+
+
+class EncodeBatcher:
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: Executor | None = None,
+    ) -> None:
+        # requests are coalesced into one `encode` call of up to `max_batch_size`
+        # texts, run on `executor` (the loop's default one when None)
+        self.encode_func = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.queue: asyncio.Queue[tuple[list[str], asyncio.Future[np.ndarray]]]
+        self.task: asyncio.Task[None] | None = None
+
+    def _ensure_started(self) -> None:
+        # the batcher is process wide, its queue and consumer task are bound to
+        # the loop of the first caller
+        loop = asyncio.get_running_loop()
+        if self.loop is loop and self.task is not None and not self.task.done():
+            return
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.task = loop.create_task(self._run())
+
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        self._ensure_started()
+        future: asyncio.Future[np.ndarray] = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def _next_batch(
+        self,
+    ) -> list[tuple[list[str], asyncio.Future[np.ndarray]]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+            except TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            logger.debug(f"encode batch [{len(batch)=}, {len(texts)=}]")
+            try:
+                embeddings = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.encode_func, texts
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in batch:
+                if not future.done():
+                    future.set_result(embeddings[offset : offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+# factories
+
+
+def encode_batcher_fct(
+    encode: Callable[[list[str]], np.ndarray],
+    max_batch_size: int,
+    max_wait_ms: float,
+    executor: Executor | None = None,
+) -> EncodeBatcher:
+    encode_batcher = EncodeBatcher(
+        encode=encode,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        executor=executor,
+    )
+    return encode_batcher
@@ -0,0 +1,167 @@
+import json
+import math
+import os
+from urllib.parse import quote
+
+import faiss
+import numpy as np
+
+from vidoso.config import SearchIndexType, Settings
+from vidoso.core.logger import logger
+from vidoso.repo.schemas import SegmentDb, decode_embeddings
+from vidoso.services.index_cache import UserIndex
+
+# index types whose coarse quantizer / codebooks have to be trained (in the
+# worker) before vectors can be added
+TRAINED_INDEX_TYPES = {SearchIndexType.IVF_FLAT, SearchIndexType.IVF_PQ}
+
+# a trained index is considered stale once the corpus doubled since training
+RETRAIN_GROWTH_FACTOR = 2
+
+
+class IndexBuilder:
+    def __init__(self, settings: Settings) -> None:
+        self.index_type = settings.search_index_type
+        self.train_threshold = settings.search_index_train_threshold
+        self.nlist = settings.search_index_nlist
+        self.nprobe = settings.search_index_nprobe
+        self.hnsw_m = settings.search_index_hnsw_m
+        self.ef_construction = settings.search_index_ef_construction
+        self.ef_search = settings.search_index_ef_search
+        self.pq_m = settings.search_index_pq_m
+        self.pq_nbits = settings.search_index_pq_nbits
+        self.index_dir = settings.search_index_dir
+        self.shard_size = settings.search_shard_size
+
+    # paths
+
+    def _index_path(self, user: str, dim: int) -> str:
+        filename = f"{quote(user, safe='')}.{self.index_type}.{dim}.faiss"
+        return os.path.join(self.index_dir, filename)
+
+    def _meta_path(self, user: str, dim: int) -> str:
+        filename = f"{quote(user, safe='')}.{self.index_type}.{dim}.json"
+        return os.path.join(self.index_dir, filename)
+
+    # factory strings
+
+    def _nlist(self, n: int) -> int:
+        if self.nlist:
+            return self.nlist
+        # faiss wants ~39 training points per centroid
+        return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+    def _factory_string(self, index_type: SearchIndexType, n: int) -> str:
+        match index_type:
+            case SearchIndexType.FLAT:
+                return "Flat"
+            case SearchIndexType.HNSW:
+                return f"HNSW{self.hnsw_m},Flat"
+            case SearchIndexType.IVF_FLAT:
+                return f"IVF{self._nlist(n)},Flat"
+            case SearchIndexType.IVF_PQ:
+                return f"IVF{self._nlist(n)},PQ{self.pq_m}x{self.pq_nbits}"
+
+    def _set_defaults(self, index: faiss.Index) -> None:
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = self.nprobe
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efConstruction = self.ef_construction
+            index.hnsw.efSearch = self.ef_search
+
+    def effective_index_type(self, n: int) -> SearchIndexType:
+        if n < self.train_threshold:
+            return SearchIndexType.FLAT
+        return self.index_type
+
+    # build (api side)
+
+    def _load_trained(self, user: str, dim: int) -> faiss.Index | None:
+        path = self._index_path(user=user, dim=dim)
+        if not os.path.exists(path):
+            return None
+        return faiss.read_index(path)
+
+    def new_index(self, user: str, dim: int, n: int) -> faiss.Index:
+        index_type = self.effective_index_type(n)
+        index = None
+        if index_type in TRAINED_INDEX_TYPES:
+            index = self._load_trained(user=user, dim=dim)
+            if index is None:
+                logger.info(f"no trained index, falling back to flat [{user=}]")
+                index_type = SearchIndexType.FLAT
+        if index is None:
+            index = faiss.index_factory(dim, self._factory_string(index_type, n))
+        self._set_defaults(index)
+        return index
+
+    def build(
+        self,
+        user: str,
+        segments: list[SegmentDb],
+        embeddings: np.ndarray | None = None,
+    ) -> UserIndex:
+        # `embeddings` may be decoded upfront, e.g. page by page while reading
+        segments_embeddings = (
+            decode_embeddings(segments) if embeddings is None else embeddings
+        )
+        n, dim = segments_embeddings.shape
+        template = self.new_index(user=user, dim=dim, n=n)
+
+        def new_shard_index() -> faiss.Index:
+            index = faiss.clone_index(template)
+            self._set_defaults(index)
+            return index
+
+        user_index = UserIndex(new_index=new_shard_index, shard_size=self.shard_size)
+        user_index.add(segments=segments, embeddings=segments_embeddings)
+        logger.info(
+            f"index built [{user=}, {n=}, {type(template).__name__=}, "
+            f"{len(user_index.shards)=}]"
+        )
+        return user_index
+
+    # train (worker side)
+
+    def needs_training(self, user: str, n: int, dim: int) -> bool:
+        if self.effective_index_type(n) not in TRAINED_INDEX_TYPES:
+            return False
+        meta_path = self._meta_path(user=user, dim=dim)
+        if not os.path.exists(meta_path):
+            return True
+        with open(meta_path) as f:
+            n_trained = json.load(f)["n"]
+        return n >= RETRAIN_GROWTH_FACTOR * n_trained
+
+    def train(self, user: str, segments: list[SegmentDb]) -> bool:
+        if not segments:
+            return False
+        segments_embeddings = np.array(decode_embeddings(segments), dtype=np.float32)
+        n, dim = segments_embeddings.shape
+        if not self.needs_training(user=user, n=n, dim=dim):
+            return False
+
+        faiss.normalize_L2(segments_embeddings)
+        index = faiss.index_factory(dim, self._factory_string(self.index_type, n))
+        index.train(segments_embeddings)
+
+        # only the trained (empty) index is persisted, vectors are added when the
+        # api builds the user index from the db
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_path = self._index_path(user=user, dim=dim)
+        meta_path = self._meta_path(user=user, dim=dim)
+        faiss.write_index(index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump({"n": n}, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        logger.info(f"index trained [{user=}, {n=}, {self.index_type=}]")
+        return True
+
+
+# factories
+
+
+def index_builder_fct(settings: Settings) -> IndexBuilder:
+    index_builder = IndexBuilder(settings=settings)
+    return index_builder
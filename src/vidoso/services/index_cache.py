@@ -0,0 +1,405 @@
+import asyncio
+import contextlib
+import datetime as dt
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from functools import partial
+
+import faiss
+import numpy as np
+from pydantic import BaseModel
+
+from vidoso.core.logger import logger
+from vidoso.repo.schemas import SegmentDb
+from vidoso.services.lexical_index import LexicalIndex
+
+# filtered searches selecting at most this fraction of a shard are answered
+# with an exact scan over the selected vectors instead of the index
+EXACT_SEARCH_MAX_SELECTIVITY = 0.05
+
+
+class SegmentFilter(BaseModel):
+    created_after: dt.datetime | None = None
+    created_before: dt.datetime | None = None
+    stream_urls: list[str] | None = None
+    transcript_ids: list[str] | None = None
+
+    def is_empty(self) -> bool:
+        return all(v is None for v in self.model_dump().values())
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+    sel: faiss.IDSelector | None = None,
+) -> faiss.SearchParameters | None:
+    # per request parameters, unset ones keep the index defaults
+    if isinstance(index, faiss.IndexIVF) and (nprobe or sel):
+        return faiss.SearchParametersIVF(nprobe=nprobe or index.nprobe, sel=sel)
+    if isinstance(index, faiss.IndexHNSW) and (ef_search or sel):
+        return faiss.SearchParametersHNSW(
+            efSearch=ef_search or index.hnsw.efSearch, sel=sel
+        )
+    if sel:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+
+class IndexShard:
+    def __init__(self, index: faiss.Index, offset: int) -> None:
+        self.index = index
+        self.offset = offset
+        # sealed shards are full and never written again, so they are searched
+        # without taking the lock
+        self.sealed = False
+        self.lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self.index.ntotal
+
+    def add(self, vectors: np.ndarray, seal: bool = False) -> None:
+        with self.lock:
+            self.index.add(vectors)
+            self.sealed = seal
+
+    def reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        with self.lock:
+            try:
+                return self.index.reconstruct_batch(ids)
+            except RuntimeError:
+                # ivf indexes need a direct map, built on the first reconstruct
+                faiss.extract_index_ivf(self.index).make_direct_map()
+                return self.index.reconstruct_batch(ids)
+
+    def _exact_search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        selected: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        try:
+            vectors = self.index.reconstruct_batch(selected)
+        except RuntimeError:
+            # e.g. ivf indexes without a direct map
+            return None
+        distances, ann = faiss.knn(queries, vectors, min(k, len(selected)))
+        distances = np.pad(distances, ((0, 0), (0, k - distances.shape[1])))
+        ann = np.pad(ann, ((0, 0), (0, k - ann.shape[1])), constant_values=-1)
+        return distances, np.where(ann >= 0, selected[ann], -1)
+
+    def _search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mask: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if mask is None:
+            params = search_params(self.index, nprobe=nprobe, ef_search=ef_search)
+            return self.index.search(queries, k=k, params=params)
+
+        selected = np.flatnonzero(mask)
+        if len(selected) <= max(k, EXACT_SEARCH_MAX_SELECTIVITY * self.size):
+            results = self._exact_search(queries, k=k, selected=selected)
+            if results is not None:
+                return results
+
+        bitmap = np.packbits(mask, bitorder="little")
+        sel = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        params = search_params(self.index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+        return self.index.search(queries, k=k, params=params)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mask: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # `mask` selects the shard local ids that may be returned, ids are
+        # returned in the user index id space (position in `segments`)
+        search = partial(
+            self._search, queries, k, nprobe=nprobe, ef_search=ef_search, mask=mask
+        )
+        if self.sealed:
+            distances, ann = search()
+        else:
+            with self.lock:
+                distances, ann = search()
+        return distances, np.where(ann >= 0, ann + self.offset, -1)
+
+
+class UserIndex:
+    def __init__(
+        self,
+        new_index: Callable[[], faiss.Index],
+        shard_size: int,
+    ) -> None:
+        # vectors are range partitioned in insertion order into shards of at most
+        # `shard_size` vectors, only the last shard ever receives new vectors
+        self.new_index = new_index
+        self.shard_size = shard_size
+        self.shards = [IndexShard(index=new_index(), offset=0)]
+        self.dim = self.shards[0].index.d
+        self.segments: list[SegmentDb] = []
+        self.keys: set[tuple[str, int]] = set()
+        self.lexical_index: LexicalIndex | None = None
+
+        # per segment metadata used to push search filters into the index, urls
+        # and transcript ids are dictionary encoded
+        self.created_at = np.empty(0, dtype=np.float64)
+        self.stream_url_codes = np.empty(0, dtype=np.int32)
+        self.transcript_id_codes = np.empty(0, dtype=np.int32)
+        self.stream_url_ids: dict[str, int] = {}
+        self.transcript_id_ids: dict[str, int] = {}
+
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.segments)
+
+    def add(
+        self,
+        segments: list[SegmentDb],
+        embeddings: np.ndarray,
+    ) -> int:
+        with self.lock:
+            # segments already in the index (e.g. written to the db right before
+            # the index was built) are skipped, so adds are idempotent
+            new = [
+                i
+                for i, s in enumerate(segments)
+                if (s.transcript_id, s.segment_id) not in self.keys
+            ]
+            if not new:
+                return 0
+
+            vectors = np.array(embeddings[new], dtype=np.float32)
+            faiss.normalize_L2(vectors)
+
+            # segments go first, so concurrent searches never see an id without
+            # its segment. their vectors live in the shards only, cached segments
+            # don't keep a second copy of the embedding
+            new_segments = [
+                segments[i].model_copy(
+                    update={"embedding": None, "embedding_format": None}
+                )
+                for i in new
+            ]
+            for segment in new_segments:
+                self.segments.append(segment)
+                self.keys.add((segment.transcript_id, segment.segment_id))
+            self.created_at = np.concatenate(
+                [self.created_at, [s.created_at.timestamp() for s in new_segments]]
+            )
+            self.stream_url_codes = np.concatenate(
+                [
+                    self.stream_url_codes,
+                    [
+                        self.stream_url_ids.setdefault(
+                            s.stream_url, len(self.stream_url_ids)
+                        )
+                        for s in new_segments
+                    ],
+                ]
+            ).astype(np.int32)
+            self.transcript_id_codes = np.concatenate(
+                [
+                    self.transcript_id_codes,
+                    [
+                        self.transcript_id_ids.setdefault(
+                            s.transcript_id, len(self.transcript_id_ids)
+                        )
+                        for s in new_segments
+                    ],
+                ]
+            ).astype(np.int32)
+
+            start = 0
+            while start < len(vectors):
+                shard = self.shards[-1]
+                if shard.size >= self.shard_size:
+                    shard = IndexShard(
+                        index=self.new_index(), offset=shard.offset + shard.size
+                    )
+                    self.shards.append(shard)
+                end = start + self.shard_size - shard.size
+                shard.add(
+                    vectors[start:end],
+                    seal=shard.size + len(vectors[start:end]) >= self.shard_size,
+                )
+                start = end
+
+            if self.lexical_index is not None:
+                self.lexical_index.add([segments[i].text for i in new])
+        return len(new)
+
+    def mask(self, segment_filter: SegmentFilter) -> np.ndarray | None:
+        # boolean mask over the user index ids, None when nothing is filtered
+        if segment_filter.is_empty():
+            return None
+        with self.lock:
+            mask = np.ones(self.size, dtype=bool)
+            if segment_filter.created_after is not None:
+                mask &= self.created_at >= segment_filter.created_after.timestamp()
+            if segment_filter.created_before is not None:
+                mask &= self.created_at <= segment_filter.created_before.timestamp()
+            if segment_filter.stream_urls is not None:
+                codes = [
+                    self.stream_url_ids[url]
+                    for url in segment_filter.stream_urls
+                    if url in self.stream_url_ids
+                ]
+                mask &= np.isin(self.stream_url_codes, codes)
+            if segment_filter.transcript_ids is not None:
+                codes = [
+                    self.transcript_id_ids[transcript_id]
+                    for transcript_id in segment_filter.transcript_ids
+                    if transcript_id in self.transcript_id_ids
+                ]
+                mask &= np.isin(self.transcript_id_codes, codes)
+        return mask
+
+    def lexical_search(
+        self,
+        queries: list[str],
+        k: int,
+        mask: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            # built on first use, so purely semantic users never pay for it
+            if self.lexical_index is None:
+                self.lexical_index = LexicalIndex()
+                self.lexical_index.add([s.text for s in self.segments])
+            scores, ids = self.lexical_index.search(queries, k=k, mask=mask)
+        return scores, ids
+
+    def get_segments(self, ids: np.ndarray) -> list[SegmentDb]:
+        return [self.segments[i] for i in ids if i >= 0]
+
+    def get_embeddings(self, ids: list[int]) -> np.ndarray:
+        # embeddings as indexed, i.e. normalized and, for pq indexes, lossy
+        embeddings = np.empty((len(ids), self.dim), dtype=np.float32)
+        ids_array = np.asarray(ids, dtype=np.int64)
+        for shard in list(self.shards):
+            local = (ids_array >= shard.offset) & (
+                ids_array < shard.offset + shard.size
+            )
+            if local.any():
+                embeddings[local] = shard.reconstruct(ids_array[local] - shard.offset)
+        return embeddings
+
+
+class IndexCache:
+    def __init__(
+        self,
+        max_users: int,
+        max_segments: int,
+        ttl_seconds: float,
+    ) -> None:
+        self.max_users = max_users
+        self.max_segments = max_segments
+        self.ttl_seconds = ttl_seconds
+        self.user_indexes: OrderedDict[str, UserIndex] = OrderedDict()
+        self.lock = threading.Lock()
+        # one build per user at a time, concurrent misses wait for it. segments
+        # added while a build reads the db are held and applied once it is put
+        self.build_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self.pending: dict[str, list[tuple[list[SegmentDb], np.ndarray]]] = {}
+
+    def _expired(self, user_index: UserIndex) -> bool:
+        return time.monotonic() - user_index.built_at > self.ttl_seconds
+
+    def _evict(self) -> None:
+        total_segments = sum(ui.size for ui in self.user_indexes.values())
+        while self.user_indexes and (
+            len(self.user_indexes) > self.max_users
+            or total_segments > self.max_segments
+        ):
+            user, user_index = self.user_indexes.popitem(last=False)
+            total_segments -= user_index.size
+            logger.info(f"index cache evict [{user=}, {user_index.size=}]")
+
+    def get(self, user: str) -> UserIndex | None:
+        with self.lock:
+            user_index = self.user_indexes.get(user)
+            if user_index is None:
+                return None
+            if self._expired(user_index):
+                del self.user_indexes[user]
+                return None
+            self.user_indexes.move_to_end(user)
+            return user_index
+
+    def put(self, user: str, user_index: UserIndex) -> None:
+        with self.lock:
+            # under the lock, an add can't land between the two
+            for segments, embeddings in self.pending.pop(user, []):
+                user_index.add(segments=segments, embeddings=embeddings)
+            self.user_indexes[user] = user_index
+            self.user_indexes.move_to_end(user)
+            self._evict()
+
+    @contextlib.asynccontextmanager
+    async def building(self, user: str) -> AsyncIterator[None]:
+        lock = self.build_locks.setdefault(user, asyncio.Lock())
+        async with lock:
+            with self.lock:
+                self.pending.setdefault(user, [])
+            try:
+                yield
+            finally:
+                with self.lock:
+                    self.pending.pop(user, None)
+
+    def add(
+        self,
+        user: str,
+        segments: list[SegmentDb],
+        embeddings: np.ndarray,
+    ) -> None:
+        # only indexes that are resident (or being built) are extended, a user
+        # that is not cached gets a full build from the db on its next search
+        if not segments:
+            return
+        user_index = self.get(user)
+        if user_index is None:
+            with self.lock:
+                if user in self.pending:
+                    self.pending[user].append((segments, embeddings))
+            return
+        added = user_index.add(segments=segments, embeddings=embeddings)
+        logger.info(f"index cache add [{user=}, {added=}, {user_index.size=}]")
+        with self.lock:
+            self._evict()
+
+    def invalidate(self, user: str) -> None:
+        with self.lock:
+            self.user_indexes.pop(user, None)
+
+
+# factories
+
+
+def index_cache_fct(
+    max_users: int,
+    max_segments: int,
+    ttl_seconds: float,
+) -> IndexCache:
+    index_cache = IndexCache(
+        max_users=max_users,
+        max_segments=max_segments,
+        ttl_seconds=ttl_seconds,
+    )
+    return index_cache
@@ -0,0 +1,131 @@
+import asyncio
+import base64
+import contextlib
+
+import numpy as np
+from pydantic import BaseModel, ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from vidoso.core.logger import logger
+from vidoso.core.pubsub import listen
+from vidoso.repo.schemas import EMBEDDING_DTYPE, SegmentDb, decode_embeddings
+from vidoso.services.index_cache import IndexCache
+
+
+class IndexUpdate(BaseModel):
+    # segments written for a user, their embeddings as one base64 encoded
+    # float32 (rows, dim) buffer
+    user: str
+    segments: list[SegmentDb]
+    dim: int
+    embeddings: str
+
+    @classmethod
+    def from_segments(cls, user: str, segments: list[SegmentDb]) -> "IndexUpdate":
+        embeddings = np.ascontiguousarray(decode_embeddings(segments), EMBEDDING_DTYPE)
+        return cls(
+            user=user,
+            segments=[
+                segment.model_copy(update={"embedding": None, "embedding_format": None})
+                for segment in segments
+            ],
+            dim=embeddings.shape[1],
+            embeddings=base64.b64encode(embeddings.tobytes()).decode(),
+        )
+
+    def decode_embeddings(self) -> np.ndarray:
+        buffer = base64.b64decode(self.embeddings)
+        return np.frombuffer(buffer, dtype=EMBEDDING_DTYPE).reshape(-1, self.dim)
+
+
+class IndexUpdatePublisher:
+    def __init__(self, redis_client: Redis, channel: str) -> None:
+        self.redis_client = redis_client
+        self.channel = channel
+
+    async def publish(self, user: str, segments: list[SegmentDb]) -> None:
+        # best effort: an api that misses an update serves the index without the
+        # segments until it is rebuilt (after `index_cache_ttl_seconds`)
+        if not segments:
+            return
+        update = IndexUpdate.from_segments(user, segments)
+        try:
+            await self.redis_client.publish(self.channel, update.model_dump_json())
+        except RedisError as e:
+            logger.warning(f"index update publish failed [{user=}, {e=}]")
+
+
+class IndexUpdateSubscriber:
+    def __init__(
+        self,
+        redis_client: Redis,
+        channel: str,
+        index_cache: IndexCache,
+        reconnect_max_seconds: float = 30,
+    ) -> None:
+        # the segments the workers write are appended to the indexes resident in
+        # this process, searches see them without a rebuild
+        self.redis_client = redis_client
+        self.channel = channel
+        self.index_cache = index_cache
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self.task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+    async def _run(self) -> None:
+        await listen(
+            self.redis_client,
+            self.channel,
+            self._apply,
+            reconnect_max_seconds=self.reconnect_max_seconds,
+        )
+
+    async def _apply(self, data: bytes | str) -> None:
+        try:
+            update = IndexUpdate.model_validate_json(data)
+        except ValidationError as e:
+            logger.warning(f"index update dropped [{e=}]")
+            return
+        # faiss adds run off the loop, searches keep being served meanwhile
+        await asyncio.to_thread(
+            self.index_cache.add,
+            user=update.user,
+            segments=update.segments,
+            embeddings=update.decode_embeddings(),
+        )
+
+
+# factories
+
+
+def index_update_publisher_fct(
+    redis_client: Redis, channel: str
+) -> IndexUpdatePublisher:
+    index_update_publisher = IndexUpdatePublisher(
+        redis_client=redis_client, channel=channel
+    )
+    return index_update_publisher
+
+
+def index_update_subscriber_fct(
+    redis_client: Redis,
+    channel: str,
+    index_cache: IndexCache,
+) -> IndexUpdateSubscriber:
+    index_update_subscriber = IndexUpdateSubscriber(
+        redis_client=redis_client,
+        channel=channel,
+        index_cache=index_cache,
+    )
+    return index_update_subscriber
@@ -0,0 +1,268 @@
+import asyncio
+import contextlib
+import datetime as dt
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+
+from pydantic import BaseModel, ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from vidoso.core.logger import logger
+from vidoso.core.pubsub import listen
+from vidoso.repo.jobs import JobsRepo
+from vidoso.repo.schemas import JobDb, JobProgress, JobStatus
+
+# a job publishes nothing after these
+FINAL_PROGRESS = {JobProgress.DONE, JobProgress.FAILED}
+
+
+class JobEvent(BaseModel):
+    job_id: str
+    user: str
+    status: JobStatus
+    progress: JobProgress | None = None
+    segments_done: int = 0
+    published_at: dt.datetime
+
+    @classmethod
+    def from_job(cls, job: JobDb) -> "JobEvent":
+        return cls(
+            job_id=job.job_id,
+            user=job.user,
+            status=job.status,
+            progress=job.progress,
+            segments_done=job.segments_done,
+            published_at=dt.datetime.now(dt.UTC),
+        )
+
+    @property
+    def final(self) -> bool:
+        # jobs from before `progress` only have their status
+        return self.progress in FINAL_PROGRESS or (
+            self.progress is None and self.status == JobStatus.DONE
+        )
+
+
+class JobEventPublisher:
+    def __init__(self, redis_client: Redis, channel: str) -> None:
+        self.redis_client = redis_client
+        self.channel = channel
+
+    async def publish(self, job: JobDb) -> None:
+        # best effort: the job in the db stays the source of truth, a lost event
+        # only delays the clients until they read it
+        event = JobEvent.from_job(job)
+        try:
+            await self.redis_client.publish(self.channel, event.model_dump_json())
+        except RedisError as e:
+            logger.warning(f"job event publish failed [{job.job_id=}, {e=}]")
+
+
+class JobEventHub:
+    def __init__(
+        self,
+        redis_client: Redis,
+        channel: str,
+        max_queued: int = 100,
+        max_jobs: int = 10_000,
+        reconnect_max_seconds: float = 30,
+    ) -> None:
+        # one subscription to the channel per process, its events are fanned out
+        # to the local subscribers of the event's user
+        self.redis_client = redis_client
+        self.channel = channel
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self.subscribers: dict[str, set[asyncio.Queue[JobEvent]]] = {}
+        # the last event of recent jobs, so a client reconnecting (or long
+        # polling again) gets what it missed in between
+        self.last_events: OrderedDict[str, JobEvent] = OrderedDict()
+        self.task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+    async def _run(self) -> None:
+        await listen(
+            self.redis_client,
+            self.channel,
+            self._dispatch,
+            reconnect_max_seconds=self.reconnect_max_seconds,
+        )
+
+    def _dispatch(self, data: bytes | str) -> None:
+        try:
+            event = JobEvent.model_validate_json(data)
+        except ValidationError as e:
+            logger.warning(f"job event dropped [{e=}]")
+            return
+        self.last_events[event.job_id] = event
+        self.last_events.move_to_end(event.job_id)
+        while len(self.last_events) > self.max_jobs:
+            self.last_events.popitem(last=False)
+        for queue in self.subscribers.get(event.user, ()):
+            if queue.full():
+                # a slow client loses its oldest events, not the newest state
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def recent(
+        self,
+        user: str,
+        job_ids: list[str] | None = None,
+        after: dt.datetime | None = None,
+    ) -> list[JobEvent]:
+        return [
+            event
+            for event in self.last_events.values()
+            if event.user == user
+            and (not job_ids or event.job_id in job_ids)
+            and (after is None or event.published_at > after)
+        ]
+
+    @contextlib.contextmanager
+    def subscribe(self, user: str) -> Iterator[asyncio.Queue[JobEvent]]:
+        self.start()
+        queue: asyncio.Queue[JobEvent] = asyncio.Queue(maxsize=self.max_queued)
+        self.subscribers.setdefault(user, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers[user]
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user]
+
+    async def current(
+        self,
+        user: str,
+        jobs_repo: JobsRepo,
+        job_ids: list[str] | None = None,
+        after: dt.datetime | None = None,
+    ) -> tuple[list[JobEvent], set[str]]:
+        # what a request starts from: the jobs' events published after `after`,
+        # and the last state of those done already (the client may have missed
+        # it), with the ids of the jobs still running. jobs this process has no
+        # event of (done before it subscribed, evicted, ...) are read from the db
+        found = self.recent(user, job_ids=job_ids, after=after)
+        if not job_ids:
+            return found, set()
+        events = {
+            job_id: event
+            for job_id in dict.fromkeys(job_ids)
+            if (event := self.last_events.get(job_id)) and event.user == user
+        }
+        if missing := [job_id for job_id in job_ids if job_id not in events]:
+            jobs = await jobs_repo.get_multi_by_job_ids(
+                job_ids=list(dict.fromkeys(missing)),
+                attributes=["job_id", "status", "segments_done", "progress"],
+            )
+            for job in jobs.jobs:
+                if job.user == user:
+                    event = JobEvent.from_job(job)
+                    events[event.job_id] = event
+                    if after is None:
+                        found.append(event)
+        found += [
+            event for event in events.values() if event.final and event not in found
+        ]
+        # unknown jobs are not waited for
+        pending = {job_id for job_id, event in events.items() if not event.final}
+        return found, pending
+
+    async def events(
+        self,
+        user: str,
+        jobs_repo: JobsRepo,
+        job_ids: list[str] | None = None,
+        after: dt.datetime | None = None,
+        keepalive_seconds: float = 15,
+    ) -> AsyncIterator[JobEvent | None]:
+        # the current state of the user's jobs, then new events as they come.
+        # yields None when idle for `keepalive_seconds`, ends once all `job_ids`
+        # are done
+        with self.subscribe(user) as queue:
+            # subscribed first, so nothing published while reading the db is lost
+            found, pending = await self.current(
+                user, jobs_repo=jobs_repo, job_ids=job_ids, after=after
+            )
+            for event in found:
+                yield event
+            while not job_ids or pending:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive_seconds)
+                except TimeoutError:
+                    yield None
+                    continue
+                if job_ids and event.job_id not in pending:
+                    continue
+                yield event
+                if event.final:
+                    pending.discard(event.job_id)
+
+    async def wait(
+        self,
+        user: str,
+        jobs_repo: JobsRepo,
+        job_ids: list[str] | None = None,
+        after: dt.datetime | None = None,
+        timeout: float = 30,
+    ) -> list[JobEvent]:
+        # long-poll: the current state of the jobs, waiting up to `timeout` for
+        # an event when there is nothing new and some of `job_ids` still run
+        with self.subscribe(user) as queue:
+            found, pending = await self.current(
+                user, jobs_repo=jobs_repo, job_ids=job_ids, after=after
+            )
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (
+                not found
+                and (not job_ids or pending)
+                and (remaining := deadline - loop.time()) > 0
+            ):
+                try:
+                    event = await asyncio.wait_for(queue.get(), remaining)
+                except TimeoutError:
+                    break
+                if not job_ids or event.job_id in pending:
+                    found.append(event)
+            # whatever else arrived meanwhile goes with it
+            while not queue.empty():
+                event = queue.get_nowait()
+                if (not job_ids or event.job_id in pending) and event not in found:
+                    found.append(event)
+        return found
+
+
+# factories
+
+
+def job_event_publisher_fct(redis_client: Redis, channel: str) -> JobEventPublisher:
+    job_event_publisher = JobEventPublisher(redis_client=redis_client, channel=channel)
+    return job_event_publisher
+
+
+def job_event_hub_fct(
+    redis_client: Redis,
+    channel: str,
+    max_queued: int = 100,
+    max_jobs: int = 10_000,
+) -> JobEventHub:
+    job_event_hub = JobEventHub(
+        redis_client=redis_client,
+        channel=channel,
+        max_queued=max_queued,
+        max_jobs=max_jobs,
+    )
+    return job_event_hub
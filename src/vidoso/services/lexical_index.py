@@ -0,0 +1,91 @@
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from spacy.language import Language
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+@lru_cache
+def get_tokenizer() -> "Language":
+    # only the rule based tokenizer is needed, no trained pipeline to download.
+    # spacy is imported on first use, apis that never search lexically skip it
+    import spacy
+
+    return spacy.blank("en")
+
+
+def tokenize(texts: list[str]) -> list[list[str]]:
+    return [
+        [
+            token.lower_
+            for token in doc
+            if not (token.is_space or token.is_punct or token.is_stop)
+        ]
+        for doc in get_tokenizer().pipe(texts)
+    ]
+
+
+class LexicalIndex:
+    def __init__(self) -> None:
+        self.postings: defaultdict[str, dict[int, int]] = defaultdict(dict)
+        self.doc_lens: list[int] = []
+        self.total_len = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_lens)
+
+    def add(self, texts: list[str]) -> None:
+        # documents are numbered in insertion order, matching the vector index
+        for tokens in tokenize(texts):
+            doc_id = len(self.doc_lens)
+            for term, tf in Counter(tokens).items():
+                self.postings[term][doc_id] = tf
+            self.doc_lens.append(len(tokens))
+            self.total_len += len(tokens)
+
+    def scores(self, tokens: list[str]) -> np.ndarray:
+        n = self.size
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        doc_lens = np.array(self.doc_lens, dtype=np.float32)
+        avg_len = self.total_len / n or 1.0
+        for term in set(tokens):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            doc_ids = np.fromiter(postings.keys(), dtype=np.int64)
+            tfs = np.fromiter(postings.values(), dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lens[doc_ids] / avg_len)
+            scores[doc_ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def search(
+        self,
+        queries: list[str],
+        k: int,
+        mask: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # same layout as faiss: (scores, ids) of shape (len(queries), k), padded
+        # with -1 ids when fewer than k documents match
+        all_scores = np.zeros((len(queries), k), dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, tokens in enumerate(tokenize(queries)):
+            scores = self.scores(tokens)
+            if mask is not None:
+                scores[: len(mask)][~mask] = 0
+                scores[len(mask) :] = 0
+            matches = np.flatnonzero(scores)
+            top = matches[np.argsort(-scores[matches], kind="stable")[:k]]
+            all_scores[i, : len(top)] = scores[top]
+            all_ids[i, : len(top)] = top
+        return all_scores, all_ids
@@ -0,0 +1,229 @@
+import os
+import resource
+import threading
+import time
+from collections.abc import Callable
+from enum import StrEnum, auto
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from pydantic import BaseModel
+
+from vidoso.config import EncoderBackend, TranscriptionBackend
+from vidoso.core.logger import logger
+from vidoso.services.chunked_transcription import ChunkedTranscriber, ChunkingOptions
+from vidoso.services.sentence_encoding import encoder_name, load_sentence_transformer
+from vidoso.services.transcription import (
+    SAMPLE_RATE,
+    Transcriber,
+    load_transcriber,
+)
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# one second of silence is enough to warm up a transcriber
+WHISPER_WARMUP_AUDIO = np.zeros(SAMPLE_RATE, dtype=np.float32)
+SENTENCE_TRANSFORMER_WARMUP_TEXTS = ["warmup"]
+
+
+class ModelKind(StrEnum):
+    TRANSCRIBER = auto()
+    SENTENCE_TRANSFORMER = auto()
+
+
+class ModelStats(BaseModel):
+    kind: ModelKind
+    name: str
+    device: str
+    ready: bool = False
+    load_seconds: float | None = None
+    warmup_seconds: float | None = None
+    # resident memory growth of the process while loading the model
+    rss_bytes: int | None = None
+
+
+ModelKey = tuple[ModelKind, str, str]
+
+
+def transcriber_name(
+    backend: TranscriptionBackend, size: str, chunking: ChunkingOptions | None
+) -> str:
+    name = f"{backend}:{size}"
+    return name if chunking is None else f"{name}:chunked"
+
+
+def current_rss_bytes() -> int:
+    # current resident set size on linux, peak rss elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def configure_torch_threads(threads: int, interop_threads: int | None = None) -> None:
+    # process wide, before any model runs: the inter-op pool can't be resized
+    # once used
+    import torch
+
+    torch.set_num_threads(threads)
+    if interop_threads:
+        torch.set_num_interop_threads(interop_threads)
+    logger.info(f"torch threads [{threads=}, {interop_threads=}]")
+
+
+class ModelRegistry:
+    def __init__(self, device: str | None = None) -> None:
+        # every (kind, name, device) is loaded and warmed up once per process,
+        # models are then shared by all requests and tasks
+        self.device = device
+        self.models: dict[ModelKey, Any] = {}
+        self.stats: dict[ModelKey, ModelStats] = {}
+        self.key_locks: dict[ModelKey, threading.Lock] = {}
+        self.expected: set[ModelKey] = set()
+        self.lock = threading.Lock()
+
+    def _key(self, kind: ModelKind, name: str, device: str | None) -> ModelKey:
+        return kind, name, device or self.device or "auto"
+
+    def _get(
+        self,
+        key: ModelKey,
+        load: Callable[[], Any],
+        warmup: Callable[[Any], Any],
+    ) -> Any:
+        model = self.models.get(key)
+        if model is not None:
+            return model
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+            stats = self.stats.setdefault(
+                key, ModelStats(kind=key[0], name=key[1], device=key[2])
+            )
+        # one lock per model, loading whisper doesn't hold up the encoder
+        with key_lock:
+            model = self.models.get(key)
+            if model is not None:
+                return model
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = load()
+            stats.load_seconds = time.perf_counter() - start
+            stats.rss_bytes = current_rss_bytes() - rss_before
+
+            start = time.perf_counter()
+            warmup(model)
+            stats.warmup_seconds = time.perf_counter() - start
+
+            self.models[key] = model
+            stats.ready = True
+            logger.info(f"model loaded [{stats=}]")
+        return model
+
+    def transcriber(
+        self,
+        backend: TranscriptionBackend,
+        size: str,
+        device: str | None = None,
+        chunking: ChunkingOptions | None = None,
+        **options: Any,
+    ) -> Transcriber:
+        key = self._key(
+            ModelKind.TRANSCRIBER, transcriber_name(backend, size, chunking), device
+        )
+        load = partial(
+            load_transcriber, backend, size, device=device or self.device, **options
+        )
+        transcriber: Transcriber
+        if chunking is None:
+            transcriber = self._get(
+                key,
+                load=load,
+                warmup=lambda m: m.transcribe(WHISPER_WARMUP_AUDIO, language="en"),
+            )
+        else:
+            # the models live in the pool processes, the registry holds the pool
+            transcriber = self._get(
+                key,
+                load=lambda: ChunkedTranscriber(load, chunking),
+                warmup=lambda m: m.warmup(WHISPER_WARMUP_AUDIO),
+            )
+        return transcriber
+
+    def sentence_transformer(
+        self,
+        name: str,
+        device: str | None = None,
+        backend: EncoderBackend = EncoderBackend.TORCH,
+        **options: Any,
+    ) -> "SentenceTransformer":
+        # model libraries (and torch) are imported on first load, processes that
+        # never load a model never import them
+        key = self._key(
+            ModelKind.SENTENCE_TRANSFORMER, encoder_name(name, backend), device
+        )
+        sentence_transformer: SentenceTransformer = self._get(
+            key,
+            load=partial(
+                load_sentence_transformer,
+                name,
+                backend,
+                device=device or self.device,
+                **options,
+            ),
+            warmup=lambda m: m.encode(SENTENCE_TRANSFORMER_WARMUP_TEXTS),
+        )
+        return sentence_transformer
+
+    def preload(
+        self,
+        transcribers: list[tuple[TranscriptionBackend, str]] | None = None,
+        sentence_transformers: list[tuple[EncoderBackend, str]] | None = None,
+        chunking: ChunkingOptions | None = None,
+        encoder_options: dict[str, Any] | None = None,
+        **transcriber_options: Any,
+    ) -> None:
+        # the preloaded models are the ones `ready` waits for
+        transcribers = transcribers or []
+        sentence_transformers = sentence_transformers or []
+        encoder_options = encoder_options or {}
+        with self.lock:
+            self.expected |= {
+                self._key(
+                    ModelKind.TRANSCRIBER,
+                    transcriber_name(backend, size, chunking),
+                    None,
+                )
+                for backend, size in transcribers
+            } | {
+                self._key(
+                    ModelKind.SENTENCE_TRANSFORMER, encoder_name(name, backend), None
+                )
+                for backend, name in sentence_transformers
+            }
+        for backend, size in transcribers:
+            self.transcriber(backend, size, chunking=chunking, **transcriber_options)
+        for backend, name in sentence_transformers:
+            self.sentence_transformer(name, backend=backend, **encoder_options)
+
+    def ready(self) -> bool:
+        with self.lock:
+            return all(
+                key in self.stats and self.stats[key].ready for key in self.expected
+            )
+
+    def get_stats(self) -> list[ModelStats]:
+        with self.lock:
+            return [stats.model_copy() for stats in self.stats.values()]
+
+
+# factories
+
+
+def model_registry_fct(device: str | None = None) -> ModelRegistry:
+    model_registry = ModelRegistry(device=device)
+    return model_registry
@@ -1,49 +1,297 @@
+import asyncio
+import heapq
 import json
-from operator import itemgetter
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor
+from enum import StrEnum, auto
+from functools import partial
+from typing import Any
 
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
+from vidoso.core.timing import bind_labels, stage_timings, timed
+from vidoso.repo.schemas import SegmentDb, decode_embeddings
 from vidoso.repo.segments import SegmentsRepo
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.index_builder import IndexBuilder
+from vidoso.services.index_cache import IndexCache, SegmentFilter, UserIndex
+
+# reciprocal rank fusion constant, dampens the weight of the top ranks
+RRF_K = 60
+
+# hybrid search fuses deeper candidate lists than the requested `k`
+HYBRID_CANDIDATES_FACTOR = 4
+
+# a search hit is identified by its user and its id within that user's index
+HitKey = tuple[str, int]
+
+
+class SearchMode(StrEnum):
+    LEXICAL = auto()
+    SEMANTIC = auto()
+    HYBRID = auto()
+
+
+def rrf_fuse(rankings: list[list[list[HitKey]]], k: int) -> list[list[HitKey]]:
+    fused = []
+    for rows in zip(*rankings):
+        scores: dict[HitKey, float] = {}
+        for row in rows:
+            for rank, key in enumerate(row):
+                scores[key] = scores.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+        fused.append(sorted(scores, key=scores.__getitem__, reverse=True)[:k])
+    return fused
+
+
+def timed_ms(func: Callable[[], Any]) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
 
 
 class SearchService:
     def __init__(
         self,
         segments_repo: SegmentsRepo,
-        sentence_transformer: SentenceTransformer,
+        encode_batcher: EncodeBatcher,
+        index_cache: IndexCache,
+        index_builder: IndexBuilder,
+        executor: Executor,
     ) -> None:
         self.segments_repo = segments_repo
-        self.sentence_transformer = sentence_transformer
+        self.encode_batcher = encode_batcher
+        self.index_cache = index_cache
+        self.index_builder = index_builder
+        self.executor = executor
+
+    async def get_user_index(self, user: str) -> UserIndex | None:
+        user_index = self.index_cache.get(user)
+        if user_index is not None:
+            return user_index
+        async with self.index_cache.building(user):
+            # built meanwhile by the search holding the lock
+            user_index = self.index_cache.get(user)
+            if user_index is not None:
+                return user_index
+            return await self._build_user_index(user)
+
+    async def _build_user_index(self, user: str) -> UserIndex | None:
+        # the index build is the one read that needs the embeddings, they are
+        # decoded page by page as the segments stream in and the raw bytes are
+        # dropped right away
+        segments: list[SegmentDb] = []
+        pages_embeddings: list[np.ndarray] = []
+        with bind_labels(user=user):
+            # the read time is the load time less the (interleaved) decode time
+            start = time.perf_counter()
+            decode_seconds = 0.0
+            async for page in self.segments_repo.iter_pages_by_user(
+                user=user, attributes=list(SegmentDb.model_fields)
+            ):
+                with timed("decode", size=len(page)) as span:
+                    pages_embeddings.append(
+                        await asyncio.to_thread(decode_embeddings, page)
+                    )
+                decode_seconds += span["seconds"]
+                segments.extend(
+                    segment.model_copy(
+                        update={"embedding": None, "embedding_format": None}
+                    )
+                    for segment in page
+                )
+            stage_timings.observe(
+                "dynamodb_read",
+                time.perf_counter() - start - decode_seconds,
+                size=len(segments),
+            )
+            if not segments:
+                return None
+
+            with timed("index_build", size=len(segments)):
+                user_index = await asyncio.to_thread(
+                    self.index_builder.build,
+                    user,
+                    segments,
+                    np.vstack(pages_embeddings),
+                )
+        self.index_cache.put(user, user_index)
+        return user_index
+
+    async def _scatter(
+        self,
+        searches: list[tuple[dict[str, Any], Callable[[], Any]]],
+        n_queries: int,
+        k: int,
+        shard_stats: list[dict[str, Any]],
+    ) -> list[list[HitKey]]:
+        # runs every shard search on the executor and merges the per shard top-k
+        # lists into a global top-k per query, lower scores rank first
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, timed_ms, search)
+                for _, search in searches
+            )
+        )
+
+        rows: list[list[tuple[float, str, int]]] = [[] for _ in range(n_queries)]
+        for (shard, _), ((scores, ids), latency_ms) in zip(searches, results):
+            shard_stats.append(shard | {"latency_ms": latency_ms})
+            stage_timings.observe(
+                f"{shard['kind']}_search",
+                latency_ms / 1000,
+                user=shard["user"],
+                size=shard["size"],
+            )
+            for q in range(n_queries):
+                rows[q].extend(
+                    (float(score), shard["user"], int(i))
+                    for score, i in zip(scores[q], ids[q])
+                    if i >= 0
+                )
+        return [[(user, i) for _, user, i in heapq.nsmallest(k, row)] for row in rows]
+
+    async def semantic_search(
+        self,
+        user_indexes: dict[str, UserIndex],
+        queries: np.ndarray,
+        k: int,
+        shard_stats: list[dict[str, Any]],
+        masks: dict[str, np.ndarray | None],
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+    ) -> list[list[HitKey]]:
+        searches = []
+        for user, user_index in user_indexes.items():
+            mask = masks[user]
+            for shard_id, shard in enumerate(list(user_index.shards)):
+                shard_mask = (
+                    mask[shard.offset : shard.offset + shard.size]
+                    if mask is not None
+                    else None
+                )
+                # shards without any segment passing the filters are skipped
+                if shard_mask is not None and not shard_mask.any():
+                    continue
+                searches.append(
+                    (
+                        {
+                            "user": user,
+                            "shard": shard_id,
+                            "kind": SearchMode.SEMANTIC,
+                            "size": shard.size,
+                        },
+                        partial(
+                            shard.search,
+                            queries,
+                            k,
+                            nprobe=nprobe,
+                            ef_search=ef_search,
+                            mask=shard_mask,
+                        ),
+                    )
+                )
+        return await self._scatter(
+            searches, n_queries=len(queries), k=k, shard_stats=shard_stats
+        )
+
+    async def lexical_search(
+        self,
+        user_indexes: dict[str, UserIndex],
+        queries: list[str],
+        k: int,
+        shard_stats: list[dict[str, Any]],
+        masks: dict[str, np.ndarray | None],
+    ) -> list[list[HitKey]]:
+        def search(
+            user_index: UserIndex, mask: np.ndarray | None
+        ) -> tuple[np.ndarray, np.ndarray]:
+            scores, ids = user_index.lexical_search(queries, k=k, mask=mask)
+            return -scores, ids
+
+        searches = [
+            (
+                {"user": user, "kind": SearchMode.LEXICAL, "size": user_index.size},
+                partial(search, user_index, masks[user]),
+            )
+            for user, user_index in user_indexes.items()
+        ]
+        return await self._scatter(
+            searches, n_queries=len(queries), k=k, shard_stats=shard_stats
+        )
 
     async def search(
         self,
-        user: str,
+        users: list[str],
         k: int,
         text: list[str],
         embeddings: list[str],
         exclude_embeddings: bool = True,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mode: SearchMode = SearchMode.SEMANTIC,
+        segment_filter: SegmentFilter | None = None,
     ) -> dict:
-        # TODO: this method needs some love
+        users = list(dict.fromkeys(users))
+        found = await asyncio.gather(*(self.get_user_index(user) for user in users))
+        user_indexes = {
+            user: user_index
+            for user, user_index in zip(users, found)
+            if user_index is not None
+        }
+        if not user_indexes:
+            return {"text": [], "embeddings": []}
 
-        segments_db = await self.segments_repo.get_multi_by_user(user=user)
-        if not segments_db.segments:
-            return None
+        # filters are resolved against the cached segment metadata into per user
+        # id masks, which are pushed down into the index searches
+        segment_filter = segment_filter or SegmentFilter()
+        masks = {
+            user: user_index.mask(segment_filter)
+            for user, user_index in user_indexes.items()
+        }
 
-        segments_embeddings = np.array(
-            [
-                np.array(json.loads(segment.embedding), dtype=np.float32)
-                for segment in segments_db.segments
-            ]
+        shard_stats: list[dict[str, Any]] = []
+        semantic_search = partial(
+            self.semantic_search,
+            user_indexes,
+            shard_stats=shard_stats,
+            masks=masks,
+            nprobe=nprobe,
+            ef_search=ef_search,
         )
-        dim = segments_embeddings.shape[1]
 
+        # text queries follow `mode`, lexical only ones never touch the encoder
+        text_hits: list[list[HitKey]] = []
         if text:
-            query_text_embeddings = self.sentence_transformer.encode(text)
-        else:
-            query_text_embeddings = np.array([], dtype=np.float32).reshape(0, dim)
+            candidates = (
+                k * HYBRID_CANDIDATES_FACTOR if mode == SearchMode.HYBRID else k
+            )
+            rankings = []
+            if mode != SearchMode.LEXICAL:
+                with timed("encode", size=len(text)):
+                    query_text_embeddings = np.array(
+                        await self.encode_batcher.encode(text), dtype=np.float32
+                    )
+                faiss.normalize_L2(query_text_embeddings)
+                rankings.append(
+                    await semantic_search(query_text_embeddings, k=candidates)
+                )
+            if mode != SearchMode.SEMANTIC:
+                rankings.append(
+                    await self.lexical_search(
+                        user_indexes,
+                        text,
+                        k=candidates,
+                        shard_stats=shard_stats,
+                        masks=masks,
+                    )
+                )
+            text_hits = rrf_fuse(rankings, k=k) if len(rankings) > 1 else rankings[0]
 
+        # raw embedding queries are always semantic
+        embeddings_hits: list[list[HitKey]] = []
         if embeddings:
             query_raw_embeddings = np.array(
                 [
@@ -51,53 +299,28 @@ class SearchService:
                     for embedding in embeddings
                 ]
             )
-        else:
-            query_raw_embeddings = np.array([], dtype=np.float32).reshape(0, dim)
+            faiss.normalize_L2(query_raw_embeddings)
+            embeddings_hits = await semantic_search(query_raw_embeddings, k=k)
 
-        query_embeddings = np.vstack([query_text_embeddings, query_raw_embeddings])
-
-        faiss.normalize_L2(query_embeddings)
-        faiss.normalize_L2(segments_embeddings)
-
-        index = faiss.IndexFlatL2(dim)
-        index.add(segments_embeddings)
-        distances, ann = index.search(query_embeddings, k=k)
-
-        text_search_segments = (
-            [
-                itemgetter(*a)(segments_db.segments)
-                for a in ann[: query_text_embeddings.shape[0]]
+        def dump(rows: list[list[HitKey]]) -> list[list[dict]]:
+            dumps = [
+                [user_indexes[user].segments[i].dump_for_read() for user, i in row]
+                for row in rows
             ]
-            if query_text_embeddings.shape[0]
-            else []
-        )
-        embeddings_search_segments = (
-            [
-                itemgetter(*a)(segments_db.segments)
-                for a in ann[-query_raw_embeddings.shape[0] :]
-            ]
-            if query_raw_embeddings.shape[0]
-            else []
-        )
+            if exclude_embeddings:
+                return dumps
+            # cached segments don't carry embeddings, hits get theirs from the
+            # index
+            for row, row_dumps in zip(rows, dumps):
+                for (user, i), segment_dump in zip(row, row_dumps):
+                    embedding = user_indexes[user].get_embeddings([i])[0]
+                    segment_dump["embedding"] = json.dumps(embedding.tolist())
+            return dumps
+
         results = {
-            "text": [
-                [
-                    s.model_dump(
-                        **({"exclude": ["embedding"]} if exclude_embeddings else {})
-                    )
-                    for s in row
-                ]
-                for row in text_search_segments
-            ],
-            "embeddings": [
-                [
-                    s.model_dump(
-                        **({"exclude": ["embedding"]} if exclude_embeddings else {})
-                    )
-                    for s in row
-                ]
-                for row in embeddings_search_segments
-            ],
+            "text": dump(text_hits),
+            "embeddings": dump(embeddings_hits),
+            "shards": shard_stats,
         }
         return results
 
@@ -107,10 +330,16 @@ class SearchService:
 
 async def search_service_fct(
     segments_repo: SegmentsRepo,
-    sentence_transformer: SentenceTransformer,
+    encode_batcher: EncodeBatcher,
+    index_cache: IndexCache,
+    index_builder: IndexBuilder,
+    executor: Executor,
 ) -> SearchService:
     search_svc = SearchService(
         segments_repo=segments_repo,
-        sentence_transformer=sentence_transformer,
+        encode_batcher=encode_batcher,
+        index_cache=index_cache,
+        index_builder=index_builder,
+        executor=executor,
     )
     return search_svc
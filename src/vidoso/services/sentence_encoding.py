@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from vidoso.config import EncoderBackend
+from vidoso.core.logger import logger
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+def encoder_name(name: str, backend: EncoderBackend) -> str:
+    # backends embed in (slightly) different spaces, caches and transcript
+    # versions key on this. torch keeps the bare model name
+    return name if backend == EncoderBackend.TORCH else f"{name}:{backend}"
+
+
+def export_path(directory: str, name: str) -> Path:
+    # hub names have a namespace, e.g. sentence-transformers/all-MiniLM-L6-v2
+    return Path(directory) / name.replace("/", "--")
+
+
+def quantized_file_name(quantization: str) -> str:
+    return f"onnx/model_qint8_{quantization}.onnx"
+
+
+def export_sentence_transformer(name: str, directory: str, quantization: str) -> Path:
+    # optional dependency, `pip install vidoso[onnx]`
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    path = export_path(directory, name)
+    # the onnx backend exports the fp32 graph (onnx/model.onnx) on load
+    sentence_transformer = SentenceTransformer(name, backend="onnx", device="cpu")
+    sentence_transformer.save_pretrained(str(path))
+    # dynamic quantization: int8 weights, activations quantized at run time
+    export_dynamic_quantized_onnx_model(
+        sentence_transformer,
+        quantization_config=quantization,
+        model_name_or_path=str(path),
+        file_suffix=f"qint8_{quantization}",
+    )
+    logger.info(f"sentence transformer exported [{name=}, {path=}]")
+    return path
+
+
+def load_sentence_transformer(
+    name: str,
+    backend: EncoderBackend,
+    device: str | None = None,
+    export_dir: str = "/tmp/vidoso/encoders",
+    quantization: str = "avx2",
+) -> "SentenceTransformer":
+    # every backend is a SentenceTransformer, only the model runtime differs
+    from sentence_transformers import SentenceTransformer
+
+    path = export_path(export_dir, name)
+    match backend:
+        case EncoderBackend.TORCH:
+            return SentenceTransformer(name, device=device)
+        case EncoderBackend.ONNX:
+            # not exported yet, sentence transformers exports it on every load
+            return SentenceTransformer(
+                str(path) if path.exists() else name, backend="onnx", device=device
+            )
+        case EncoderBackend.ONNX_INT8:
+            file_name = quantized_file_name(quantization)
+            if not (path / file_name).exists():
+                raise FileNotFoundError(
+                    f"{path / file_name} not found, run `vidoso export-encoder`"
+                )
+            return SentenceTransformer(
+                str(path),
+                backend="onnx",
+                device=device,
+                model_kwargs={"file_name": file_name},
+            )
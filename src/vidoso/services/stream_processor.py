@@ -1,18 +1,48 @@
 import asyncio
 import datetime as dt
-import json
-import os
-import tempfile
-from uuid import uuid4
-
-from pytube import YouTube
-from sentence_transformers import SentenceTransformer
-from whisper import Whisper
+import hashlib
+import threading
+from collections.abc import Callable
+from concurrent.futures import Executor
+from enum import StrEnum, auto
+from pathlib import Path
+from uuid import NAMESPACE_URL, uuid4, uuid5
 
 from vidoso.core.logger import logger
+from vidoso.core.timing import bind_labels, timed
+from vidoso.core.urls import normalize_stream_url
 from vidoso.repo.jobs import JobsRepo
-from vidoso.repo.schemas import SegmentDb
+from vidoso.repo.schemas import (
+    JobDb,
+    JobProgress,
+    SegmentDb,
+    TranscriptDb,
+    TranscriptStatus,
+    encode_embedding,
+)
 from vidoso.repo.segments import SegmentsRepo
+from vidoso.repo.transcripts import TranscriptsRepo
+from vidoso.services.audio_cache import AudioCache
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.index_updates import IndexUpdatePublisher
+from vidoso.services.job_events import JobEventPublisher
+from vidoso.services.transcription import Transcriber
+
+# marks the end of a stage's output in the pipeline queues
+END_OF_STAGE = None
+
+
+class IngestOutcome(StrEnum):
+    TRANSCRIBED = auto()
+    # an existing transcript of the stream was copied for the job's user
+    COPIED = auto()
+    # another job is transcribing the stream, the job has to wait for it
+    IN_PROGRESS = auto()
+
+
+def transcript_key(stream_url: str, transcript_version: str) -> str:
+    content = f"{normalize_stream_url(stream_url)}\0{transcript_version}"
+    return hashlib.sha256(content.encode()).hexdigest()
 
 
 class StreamProcessorService:
@@ -20,63 +50,299 @@ class StreamProcessorService:
         self,
         jobs_repo: JobsRepo,
         segments_repo: SegmentsRepo,
-        whisper_model: Whisper,
-        sentence_transformer: str,
+        transcriber: Transcriber,
+        encode_batcher: EncodeBatcher,
+        audio_cache: AudioCache,
+        transcripts_repo: TranscriptsRepo,
+        transcript_version: str,
+        embed_batch_size: int = 32,
+        queue_batches: int = 4,
+        claim_ttl_seconds: float = 3600,
+        transcribe_executor: Executor | None = None,
+        job_events: JobEventPublisher | None = None,
+        index_updates: IndexUpdatePublisher | None = None,
     ) -> None:
         self.jobs_repo = jobs_repo
-        self.whisper_model = whisper_model
+        self.transcriber = transcriber
         self.segments_repo = segments_repo
-        self.sentence_transformer = sentence_transformer
+        # shared by the jobs the worker runs concurrently, their segments are
+        # encoded together
+        self.encode_batcher = encode_batcher
+        self.audio_cache = audio_cache
+        self.transcripts_repo = transcripts_repo
+        self.transcript_version = transcript_version
+        self.embed_batch_size = embed_batch_size
+        self.queue_batches = queue_batches
+        self.claim_ttl_seconds = claim_ttl_seconds
+        # transcription and encoding (the batcher's) run on their own pools, a
+        # transcription blocked on a full queue never holds up the encoding that
+        # drains it. io runs on the loop's default executor
+        self.transcribe_executor = transcribe_executor
+        self.job_events = job_events
+        # written segments are sent to the api processes, which append them to
+        # the users' resident indexes
+        self.index_updates = index_updates
+
+    async def set_progress(
+        self, job: JobDb | None, progress: JobProgress, persist: bool = False
+    ) -> None:
+        # stage changes are pushed to the clients, only the ones they could not
+        # recover from the next db read are written
+        if job is None:
+            return
+        job.progress = progress
+        if persist:
+            await self.jobs_repo.upsert(job=job)
+        if self.job_events is not None:
+            await self.job_events.publish(job)
 
-    def download_and_transcribe_audio_stream(self, stream_url: str) -> dict:
-        logger.info(f"download_and_transcribe_audio_stream [{stream_url=}]")
-        yt = YouTube(stream_url)
-        audio_streams = yt.streams.filter(only_audio=True)
+    def _transcribe(
+        self,
+        path: Path,
+        segments_queue: asyncio.Queue[dict | None],
+        loop: asyncio.AbstractEventLoop,
+        stop: threading.Event,
+    ) -> int:
+        # blocks on the queue when the embed stage falls behind
+        segments = 0
+        for segment in self.transcriber.iter_segments(str(path), language="en"):
+            if stop.is_set():
+                return segments
+            asyncio.run_coroutine_threadsafe(segments_queue.put(segment), loop).result()
+            segments += 1
+        asyncio.run_coroutine_threadsafe(
+            segments_queue.put(END_OF_STAGE), loop
+        ).result()
+        return segments
 
-        # extract the first audio stream
-        stream = audio_streams.get_by_itag(itag=audio_streams[0].itag)
+    async def _transcribe_stage(
+        self,
+        path: Path,
+        segments_queue: asyncio.Queue[dict | None],
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        try:
+            with timed("transcribe") as span:
+                span["size"] = await loop.run_in_executor(
+                    self.transcribe_executor,
+                    self._transcribe,
+                    path,
+                    segments_queue,
+                    loop,
+                    stop,
+                )
+        except BaseException:
+            # stops the transcriber thread, unblocking it if it waits on a full
+            # queue
+            stop.set()
+            while not segments_queue.empty():
+                segments_queue.get_nowait()
+            raise
 
-        with tempfile.NamedTemporaryFile() as temp:
-            dirname = os.path.dirname(temp.name)
-            filename = os.path.basename(temp.name)
-            stream.download(output_path=dirname, filename=filename)
-            transcript = self.whisper_model.transcribe(temp.name, language="en")
-        return transcript
+    async def _embed_stage(
+        self,
+        segments_queue: asyncio.Queue[dict | None],
+        batches_queue: asyncio.Queue[list[SegmentDb] | None],
+        segment_db: Callable[[dict], SegmentDb],
+    ) -> None:
+        done = False
+        while not done:
+            # whatever the transcriber produced so far, up to a batch
+            segments = [await segments_queue.get()]
+            while len(segments) < self.embed_batch_size:
+                try:
+                    segments.append(segments_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            if END_OF_STAGE in segments:
+                done = True
+                segments = segments[: segments.index(END_OF_STAGE)]
+            if not segments:
+                continue
 
-    async def process_stream(self, stream_url: str) -> None:
-        logger.info(f"process_stream [{stream_url=}]")
-        transcript = self.download_and_transcribe_audio_stream(stream_url=stream_url)
+            with timed("encode", size=len(segments)):
+                embeddings = await self.encode_batcher.encode(
+                    [segment["text"] for segment in segments]
+                )
+            segments_db = [segment_db(segment) for segment in segments]
+            for segment, embedding in zip(segments_db, embeddings):
+                segment.embedding, segment.embedding_format = encode_embedding(
+                    embedding
+                )
+            await batches_queue.put(segments_db)
+        await batches_queue.put(END_OF_STAGE)
 
-        transcript_id = str(uuid4())
+    async def refresh_claim(self, claim: TranscriptDb | None) -> None:
+        # a job still transcribing keeps its claim fresh, so a long stream is
+        # not taken over by another job after `claim_ttl_seconds`
+        if claim is None:
+            return
+        if not await self.transcripts_repo.refresh_claim(claim):
+            logger.warning(f"transcript claim taken over [{claim=}]")
+
+    async def publish_segments(self, user: str, segments: list[SegmentDb]) -> None:
+        if self.index_updates is not None:
+            await self.index_updates.publish(user, segments)
+
+    async def _write_stage(
+        self,
+        user: str,
+        batches_queue: asyncio.Queue[list[SegmentDb] | None],
+        job: JobDb | None,
+        claim: TranscriptDb | None,
+    ) -> int:
+        segments_done = 0
+        while (segments_db := await batches_queue.get()) is not END_OF_STAGE:
+            with timed("dynamodb_write", size=len(segments_db)):
+                segments_db_upserted = await self.segments_repo.upsert_multi(
+                    segments=segments_db
+                )
+            # searchable right away by users whose index is resident
+            await self.publish_segments(user, segments_db_upserted)
+            segments_done += len(segments_db_upserted)
+            if job is not None:
+                job.segments_done = segments_done
+                await self.set_progress(job, JobProgress.TRANSCRIBING, persist=True)
+            await self.refresh_claim(claim)
+            logger.info(f"segments added [{user=}, {segments_done=}]")
+        return segments_done
+
+    async def process_stream(
+        self,
+        stream_url: str,
+        user: str = "anonymous",
+        job: JobDb | None = None,
+        transcript_id: str | None = None,
+        claim: TranscriptDb | None = None,
+    ) -> int:
+        # transcription, embedding and writes overlap: segments flow through
+        # bounded queues, so a slow stage holds back the ones before it
+        logger.info(f"process_stream [{stream_url=}, {user=}]")
+
+        transcript_id = transcript_id or str(uuid4())
         now = dt.datetime.now()
-        segments_texts = [segment["text"] for segment in transcript["segments"]]
-        embeddings = self.sentence_transformer.encode(segments_texts)
-
-        async with asyncio.TaskGroup() as tg:
-            tasks = [
-                tg.create_task(
-                    self.segments_repo.upsert(
-                        segment=SegmentDb(
-                            transcript_id=transcript_id,
-                            segment_id=segment["id"],
-                            user="anonymous",
-                            created_at=now,
-                            stream_url=stream_url,
-                            start=segment["start"],
-                            end=segment["end"],
-                            text=segment["text"],
-                            embedding=json.dumps(embeddings[i].tolist()),
-                        )
+
+        def segment_db(segment: dict) -> SegmentDb:
+            return SegmentDb(
+                transcript_id=transcript_id,
+                segment_id=segment["id"],
+                user=user,
+                created_at=now,
+                stream_url=stream_url,
+                start=segment["start"],
+                end=segment["end"],
+                text=segment["text"],
+            )
+
+        segments_queue: asyncio.Queue[dict | None] = asyncio.Queue(
+            maxsize=self.embed_batch_size * self.queue_batches
+        )
+        batches_queue: asyncio.Queue[list[SegmentDb] | None] = asyncio.Queue(
+            maxsize=self.queue_batches
+        )
+        # the download runs on the io pool (the loop's default executor), the
+        # audio is kept on disk so retries and re-processing skip it
+        # the stages' timings carry the user and job
+        with bind_labels(user=user, job=job.job_id if job else None):
+            await self.set_progress(job, JobProgress.DOWNLOADING)
+            with timed("download"):
+                path = await asyncio.to_thread(self.audio_cache.fetch, stream_url)
+            await self.refresh_claim(claim)
+            await self.set_progress(job, JobProgress.TRANSCRIBING)
+            with self.audio_cache.pin(path):
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(self._transcribe_stage(path, segments_queue))
+                    tg.create_task(
+                        self._embed_stage(segments_queue, batches_queue, segment_db)
                     )
-                )
-                for i, segment in enumerate(transcript["segments"])
-            ]
-        segments_db_upserted = [t.result() for t in tasks]
+                    write_task = tg.create_task(
+                        self._write_stage(user, batches_queue, job, claim)
+                    )
+        segments_done = write_task.result()
+        logger.info(f"process_stream done [{stream_url=}, {segments_done=}]")
+        return segments_done
 
-        segments_db_upserted_excluding_embedding = [
-            s.model_dump(exclude=["embedding"]) for s in segments_db_upserted
+    async def copy_transcript(
+        self, transcript: TranscriptDb, job: JobDb, transcript_id: str
+    ) -> int:
+        # the segments of an existing transcript, with their embeddings, under a
+        # transcript of the job's user. nothing is transcribed or encoded again
+        logger.info(f"copy_transcript [{transcript=}, {job.job_id=}]")
+        source = await self.segments_repo.get_multi_by_transcript_id(
+            transcript_id=transcript.transcript_id
+        )
+        now = dt.datetime.now()
+        segments_db = [
+            segment.model_copy(
+                update={
+                    "transcript_id": transcript_id,
+                    "user": job.user,
+                    "created_at": now,
+                    "stream_url": job.stream_url,
+                }
+            )
+            for segment in source.segments
         ]
-        logger.info(f"segments added [{segments_db_upserted_excluding_embedding=}]")
+        segments_db_upserted = await self.segments_repo.upsert_multi(
+            segments=segments_db
+        )
+        await self.publish_segments(job.user, segments_db_upserted)
+        job.segments_done = len(segments_db_upserted)
+        await self.jobs_repo.upsert(job=job)
+        return job.segments_done
+
+    async def process_job(self, job: JobDb) -> IngestOutcome:
+        # a stream is transcribed once per model versions: the first job claims
+        # its transcript key, later jobs copy the result and concurrent ones wait
+        # for it. transcript ids are derived from (key, user), so a user
+        # resubmitting a stream ends up with the same segments
+        key = transcript_key(job.stream_url, self.transcript_version)
+        transcript_id = str(uuid5(NAMESPACE_URL, f"{key}:{job.user}"))
+        now = dt.datetime.now()
+        transcript = TranscriptDb(
+            transcript_key=key,
+            transcript_id=transcript_id,
+            stream_url=job.stream_url,
+            status=TranscriptStatus.PROCESSING,
+            job_id=job.job_id,
+            updated_at=now,
+        )
+        existing = await self.transcripts_repo.claim(
+            transcript,
+            stale_before=now - dt.timedelta(seconds=self.claim_ttl_seconds),
+        )
+        if existing is not None and existing.status == TranscriptStatus.DONE:
+            if existing.transcript_id != transcript_id:
+                await self.copy_transcript(existing, job, transcript_id)
+            elif job.segments_done != existing.segments:
+                job.segments_done = existing.segments
+                await self.jobs_repo.upsert(job=job)
+            return IngestOutcome.COPIED
+        # a retry of the job holding the claim carries on with it
+        if existing is not None and existing.job_id != job.job_id:
+            return IngestOutcome.IN_PROGRESS
+
+        try:
+            segments_done = await self.process_stream(
+                stream_url=job.stream_url,
+                user=job.user,
+                job=job,
+                transcript_id=transcript_id,
+                claim=transcript,
+            )
+        except BaseException:
+            await self.transcripts_repo.update_status(
+                transcript, TranscriptStatus.FAILED
+            )
+            raise
+        if not await self.transcripts_repo.update_status(
+            transcript, TranscriptStatus.DONE, segments=segments_done
+        ):
+            # taken over while transcribing (the claim went stale), the job
+            # waits for the new claim's transcript like any other
+            return IngestOutcome.IN_PROGRESS
+        return IngestOutcome.TRANSCRIBED
 
 
 # factories
@@ -85,13 +351,31 @@ class StreamProcessorService:
 async def stream_processor_service_fct(
     jobs_repo: JobsRepo,
     segments_repo: SegmentsRepo,
-    whisper_model: Whisper,
-    sentence_transformer: SentenceTransformer,
+    transcriber: Transcriber,
+    encode_batcher: EncodeBatcher,
+    audio_cache: AudioCache,
+    transcripts_repo: TranscriptsRepo,
+    transcript_version: str,
+    embed_batch_size: int = 32,
+    queue_batches: int = 4,
+    claim_ttl_seconds: float = 3600,
+    transcribe_executor: Executor | None = None,
+    job_events: JobEventPublisher | None = None,
+    index_updates: IndexUpdatePublisher | None = None,
 ) -> StreamProcessorService:
     stream_processor_svc = StreamProcessorService(
         jobs_repo=jobs_repo,
         segments_repo=segments_repo,
-        whisper_model=whisper_model,
-        sentence_transformer=sentence_transformer,
+        transcriber=transcriber,
+        encode_batcher=encode_batcher,
+        audio_cache=audio_cache,
+        transcripts_repo=transcripts_repo,
+        transcript_version=transcript_version,
+        embed_batch_size=embed_batch_size,
+        queue_batches=queue_batches,
+        claim_ttl_seconds=claim_ttl_seconds,
+        transcribe_executor=transcribe_executor,
+        job_events=job_events,
+        index_updates=index_updates,
     )
     return stream_processor_svc
@@ -0,0 +1,134 @@
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any, Protocol
+
+import numpy as np
+
+from vidoso.config import TranscriptionBackend
+
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
+    from whisper import Whisper
+
+# every backend decodes 16kHz mono audio
+SAMPLE_RATE = 16_000
+
+# a transcript is `{"text": str, "language": str, "segments": [segment, ...]}`
+# with segments `{"id": int, "start": float, "end": float, "text": str}`, the
+# subset of the openai-whisper output the rest of the code relies on
+Transcript = dict[str, Any]
+
+
+class Transcriber(Protocol):
+    def transcribe(self, audio: str | np.ndarray, language: str = "en") -> Transcript:
+        # `audio` is a file path or a float32 array sampled at SAMPLE_RATE
+        ...
+
+    def iter_segments(
+        self, audio: str | np.ndarray, language: str = "en"
+    ) -> Iterator[dict]:
+        # transcript segments, yielded as soon as the backend produces them
+        ...
+
+
+def transcript_segment(id: int, start: float, end: float, text: str) -> dict:
+    return {"id": id, "start": float(start), "end": float(end), "text": text}
+
+
+class WhisperTranscriber:
+    def __init__(self, whisper_model: "Whisper") -> None:
+        self.whisper_model = whisper_model
+
+    def transcribe(self, audio: str | np.ndarray, language: str = "en") -> Transcript:
+        # fp16 is a no-op on cpu other than a warning, cuda keeps the default
+        fp16 = self.whisper_model.device.type != "cpu"
+        transcript = self.whisper_model.transcribe(audio, language=language, fp16=fp16)
+        return {
+            "text": transcript["text"],
+            "language": transcript.get("language", language),
+            "segments": [
+                transcript_segment(s["id"], s["start"], s["end"], s["text"])
+                for s in transcript["segments"]
+            ],
+        }
+
+    def iter_segments(
+        self, audio: str | np.ndarray, language: str = "en"
+    ) -> Iterator[dict]:
+        # whisper only returns once the whole audio is decoded
+        yield from self.transcribe(audio, language=language)["segments"]
+
+
+class FasterWhisperTranscriber:
+    def __init__(self, whisper_model: "WhisperModel", beam_size: int) -> None:
+        self.whisper_model = whisper_model
+        self.beam_size = beam_size
+
+    def transcribe(self, audio: str | np.ndarray, language: str = "en") -> Transcript:
+        segments = list(self.iter_segments(audio, language=language))
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "language": language,
+            "segments": segments,
+        }
+
+    def iter_segments(
+        self, audio: str | np.ndarray, language: str = "en"
+    ) -> Iterator[dict]:
+        # segments are decoded lazily, as the generator is consumed
+        segments, _ = self.whisper_model.transcribe(
+            audio, language=language, beam_size=self.beam_size
+        )
+        for i, s in enumerate(segments):
+            yield transcript_segment(i, s.start, s.end, s.text)
+
+
+def quantize_whisper(whisper_model: "Whisper") -> "Whisper":
+    # dynamic int8 quantization of the linear layers, cpu only
+    import torch
+    import whisper
+
+    # whisper's own Linear subclass, quantize_dynamic matches (and converts)
+    # exact types only. swap them for plain ones sharing the parameters
+    for module in list(whisper_model.modules()):
+        for name, child in module.named_children():
+            if type(child) is whisper.model.Linear:
+                linear = torch.nn.Linear(
+                    child.in_features, child.out_features, bias=child.bias is not None
+                )
+                linear.weight, linear.bias = child.weight, child.bias
+                setattr(module, name, linear)
+    return torch.ao.quantization.quantize_dynamic(
+        whisper_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_transcriber(
+    backend: TranscriptionBackend,
+    size: str,
+    device: str | None = None,
+    compute_type: str = "int8",
+    beam_size: int = 5,
+    cpu_threads: int = 0,
+) -> Transcriber:
+    # model libraries are imported here, by the processes that transcribe
+    match backend:
+        case TranscriptionBackend.WHISPER:
+            import whisper
+
+            return WhisperTranscriber(whisper.load_model(size, device=device))
+        case TranscriptionBackend.WHISPER_INT8:
+            import whisper
+
+            whisper_model = whisper.load_model(size, device="cpu")
+            return WhisperTranscriber(quantize_whisper(whisper_model))
+        case TranscriptionBackend.FASTER_WHISPER:
+            # optional dependency, `pip install vidoso[faster-whisper]`
+            from faster_whisper import WhisperModel
+
+            whisper_model = WhisperModel(
+                size,
+                device=device or "auto",
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+            )
+            return FasterWhisperTranscriber(whisper_model, beam_size=beam_size)
@@ -1,18 +1,23 @@
 import asyncio
+import os
+import threading
+from collections.abc import Coroutine
+from functools import lru_cache
+from typing import Any
 
 from huey import RedisHuey
 
-from vidoso.core.logger import logger
+from vidoso.core.timing import serve_metrics, stage_timings
 from vidoso.deps import (
-    get_dynamodb_client_dep,
-    get_jobs_repo_dep,
-    get_segments_repo_dep,
-    get_sentence_transformer_dep,
+    encoder_options,
+    get_async_redis_dep,
+    get_dynamodb_client_pool_dep,
+    get_io_executor_dep,
+    get_model_registry_dep,
     get_settings_dep,
-    get_whisper_model_dep,
+    transcriber_options,
 )
-from vidoso.repo.schemas import JobStatus
-from vidoso.services.stream_processor import stream_processor_service_fct
+from vidoso.services.model_registry import configure_torch_threads
 
 huey: RedisHuey = RedisHuey(
     "worker",
@@ -21,32 +26,91 @@ huey: RedisHuey = RedisHuey(
 )
 
 
-async def a_process_video_stream(job_id: str) -> None:
-    logger.info(f"a_process_video_stream [{job_id=}]")
+@lru_cache
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    # one loop per worker process, running in its own thread. tasks are run on
+    # it instead of a fresh `asyncio.run` loop each, so clients bound to a loop
+    # (e.g. the aiobotocore connection pool) live as long as the process. with
+    # a thread consumer (`-k thread -w N`) the N tasks share it
+    loop = asyncio.new_event_loop()
+    # `asyncio.to_thread` (downloads, the boto3 client) runs on the io pool
+    loop.set_default_executor(get_io_executor_dep())
+    threading.Thread(target=loop.run_forever, name="worker-loop", daemon=True).start()
+    return loop
 
+
+def run(coro: Coroutine[Any, Any, Any]) -> Any:
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+# startup hooks run in every consumer worker, the process is set up by the first
+STARTUP_LOCK = threading.Lock()
+
+
+@lru_cache
+def start_runtime() -> None:
     settings = get_settings_dep()
-    dynamodb_client = get_dynamodb_client_dep()
-    whisper_model = get_whisper_model_dep(settings=settings)
-    sentence_transformer = get_sentence_transformer_dep(settings=settings)
-    jobs_repo = await get_jobs_repo_dep(dynamodb_client=dynamodb_client)
-    segments_repo = await get_segments_repo_dep(dynamodb_client=dynamodb_client)
-
-    job_db = await jobs_repo.get_by_job_id(job_id=job_id)
-
-    stream_processor_svc = await stream_processor_service_fct(
-        jobs_repo=jobs_repo,
-        segments_repo=segments_repo,
-        whisper_model=whisper_model,
-        sentence_transformer=sentence_transformer,
+    run(get_dynamodb_client_pool_dep().open(settings=settings))
+    stage_timings.configure(
+        emf_namespace=settings.metrics_namespace if settings.metrics_emf else None
     )
-    await stream_processor_svc.process_stream(job_db.stream_url)
-    job_db.status = JobStatus.DONE
-    await jobs_repo.upsert(job=job_db)
-    logger.info(
-        f"a_process_video_stream done! [{job_db.model_dump(exclude=['embedding'])=}]"
+    if settings.worker_metrics_port:
+        serve_metrics(settings.worker_metrics_port)
+    configure_torch_threads(
+        threads=settings.torch_threads
+        or max(
+            1,
+            (os.cpu_count() or 1)
+            // (settings.worker_transcribe_threads + settings.worker_encode_threads),
+        ),
+        interop_threads=settings.torch_interop_threads,
     )
+    get_model_registry_dep().preload(
+        transcribers=[(settings.transcription_backend, settings.whisper_model)],
+        sentence_transformers=[
+            (settings.sentence_transformer_backend, settings.sentence_transformer_model)
+        ],
+        encoder_options=encoder_options(settings),
+        **transcriber_options(settings),
+    )
+
+
+@huey.on_startup()
+def open_clients() -> None:
+    with STARTUP_LOCK:
+        start_runtime()
+
+
+@huey.on_shutdown()
+def close_clients() -> None:
+    run(get_dynamodb_client_pool_dep().close())
+    run(get_async_redis_dep().aclose())
+
+
+# the task bodies live in `vidoso.processing` and are imported when a task runs,
+# so enqueueing (e.g. from the api) never imports the processing stack
 
 
 @huey.task()
-def process_video_stream(job_id: str) -> None:
-    asyncio.run(a_process_video_stream(job_id=job_id))
+def process_video_stream(job_id: str, stream_url: str | None = None) -> None:
+    # `stream_url` lets the audio prefetcher read queued jobs without a db lookup
+    from vidoso.processing import a_process_video_stream
+
+    run(a_process_video_stream(job_id=job_id))
+
+
+@huey.task()
+def train_user_index(user: str) -> None:
+    from vidoso.processing import a_train_user_index
+
+    run(a_train_user_index(user=user))
+
+
+def pending_stream_urls(limit: int) -> list[str]:
+    # stream urls of the next queued video tasks, oldest first
+    return [
+        task.kwargs["stream_url"]
+        for task in huey.pending(limit)
+        if isinstance(task, process_video_stream.task_class)
+        and task.kwargs.get("stream_url")
+    ]
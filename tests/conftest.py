@@ -1 +1,102 @@
-# TODO: :)
+import os
+from collections.abc import Iterator
+from typing import Any
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from vidoso.config import Settings
+from vidoso.repo import jobs, segments, transcripts
+from vidoso.repo.clients import ThreadedDynamoDBClient
+from vidoso.repo.jobs import JobsRepo
+from vidoso.repo.segments import SegmentsRepo
+from vidoso.repo.transcripts import TranscriptsRepo
+
+USER_INDEX = {
+    "IndexName": "user-index",
+    "KeySchema": [
+        {"AttributeName": "user", "KeyType": "HASH"},
+        {"AttributeName": "created_at", "KeyType": "RANGE"},
+    ],
+    "Projection": {"ProjectionType": "ALL"},
+}
+
+
+def create_tables(dynamodb_client: Any) -> None:
+    # the tables and indexes of `make db-local-admin-create-{tables,indexes}`
+    dynamodb_client.create_table(
+        TableName=jobs.TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "job_id", "KeyType": "HASH"},
+            {"AttributeName": "created_at", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "job_id", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "N"},
+            {"AttributeName": "user", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[USER_INDEX],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    dynamodb_client.create_table(
+        TableName=segments.TABLE_NAME,
+        KeySchema=[
+            {"AttributeName": "transcript_id", "KeyType": "HASH"},
+            {"AttributeName": "segment_id", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "transcript_id", "AttributeType": "S"},
+            {"AttributeName": "segment_id", "AttributeType": "N"},
+            {"AttributeName": "user", "AttributeType": "S"},
+            {"AttributeName": "created_at", "AttributeType": "N"},
+        ],
+        GlobalSecondaryIndexes=[USER_INDEX],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    dynamodb_client.create_table(
+        TableName=transcripts.TABLE_NAME,
+        KeySchema=[{"AttributeName": "transcript_key", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "transcript_key", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+@pytest.fixture
+def settings() -> Settings:
+    return Settings(
+        version="test",
+        base_url="/vidoso/v1",
+        docs_url="/docs",
+        openapi_url="/openapi.json",
+        whisper_model="base",
+    )
+
+
+@pytest.fixture
+def dynamodb_client(monkeypatch: pytest.MonkeyPatch) -> Iterator[Any]:
+    # an in memory dynamodb with the app's tables
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", os.environ.get("AWS_REGION", "us-east-1"))
+    with mock_aws():
+        client = boto3.client("dynamodb")
+        create_tables(client)
+        yield ThreadedDynamoDBClient(client)
+
+
+@pytest.fixture
+def jobs_repo(dynamodb_client: Any) -> JobsRepo:
+    return JobsRepo(dynamodb_client=dynamodb_client)
+
+
+@pytest.fixture
+def segments_repo(dynamodb_client: Any) -> SegmentsRepo:
+    return SegmentsRepo(dynamodb_client=dynamodb_client)
+
+
+@pytest.fixture
+def transcripts_repo(dynamodb_client: Any) -> TranscriptsRepo:
+    return TranscriptsRepo(dynamodb_client=dynamodb_client)
@@ -0,0 +1,84 @@
+import asyncio
+import datetime as dt
+from collections.abc import AsyncIterator
+from typing import Any
+
+import numpy as np
+
+from vidoso.repo.schemas import SegmentDb, encode_embedding
+
+BASE = dt.datetime(2024, 1, 24, 13, 55)
+
+
+def make_segments(
+    user: str,
+    n: int,
+    dim: int = 8,
+    transcript_id: str = "t-0",
+    texts: list[str] | None = None,
+    seed: int = 0,
+) -> list[SegmentDb]:
+    # `n` segments of one transcript, a second apart, with binary embeddings
+    vectors = np.random.default_rng(seed).standard_normal((n, dim))
+    segments = []
+    for i, vector in enumerate(vectors):
+        embedding, embedding_format = encode_embedding(vector)
+        segments.append(
+            SegmentDb(
+                transcript_id=transcript_id,
+                segment_id=i,
+                user=user,
+                created_at=BASE + dt.timedelta(seconds=i),
+                stream_url=f"https://www.youtube.com/watch?v={transcript_id}",
+                start=i * 5,
+                end=i * 5 + 5,
+                text=texts[i] if texts else f"segment {i}",
+                embedding=embedding,
+                embedding_format=embedding_format,
+            )
+        )
+    return segments
+
+
+class SlowSegmentsRepo:
+    # a segments table that takes a while to read, counting the reads
+    def __init__(self, segments: list[SegmentDb], delay: float = 0.05) -> None:
+        self.segments = segments
+        self.delay = delay
+        self.reads = 0
+
+    async def iter_pages_by_user(
+        self, user: str, attributes: list[str] | None = None
+    ) -> AsyncIterator[list[SegmentDb]]:
+        self.reads += 1
+        await asyncio.sleep(self.delay)
+        yield [s for s in self.segments if s.user == user]
+
+
+class ScriptedPubSub:
+    # a subscription receiving `messages`, then nothing
+    def __init__(self, messages: list[str]) -> None:
+        self.messages = messages
+
+    async def __aenter__(self) -> "ScriptedPubSub":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        pass
+
+    async def subscribe(self, channel: str) -> None:
+        pass
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        yield {"type": "subscribe", "data": 1}
+        for message in self.messages:
+            yield {"type": "message", "data": message}
+        await asyncio.Event().wait()
+
+
+class ScriptedRedis:
+    def __init__(self, messages: list[str]) -> None:
+        self.messages = messages
+
+    def pubsub(self) -> ScriptedPubSub:
+        return ScriptedPubSub(self.messages)
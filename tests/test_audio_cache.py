@@ -0,0 +1,90 @@
+import gc
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from vidoso.services import audio_cache as audio_cache_module
+from vidoso.services.audio_cache import AudioCache
+
+# pins a cached file from another process until stdin closes
+PIN = """
+import sys
+from pathlib import Path
+from vidoso.services.audio_cache import AudioCache
+
+with AudioCache(sys.argv[1], max_bytes=0).pin(Path(sys.argv[2])):
+    print("pinned", flush=True)
+    sys.stdin.read()
+"""
+
+
+class Stream:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.downloads = 0
+
+    def download(self, output_path: str, filename: str) -> None:
+        self.downloads += 1
+        Path(output_path, filename).write_bytes(b"\0" * self.size)
+
+
+def no_network(stream_url: str) -> None:
+    raise AssertionError(f"pytube was called for {stream_url}")
+
+
+def test_hits_are_keyed_on_the_video(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    audio_cache = AudioCache(str(tmp_path), max_bytes=1024)
+    stream = Stream(size=10)
+    path = audio_cache.fetch("https://www.youtube.com/watch?v=abc", stream=stream)
+    monkeypatch.setattr(audio_cache_module, "audio_stream", no_network)
+
+    # the same video
+    assert audio_cache.fetch("https://youtu.be/abc") == path
+    assert (audio_cache.hits, audio_cache.misses) == (1, 1)
+    assert stream.downloads == 1
+    # no fetch holds its lock anymore
+    gc.collect()
+    assert len(audio_cache.key_locks) == 0
+
+
+def test_files_pinned_by_another_process_are_not_evicted(tmp_path: Path) -> None:
+    audio_cache = AudioCache(str(tmp_path), max_bytes=15)
+    pinned = audio_cache.fetch("https://youtu.be/a", stream=Stream(size=10))
+    src = Path(audio_cache_module.__file__).parents[2]
+    process = subprocess.Popen(
+        [sys.executable, "-c", PIN, str(tmp_path), str(pinned)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "PYTHONPATH": str(src)},
+    )
+    try:
+        assert process.stdout.readline() == "pinned\n"
+
+        # over max_bytes, the least recently used file is pinned
+        other = audio_cache.fetch("https://youtu.be/b", stream=Stream(size=10))
+        assert pinned.exists()
+        assert other.exists()
+    finally:
+        process.communicate()
+
+    audio_cache.evict()
+    assert not pinned.exists()
+    assert other.exists()
+
+
+def test_pinning_an_evicted_file_raises(tmp_path: Path) -> None:
+    audio_cache = AudioCache(str(tmp_path), max_bytes=0)
+    path = audio_cache.fetch("https://youtu.be/a", stream=Stream(size=10))
+
+    audio_cache.evict()
+
+    assert not path.exists()
+    with pytest.raises(FileNotFoundError):
+        with audio_cache.pin(path):
+            pass
@@ -0,0 +1,140 @@
+import asyncio
+from typing import Any
+
+import pytest
+from botocore.exceptions import ClientError
+
+from vidoso.repo.batch_writer import AdaptiveLimiter, BatchWriteError, BatchWriter
+
+
+def client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "BatchWriteItem")
+
+
+class FlakyDynamoDBClient:
+    # leaves the first `unprocessed` items of each of the first `flaky_calls`
+    # requests unprocessed, or raises `error` for them
+    def __init__(
+        self,
+        flaky_calls: int,
+        unprocessed: int = 5,
+        error: ClientError | None = None,
+    ) -> None:
+        self.flaky_calls = flaky_calls
+        self.unprocessed = unprocessed
+        self.error = error
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.written: list[dict[str, Any]] = []
+
+    async def batch_write_item(self, RequestItems: dict[str, Any]) -> dict[str, Any]:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            ((table_name, requests),) = RequestItems.items()
+            if self.calls <= self.flaky_calls:
+                if self.error is not None:
+                    raise self.error
+                self.written += [
+                    r["PutRequest"]["Item"] for r in requests[self.unprocessed :]
+                ]
+                return {"UnprocessedItems": {table_name: requests[: self.unprocessed]}}
+            self.written += [r["PutRequest"]["Item"] for r in requests]
+            return {"UnprocessedItems": {}}
+        finally:
+            self.in_flight -= 1
+
+
+def make_items(n: int) -> list[dict[str, Any]]:
+    return [{"id": {"S": str(i)}} for i in range(n)]
+
+
+def batch_writer(client: FlakyDynamoDBClient, **kwargs: Any) -> BatchWriter:
+    return BatchWriter(dynamodb_client=client, backoff_base_ms=0, **kwargs)
+
+
+async def test_unprocessed_items_are_retried() -> None:
+    client = FlakyDynamoDBClient(flaky_calls=3)
+
+    await batch_writer(client).put_items("t", make_items(60))
+
+    assert sorted(client.written, key=lambda i: int(i["id"]["S"])) == make_items(60)
+    # 3 batches, 3 of their requests left items unprocessed
+    assert client.calls == 6
+
+
+async def test_throttled_requests_are_retried_and_halve_the_limit() -> None:
+    client = FlakyDynamoDBClient(
+        flaky_calls=2, error=client_error("ProvisionedThroughputExceededException")
+    )
+    writer = batch_writer(client, max_in_flight=8)
+
+    await writer.put_items("t", make_items(25))
+
+    assert len(client.written) == 25
+    # halved twice, then one success
+    assert writer.limiter.limit == 3
+
+
+async def test_other_errors_are_raised() -> None:
+    client = FlakyDynamoDBClient(
+        flaky_calls=1, error=client_error("ValidationException")
+    )
+
+    with pytest.raises(ExceptionGroup) as e:
+        await batch_writer(client).put_items("t", make_items(10))
+
+    assert e.group_contains(ClientError)
+    assert client.calls == 1
+
+
+async def test_items_left_after_max_attempts_raise() -> None:
+    client = FlakyDynamoDBClient(flaky_calls=10)
+
+    with pytest.raises(ExceptionGroup) as e:
+        await batch_writer(client, max_attempts=3).put_items("t", make_items(10))
+
+    assert e.group_contains(BatchWriteError)
+    assert client.calls == 3
+
+
+async def test_the_limiter_is_shared_across_calls() -> None:
+    client = FlakyDynamoDBClient(
+        flaky_calls=3, error=client_error("ThrottlingException")
+    )
+    writer = batch_writer(client, max_in_flight=4)
+
+    await writer.put_items("t", make_items(25))
+    limiter = writer.limiter
+    # halved to 1 and back up by one: throttling carries over to the next call
+    assert limiter.limit == 2
+
+    client.max_in_flight = 0
+    await writer.put_items("t", make_items(200))
+
+    assert writer.limiter is limiter
+    assert client.max_in_flight <= limiter.max_limit
+    assert len(client.written) == 225
+
+
+async def test_limiter_bounds_in_flight_requests() -> None:
+    limiter = AdaptiveLimiter(max_limit=2)
+    await limiter.acquire()
+    await limiter.acquire()
+
+    third = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    assert not third.done()
+
+    await limiter.release(throttled=True)
+    await asyncio.sleep(0.01)
+    # the limit is 1 now, with one request still in flight
+    assert not third.done()
+
+    await limiter.release()
+    await third
+    assert limiter.in_flight == 1
+    assert limiter.limit == 2
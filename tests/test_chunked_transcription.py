@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from vidoso.services.chunked_transcription import (
+    AudioChunk,
+    ChunkingOptions,
+    iter_chunks,
+    stitch,
+)
+from vidoso.services.transcription import SAMPLE_RATE, transcript_segment
+
+
+def whisper_like(samples: np.ndarray, segment_seconds: float) -> dict:
+    # segments from 0 to the end of the chunk, like whisper puts them
+    duration = len(samples) / SAMPLE_RATE
+    starts = np.arange(0, duration, segment_seconds)
+    segments = [
+        transcript_segment(i, start, min(start + segment_seconds, duration), f"{i}")
+        for i, start in enumerate(starts)
+    ]
+    return {"text": "", "language": "en", "segments": segments}
+
+
+def covered_gaps(segments: list[dict], duration: float) -> list[tuple[float, float]]:
+    gaps, covered_until = [], 0.0
+    for segment in sorted(segments, key=lambda s: s["start"]):
+        if segment["start"] > covered_until + 1e-6:
+            gaps.append((covered_until, segment["start"]))
+        covered_until = max(covered_until, segment["end"])
+    if covered_until < duration - 1e-6:
+        gaps.append((covered_until, duration))
+    return gaps
+
+
+@pytest.mark.parametrize("overlap_seconds", [1, 4])
+def test_stitch_covers_chunk_boundaries(overlap_seconds: float) -> None:
+    # noise has no silences, every chunk is hard cut at `chunk_seconds`
+    duration = 95
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, duration * SAMPLE_RATE)
+    options = ChunkingOptions(chunk_seconds=30, overlap_seconds=overlap_seconds)
+
+    chunks = list(iter_chunks(audio.astype(np.float32), options))
+    assert len(chunks) == 4
+    segments = list(
+        stitch((chunk, whisper_like(samples, 6)) for chunk, samples in chunks)
+    )
+
+    assert covered_gaps(segments, duration) == []
+    assert [s["id"] for s in segments] == list(range(len(segments)))
+    starts = [s["start"] for s in segments]
+    assert starts == sorted(starts)
+
+
+def test_stitch_keeps_one_copy_of_overlapping_segments() -> None:
+    # the same 2s segment transcribed by both chunks of a 2s overlap
+    first = AudioChunk(offset=0, keep_from=0, keep_until=29)
+    second = AudioChunk(offset=28, keep_from=29, keep_until=float("inf"))
+    results = [
+        (first, {"segments": [transcript_segment(0, 28, 30, "same")]}),
+        (second, {"segments": [transcript_segment(0, 0, 2, "same")]}),
+    ]
+
+    assert [s["text"] for s in stitch(iter(results))] == ["same"]
@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import vidoso
+
+# modules only the processing side (transcription, embedding) may import
+HEAVY_MODULES = [
+    "pytube",
+    "sentence_transformers",
+    "spacy",
+    "torch",
+    "transformers",
+    "whisper",
+]
+
+# generous, a shared ci runner is slow. an ML import alone blows through both
+MAX_IMPORT_SECONDS = 10.0
+MAX_RSS_MB = 600.0
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def slowest_imports(importtime: str, n: int = 5) -> list[str]:
+    # `import time: self [us] | cumulative | imported package` lines, top level
+    # packages only
+    rows = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if "." not in name.strip():
+            rows.append((int(cumulative), name.strip()))
+    return [f"{us / 1000:.1f}ms {name}" for us, name in sorted(rows, reverse=True)[:n]]
+
+
+# the api, and enqueueing tasks
+@pytest.mark.parametrize("module", ["vidoso.main", "vidoso.worker"])
+def test_import_footprint(module: str) -> None:
+    # a fresh interpreter, nothing imported by the tests counts
+    src = Path(vidoso.__file__).parents[1]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": str(src)},
+    )
+    stats = json.loads(result.stdout.splitlines()[-1])
+    slowest = slowest_imports(result.stderr)
+
+    assert [m for m in HEAVY_MODULES if m in stats["modules"]] == []
+    assert stats["seconds"] < MAX_IMPORT_SECONDS, slowest
+    assert stats["rss_kb"] / 1024 < MAX_RSS_MB, slowest
@@ -0,0 +1,133 @@
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+import pytest
+
+from factories import BASE, SlowSegmentsRepo, make_segments
+from vidoso.config import Settings
+from vidoso.repo.schemas import SegmentDb, decode_embeddings
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.index_builder import IndexBuilder
+from vidoso.services.index_cache import IndexCache, IndexShard, SegmentFilter
+from vidoso.services.search import SearchService
+
+DIM = 16
+
+
+def user_index_segments() -> list[SegmentDb]:
+    # two transcripts of 10 segments, of two streams
+    return make_segments("u", 10, dim=DIM, transcript_id="a") + make_segments(
+        "u", 10, dim=DIM, transcript_id="b", seed=1
+    )
+
+
+def brute_force(
+    vectors: np.ndarray, queries: np.ndarray, k: int, mask: np.ndarray
+) -> list[list[int]]:
+    selected = np.flatnonzero(mask)
+    distances = ((queries[:, None, :] - vectors[None, selected, :]) ** 2).sum(-1)
+    top = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return [list(row) + [-1] * (k - len(row)) for row in selected[top].tolist()]
+
+
+def test_filter_masks(settings: Settings) -> None:
+    segments = user_index_segments()
+    user_index = IndexBuilder(settings=settings).build("u", segments)
+
+    def selected(**kwargs: object) -> list[int]:
+        mask = user_index.mask(SegmentFilter(**kwargs))
+        assert mask is not None
+        return np.flatnonzero(mask).tolist()
+
+    assert user_index.mask(SegmentFilter()) is None
+    assert selected(transcript_ids=["b"]) == list(range(10, 20))
+    assert selected(stream_urls=["https://www.youtube.com/watch?v=a"]) == list(
+        range(10)
+    )
+    # inclusive bounds, both transcripts start at BASE
+    assert selected(
+        created_after=BASE + dt.timedelta(seconds=2),
+        created_before=BASE + dt.timedelta(seconds=4),
+    ) == [2, 3, 4, 12, 13, 14]
+    assert selected(
+        transcript_ids=["a"], created_before=BASE + dt.timedelta(seconds=1)
+    ) == [0, 1]
+    assert selected(transcript_ids=["unknown"]) == []
+    assert selected(stream_urls=[]) == []
+
+
+@pytest.mark.parametrize(
+    "selected",
+    [
+        # exact scan, at most max(k, 5%) ids
+        [3, 17, 99, 140],
+        list(range(0, 200, 25)),
+        # bitmap selector
+        list(range(0, 200, 3)),
+        list(range(200)),
+    ],
+)
+@pytest.mark.parametrize("factory", ["Flat", "HNSW16,Flat", "IVF4,Flat"])
+def test_filtered_shard_search_matches_brute_force(
+    factory: str, selected: list[int]
+) -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, DIM)).astype(np.float32)
+    queries = rng.standard_normal((3, DIM)).astype(np.float32)
+    index = faiss.index_factory(DIM, factory)
+    index.train(vectors)
+    if isinstance(index, faiss.IndexIVF):
+        # every list probed, ivf is exact
+        index.nprobe = 4
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = 256
+    shard = IndexShard(index=index, offset=1000)
+    shard.add(vectors, seal=True)
+    mask = np.zeros(200, dtype=bool)
+    mask[selected] = True
+
+    k = 10
+    distances, ids = shard.search(queries, k=k, mask=mask)
+
+    expected = brute_force(vectors, queries, k=k, mask=mask)
+    assert [[i - 1000 if i >= 0 else -1 for i in row] for row in ids.tolist()] == (
+        expected
+    )
+    assert np.all(np.diff(distances[:, : len(selected)], axis=1) >= -1e-5)
+
+
+async def test_filtered_search_across_shards(settings: Settings) -> None:
+    segments = user_index_segments()
+    embeddings = decode_embeddings(segments)
+    search_svc = SearchService(
+        segments_repo=SlowSegmentsRepo(segments, delay=0),
+        encode_batcher=EncodeBatcher(
+            encode=lambda texts: embeddings[[0, 15]], max_batch_size=8, max_wait_ms=1
+        ),
+        index_cache=IndexCache(max_users=8, max_segments=100_000, ttl_seconds=300),
+        index_builder=IndexBuilder(
+            settings=settings.model_copy(update={"search_shard_size": 3})
+        ),
+        executor=ThreadPoolExecutor(max_workers=2),
+    )
+
+    results = await search_svc.search(
+        users=["u"],
+        k=4,
+        text=["a", "b"],
+        embeddings=[],
+        segment_filter=SegmentFilter(
+            transcript_ids=["b"], created_after=BASE + dt.timedelta(seconds=3)
+        ),
+    )
+
+    for row in results["text"]:
+        assert len(row) == 4
+        assert {hit["transcript_id"] for hit in row} == {"b"}
+        assert all(hit["segment_id"] >= 3 for hit in row)
+    # the query embeds as segment 5 of "b"
+    assert results["text"][1][0]["segment_id"] == 5
+    # shards without any segment passing the filters are not searched
+    assert len(results["shards"]) < len((await search_svc.get_user_index("u")).shards)
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from factories import make_segments
+from vidoso.config import SearchIndexType, Settings
+from vidoso.repo.segments import SegmentsRepo
+from vidoso.services.index_builder import IndexBuilder
+
+
+async def test_segments_are_counted_without_reading_them(
+    segments_repo: SegmentsRepo,
+) -> None:
+    await segments_repo.upsert_multi(
+        segments=make_segments("u", 30, dim=16)
+        + make_segments("v", 5, dim=16, transcript_id="t-1")
+    )
+
+    assert await segments_repo.count_by_user("u") == 30
+    assert await segments_repo.count_by_user("v") == 5
+    assert await segments_repo.count_by_user("nobody") == 0
+    assert await segments_repo.embedding_dim_by_user("u") == 16
+    assert await segments_repo.embedding_dim_by_user("nobody") is None
+
+
+def test_training_is_due_once_the_corpus_doubled(
+    settings: Settings, tmp_path: Path
+) -> None:
+    index_builder = IndexBuilder(
+        settings=settings.model_copy(
+            update={
+                "search_index_type": SearchIndexType.IVF_FLAT,
+                "search_index_train_threshold": 50,
+                "search_index_dir": str(tmp_path),
+            }
+        )
+    )
+
+    # below the threshold searches stay flat, nothing to train
+    assert not index_builder.needs_training("u", n=49, dim=16)
+    assert index_builder.needs_training("u", n=80, dim=16)
+
+    assert index_builder.train("u", make_segments("u", 80, dim=16))
+    assert not index_builder.needs_training("u", n=159, dim=16)
+    assert not index_builder.train("u", make_segments("u", 159, dim=16))
+    assert index_builder.needs_training("u", n=160, dim=16)
@@ -0,0 +1,138 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from factories import ScriptedRedis, SlowSegmentsRepo, make_segments
+from vidoso.config import Settings
+from vidoso.repo.schemas import decode_embeddings
+from vidoso.services.index_builder import IndexBuilder
+from vidoso.services.index_cache import IndexCache
+from vidoso.services.index_updates import IndexUpdate, IndexUpdateSubscriber
+from vidoso.services.search import SearchService
+
+
+def search_service(
+    segments_repo: SlowSegmentsRepo, index_cache: IndexCache, settings: Settings
+) -> SearchService:
+    return SearchService(
+        segments_repo=segments_repo,
+        encode_batcher=None,
+        index_cache=index_cache,
+        index_builder=IndexBuilder(settings=settings),
+        executor=ThreadPoolExecutor(max_workers=2),
+    )
+
+
+def new_index_cache() -> IndexCache:
+    return IndexCache(max_users=8, max_segments=100_000, ttl_seconds=300)
+
+
+def test_index_update_round_trip() -> None:
+    segments = make_segments("u", 5)
+    update = IndexUpdate.model_validate_json(
+        IndexUpdate.from_segments("u", segments).model_dump_json()
+    )
+
+    assert update.user == "u"
+    assert [s.segment_id for s in update.segments] == list(range(5))
+    assert all(s.embedding is None for s in update.segments)
+    np.testing.assert_array_equal(
+        update.decode_embeddings(), decode_embeddings(segments)
+    )
+
+
+async def test_published_segments_extend_the_resident_index(
+    settings: Settings,
+) -> None:
+    segments = make_segments("u", 10)
+    index_cache = new_index_cache()
+    search_svc = search_service(SlowSegmentsRepo(segments[:6]), index_cache, settings)
+    assert (await search_svc.get_user_index("u")).size == 6
+
+    subscriber = IndexUpdateSubscriber(
+        redis_client=None, channel="updates", index_cache=index_cache
+    )
+    data = IndexUpdate.from_segments("u", segments[4:]).model_dump_json()
+    await subscriber._apply(data)
+    # idempotent, e.g. a batch published twice
+    await subscriber._apply(data)
+
+    user_index = index_cache.get("u")
+    assert user_index.size == 10
+    np.testing.assert_allclose(
+        user_index.get_embeddings(list(range(10))),
+        decode_embeddings(segments),
+        rtol=1e-6,
+    )
+
+
+async def test_a_failing_update_does_not_stop_the_subscriber(
+    settings: Settings,
+) -> None:
+    class FailingIndexCache(IndexCache):
+        def add(self, user: str, *args: Any, **kwargs: Any) -> None:
+            if user == "boom":
+                raise RuntimeError(user)
+            super().add(user, *args, **kwargs)
+
+    segments = make_segments("u", 10)
+    index_cache = FailingIndexCache(max_users=8, max_segments=100_000, ttl_seconds=300)
+    search_svc = search_service(SlowSegmentsRepo(segments[:6]), index_cache, settings)
+    await search_svc.get_user_index("u")
+    messages = [
+        "not an update",
+        IndexUpdate.from_segments("boom", make_segments("boom", 2)).model_dump_json(),
+        IndexUpdate.from_segments("u", segments[6:]).model_dump_json(),
+    ]
+    subscriber = IndexUpdateSubscriber(
+        redis_client=ScriptedRedis(messages), channel="updates", index_cache=index_cache
+    )
+
+    subscriber.start()
+    try:
+        async with asyncio.timeout(5):
+            while index_cache.get("u").size < 10:
+                await asyncio.sleep(0.01)
+        assert not subscriber.task.done()
+    finally:
+        await subscriber.close()
+
+
+async def test_updates_for_users_not_resident_are_skipped() -> None:
+    index_cache = new_index_cache()
+    segments = make_segments("u", 3)
+    index_cache.add("u", segments, decode_embeddings(segments))
+
+    assert index_cache.get("u") is None
+    assert index_cache.pending == {}
+
+
+async def test_concurrent_misses_build_the_index_once(settings: Settings) -> None:
+    segments_repo = SlowSegmentsRepo(make_segments("u", 20))
+    index_cache = new_index_cache()
+    search_svc = search_service(segments_repo, index_cache, settings)
+
+    user_indexes = await asyncio.gather(
+        *(search_svc.get_user_index("u") for _ in range(8))
+    )
+
+    assert segments_repo.reads == 1
+    assert all(user_index is user_indexes[0] for user_index in user_indexes)
+
+
+async def test_segments_added_during_a_build_are_applied(settings: Settings) -> None:
+    # written after the build read the table, published before it finished
+    segments = make_segments("u", 12)
+    segments_repo = SlowSegmentsRepo(segments[:8], delay=0.1)
+    index_cache = new_index_cache()
+    search_svc = search_service(segments_repo, index_cache, settings)
+
+    build = asyncio.create_task(search_svc.get_user_index("u"))
+    await asyncio.sleep(0.02)
+    index_cache.add("u", segments[8:], decode_embeddings(segments[8:]))
+    user_index = await build
+
+    assert user_index.size == 12
+    assert index_cache.pending == {}
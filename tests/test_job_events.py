@@ -0,0 +1,174 @@
+import asyncio
+import datetime as dt
+from collections.abc import AsyncIterator
+from typing import Any
+
+from factories import ScriptedRedis
+from vidoso.repo.jobs import JobsRepo
+from vidoso.repo.schemas import JobDb, JobProgress, JobStatus
+from vidoso.services.job_events import JobEvent, JobEventHub
+
+BASE = dt.datetime(2024, 1, 24, 13, 55)
+
+
+class IdlePubSub:
+    # a subscription no event is ever published to, events are dispatched by hand
+    async def __aenter__(self) -> "IdlePubSub":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        pass
+
+    async def subscribe(self, channel: str) -> None:
+        pass
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        await asyncio.Event().wait()
+        yield {}
+
+
+class IdleRedis:
+    def pubsub(self) -> IdlePubSub:
+        return IdlePubSub()
+
+
+def make_job(
+    job_id: str,
+    user: str = "u",
+    status: JobStatus = JobStatus.PROCESSING,
+    progress: JobProgress | None = JobProgress.TRANSCRIBING,
+) -> JobDb:
+    return JobDb(
+        job_id=job_id,
+        user=user,
+        created_at=BASE,
+        status=status,
+        stream_url=f"https://www.youtube.com/watch?v={job_id}",
+        progress=progress,
+    )
+
+
+def publish(hub: JobEventHub, job: JobDb) -> JobEvent:
+    event = JobEvent.from_job(job)
+    hub._dispatch(event.model_dump_json())
+    return event
+
+
+async def collect(events: AsyncIterator[JobEvent | None]) -> list[JobEvent | None]:
+    return [event async for event in events]
+
+
+async def test_events_are_fanned_out_to_the_user_subscribers() -> None:
+    hub = JobEventHub(redis_client=IdleRedis(), channel="events")
+    with hub.subscribe("u") as a, hub.subscribe("u") as b, hub.subscribe("v") as c:
+        event = publish(hub, make_job("job-0"))
+
+        assert a.get_nowait() == event
+        assert b.get_nowait() == event
+        assert c.empty()
+    assert hub.subscribers == {}
+    await hub.close()
+
+
+async def test_a_failing_event_does_not_stop_the_subscription() -> None:
+    class FailingJobEventHub(JobEventHub):
+        def _dispatch(self, data: bytes | str) -> None:
+            if "boom" in str(data):
+                raise RuntimeError(data)
+            super()._dispatch(data)
+
+    messages = [
+        JobEvent.from_job(make_job(job_id)).model_dump_json()
+        for job_id in ["boom", "job-0"]
+    ]
+    hub = FailingJobEventHub(redis_client=ScriptedRedis(messages), channel="events")
+
+    with hub.subscribe("u") as queue:
+        async with asyncio.timeout(5):
+            event = await queue.get()
+    assert event.job_id == "job-0"
+    assert not hub.task.done()
+    await hub.close()
+
+
+async def test_events_end_once_the_jobs_are_done(jobs_repo: JobsRepo) -> None:
+    hub = JobEventHub(redis_client=IdleRedis(), channel="events")
+    await jobs_repo.upsert_multi(jobs=[make_job("job-0"), make_job("job-1")])
+
+    async def worker() -> None:
+        await asyncio.sleep(0.05)
+        publish(hub, make_job("job-0", progress=JobProgress.WAITING))
+        publish(hub, make_job("job-2"))
+        publish(
+            hub, make_job("job-0", status=JobStatus.DONE, progress=JobProgress.DONE)
+        )
+        publish(hub, make_job("job-1", progress=JobProgress.FAILED))
+
+    events = hub.events("u", jobs_repo=jobs_repo, job_ids=["job-0", "job-1"])
+    found, _ = await asyncio.gather(asyncio.wait_for(collect(events), 5), worker())
+
+    # the state read from the db, then the events of the two jobs only
+    assert [(e.job_id, e.progress) for e in found] == [
+        ("job-0", JobProgress.TRANSCRIBING),
+        ("job-1", JobProgress.TRANSCRIBING),
+        ("job-0", JobProgress.WAITING),
+        ("job-0", JobProgress.DONE),
+        ("job-1", JobProgress.FAILED),
+    ]
+    await hub.close()
+
+
+async def test_jobs_done_already_finish_right_away(jobs_repo: JobsRepo) -> None:
+    # done before this process subscribed, none of their events are resident
+    hub = JobEventHub(redis_client=IdleRedis(), channel="events")
+    await jobs_repo.upsert_multi(
+        jobs=[
+            make_job("job-0", status=JobStatus.DONE, progress=JobProgress.DONE),
+            # from before jobs had a progress
+            make_job("job-1", status=JobStatus.DONE, progress=None),
+        ]
+    )
+    job_ids = ["job-0", "job-1", "job-unknown"]
+    after = dt.datetime.now(dt.UTC)
+
+    events = await asyncio.wait_for(
+        collect(hub.events("u", jobs_repo=jobs_repo, job_ids=job_ids, after=after)),
+        1,
+    )
+    assert sorted(e.job_id for e in events) == ["job-0", "job-1"]
+
+    waited = await asyncio.wait_for(
+        hub.wait("u", jobs_repo=jobs_repo, job_ids=job_ids, after=after, timeout=30),
+        1,
+    )
+    assert sorted(e.job_id for e in waited) == ["job-0", "job-1"]
+    await hub.close()
+
+
+async def test_wait_returns_the_next_event(jobs_repo: JobsRepo) -> None:
+    hub = JobEventHub(redis_client=IdleRedis(), channel="events")
+    await jobs_repo.upsert_multi(jobs=[make_job("job-0")])
+    after = dt.datetime.now(dt.UTC)
+
+    async def worker() -> JobEvent:
+        await asyncio.sleep(0.05)
+        return publish(hub, make_job("job-0", progress=JobProgress.WAITING))
+
+    waited, event = await asyncio.gather(
+        hub.wait("u", jobs_repo=jobs_repo, job_ids=["job-0"], after=after, timeout=5),
+        worker(),
+    )
+    assert waited == [event]
+    await hub.close()
+
+
+async def test_wait_times_out_empty(jobs_repo: JobsRepo) -> None:
+    hub = JobEventHub(redis_client=IdleRedis(), channel="events")
+    await jobs_repo.upsert_multi(jobs=[make_job("job-0")])
+    after = dt.datetime.now(dt.UTC)
+
+    waited = await hub.wait(
+        "u", jobs_repo=jobs_repo, job_ids=["job-0"], after=after, timeout=0.1
+    )
+    assert waited == []
+    await hub.close()
@@ -0,0 +1,99 @@
+import datetime as dt
+from decimal import Decimal
+from typing import Any
+
+import pytest
+
+from vidoso.repo.jobs import JobsRepo
+from vidoso.repo.pagination import split_range
+from vidoso.repo.schemas import JobDb, JobStatus, SegmentDb
+from vidoso.repo.segments import SegmentsRepo
+
+BASE = dt.datetime(2024, 1, 24, 13, 55, 0, 250_000)
+
+
+def test_split_range_bounds_are_contiguous() -> None:
+    start, end = Decimal("1706104500.25"), Decimal("1706104530")
+    ranges = split_range(start, end, parts=4)
+
+    assert len(ranges) == 4
+    assert ranges[0][0] == start
+    assert ranges[-1][1] == end
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+@pytest.mark.parametrize("parallel_ranges", [2, 3, 4, 7])
+async def test_parallel_jobs_pagination_matches_serial(
+    dynamodb_client: Any, parallel_ranges: int
+) -> None:
+    # half a second apart, most jobs fall between whole seconds
+    await JobsRepo(dynamodb_client=dynamodb_client).upsert_multi(
+        jobs=[
+            JobDb(
+                job_id=f"job-{i}",
+                user="u",
+                created_at=BASE + dt.timedelta(seconds=i / 2),
+                status=JobStatus.DONE,
+                stream_url=f"https://www.youtube.com/watch?v={i}",
+            )
+            for i in range(40)
+        ]
+    )
+
+    async def job_ids(repo: JobsRepo, **kwargs: Any) -> list[str]:
+        jobs = await repo.get_multi_by_user(user="u", **kwargs)
+        return [job.job_id for job in jobs.jobs]
+
+    serial = JobsRepo(dynamodb_client=dynamodb_client, page_size=7)
+    parallel = JobsRepo(
+        dynamodb_client=dynamodb_client,
+        page_size=7,
+        parallel_ranges=parallel_ranges,
+    )
+    for kwargs in (
+        {},
+        {"created_before": BASE + dt.timedelta(seconds=30)},
+        {
+            "created_after": BASE + dt.timedelta(seconds=3),
+            "created_before": BASE + dt.timedelta(seconds=12),
+        },
+    ):
+        expected = await job_ids(serial, **kwargs)
+        assert expected
+        assert await job_ids(parallel, **kwargs) == expected
+    assert len(await job_ids(parallel)) == 40
+
+
+@pytest.mark.parametrize("parallel_ranges", [2, 5])
+async def test_parallel_segments_pagination_matches_serial(
+    dynamodb_client: Any, parallel_ranges: int
+) -> None:
+    await SegmentsRepo(dynamodb_client=dynamodb_client).upsert_multi(
+        segments=[
+            SegmentDb(
+                transcript_id=f"t-{i // 10}",
+                segment_id=i % 10,
+                user="u",
+                created_at=BASE + dt.timedelta(seconds=i / 3),
+                stream_url="https://www.youtube.com/watch?v=x",
+                start=i,
+                end=i + 1,
+                text=f"segment {i}",
+            )
+            for i in range(50)
+        ]
+    )
+
+    async def segment_keys(repo: SegmentsRepo) -> list[tuple[str, int]]:
+        segments = await repo.get_multi_by_user(user="u")
+        return [(s.transcript_id, s.segment_id) for s in segments.segments]
+
+    serial = SegmentsRepo(dynamodb_client=dynamodb_client, page_size=6)
+    parallel = SegmentsRepo(
+        dynamodb_client=dynamodb_client,
+        page_size=6,
+        parallel_ranges=parallel_ranges,
+    )
+    expected = await segment_keys(serial)
+    assert len(expected) == 50
+    assert await segment_keys(parallel) == expected
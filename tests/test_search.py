@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+import pytest
+
+from factories import SlowSegmentsRepo, make_segments
+from vidoso import deps
+from vidoso.config import Settings
+from vidoso.repo.schemas import decode_embeddings
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.index_builder import IndexBuilder
+from vidoso.services.index_cache import IndexCache
+from vidoso.services.lexical_index import LexicalIndex
+from vidoso.services.search import SearchMode, SearchService, rrf_fuse
+
+TEXTS = [
+    "the cat sat on the mat",
+    "dogs chase cats around the yard",
+    "stock markets fell sharply today",
+    "a recipe for banana bread",
+    "the mat was red and the cat was black",
+    "interest rates and the stock market",
+]
+
+
+def unloaded_encode(texts: list[str]) -> np.ndarray:
+    raise AssertionError("the encoder was used")
+
+
+def search_service(
+    settings: Settings, encode: Any = unloaded_encode, **kwargs: Any
+) -> SearchService:
+    segments = make_segments("u", len(TEXTS), texts=TEXTS, **kwargs)
+    return SearchService(
+        segments_repo=SlowSegmentsRepo(segments, delay=0),
+        encode_batcher=EncodeBatcher(encode=encode, max_batch_size=8, max_wait_ms=1),
+        index_cache=IndexCache(max_users=8, max_segments=100_000, ttl_seconds=300),
+        index_builder=IndexBuilder(settings=settings),
+        executor=ThreadPoolExecutor(max_workers=2),
+    )
+
+
+def hit_texts(results: dict) -> list[list[str]]:
+    return [[hit["text"] for hit in row] for row in results["text"]]
+
+
+def test_the_encoder_is_resolved_on_first_encode(
+    monkeypatch: pytest.MonkeyPatch, settings: Settings
+) -> None:
+    loads = []
+
+    class EmbeddingCache:
+        def encode(self, model: str, texts: list[str], **options: Any) -> np.ndarray:
+            return np.zeros((len(texts), 8), dtype=np.float32)
+
+    monkeypatch.setattr(
+        deps,
+        "get_sentence_transformer_dep",
+        lambda settings: loads.append(settings) or "model",
+    )
+    monkeypatch.setattr(deps, "get_embedding_cache_dep", EmbeddingCache)
+
+    encode = deps.lazy_encode(settings, batch_size=4)
+    assert loads == []
+
+    assert encode(["a", "b"]).shape == (2, 8)
+    assert loads == [settings]
+
+
+async def test_lexical_search_never_encodes(settings: Settings) -> None:
+    search_svc = search_service(settings)
+
+    results = await search_svc.search(
+        users=["u"], k=2, text=["cat mat"], embeddings=[], mode=SearchMode.LEXICAL
+    )
+
+    assert set(hit_texts(results)[0]) == {TEXTS[0], TEXTS[4]}
+    with pytest.raises(AssertionError):
+        await search_svc.search(
+            users=["u"], k=2, text=["cat mat"], embeddings=[], mode=SearchMode.HYBRID
+        )
+
+
+def test_rrf_fuse_favours_hits_ranked_by_both() -> None:
+    semantic = [[("u", 0), ("u", 1), ("u", 2)], [("u", 5)]]
+    lexical = [[("u", 2), ("u", 0), ("u", 3)], [("u", 4), ("u", 5)]]
+
+    fused = rrf_fuse([semantic, lexical], k=3)
+
+    # one row per query, cut to k
+    assert fused == [[("u", 0), ("u", 2), ("u", 1)], [("u", 5), ("u", 4)]]
+
+
+def test_bm25_ranks_matches() -> None:
+    lexical_index = LexicalIndex()
+    lexical_index.add(TEXTS)
+
+    scores, ids = lexical_index.search(["cat mat", "the", "banana"], k=3)
+
+    # both terms, the shorter document first (no stemming, "cats" is not a
+    # match). stop words match nothing, rows are padded with -1 ids
+    assert ids.tolist() == [[0, 4, -1], [-1, -1, -1], [3, -1, -1]]
+    assert scores[0, 0] > scores[0, 1] > 0
+    assert scores[1].tolist() == [0, 0, 0]
+
+
+def test_bm25_search_honours_the_mask() -> None:
+    lexical_index = LexicalIndex()
+    lexical_index.add(TEXTS)
+    mask = np.ones(len(TEXTS), dtype=bool)
+    mask[0] = False
+
+    _, ids = lexical_index.search(["cat mat"], k=3, mask=mask)
+
+    assert ids.tolist() == [[4, -1, -1]]
+
+
+async def test_hybrid_search_fuses_semantic_and_lexical_hits(
+    settings: Settings,
+) -> None:
+    # the query embeds like the banana bread segment, and only matches the
+    # stock market ones lexically
+    banana = decode_embeddings(make_segments("u", len(TEXTS), texts=TEXTS))[3]
+    search_svc = search_service(
+        settings, encode=lambda texts: np.array([banana] * len(texts))
+    )
+
+    async def search(mode: SearchMode) -> list[str]:
+        results = await search_svc.search(
+            users=["u"], k=3, text=["stock market"], embeddings=[], mode=mode
+        )
+        return hit_texts(results)[0]
+
+    assert (await search(SearchMode.SEMANTIC))[0] == TEXTS[3]
+    assert set(await search(SearchMode.LEXICAL)) == {TEXTS[2], TEXTS[5]}
+    assert set(await search(SearchMode.HYBRID)) == {TEXTS[2], TEXTS[3], TEXTS[5]}
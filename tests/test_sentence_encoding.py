@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from vidoso.config import EncoderBackend
+from vidoso.services.sentence_encoding import (
+    export_sentence_transformer,
+    load_sentence_transformer,
+)
+
+# the onnx extra, `pip install vidoso[onnx]`
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("optimum.onnxruntime")
+
+TEXTS = ["the cat sat", "on the mat"]
+
+
+def tiny_sentence_transformer(path: Path) -> str:
+    # random weights, nothing downloaded
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Pooling, Transformer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "the", "cat", "sat", "on"]
+    path.mkdir()
+    (path / "vocab.txt").write_text("\n".join(vocab))
+    BertTokenizerFast(vocab_file=str(path / "vocab.txt")).save_pretrained(path)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=32,
+    )
+    BertModel(config).save_pretrained(path)
+    sentence_transformer = SentenceTransformer(
+        modules=[Transformer(str(path)), Pooling(config.hidden_size)]
+    )
+    sentence_transformer.save(str(path / "st"))
+    return str(path / "st")
+
+
+def test_onnx_backends_encode_like_torch(tmp_path: Path) -> None:
+    name = tiny_sentence_transformer(tmp_path / "model")
+    export_dir = str(tmp_path / "encoders")
+    expected = load_sentence_transformer(name, EncoderBackend.TORCH).encode(TEXTS)
+
+    onnx = load_sentence_transformer(name, EncoderBackend.ONNX, export_dir=export_dir)
+    np.testing.assert_allclose(onnx.encode(TEXTS), expected, atol=1e-4)
+
+    with pytest.raises(FileNotFoundError):
+        load_sentence_transformer(name, EncoderBackend.ONNX_INT8, export_dir=export_dir)
+    export_sentence_transformer(name, directory=export_dir, quantization="avx2")
+    int8 = load_sentence_transformer(
+        name, EncoderBackend.ONNX_INT8, export_dir=export_dir, quantization="avx2"
+    )
+    assert int8.encode(TEXTS).shape == expected.shape
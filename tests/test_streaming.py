@@ -0,0 +1,34 @@
+from collections.abc import AsyncIterator
+
+import pytest
+from pydantic import BaseModel
+
+from vidoso.routes.v1.streaming import json_list_response
+
+
+class Item(BaseModel):
+    id: int
+    note: str | None = None
+
+
+async def items(n: int, fail_at: int | None = None) -> AsyncIterator[Item]:
+    for i in range(n):
+        if i == fail_at:
+            raise RuntimeError("page read failed")
+        yield Item(id=i, note="odd" if i % 2 else None)
+
+
+async def body(n: int) -> str:
+    response = await json_list_response(key="items", items=items(n))
+    return "".join([chunk async for chunk in response.body_iterator])
+
+
+async def test_json_list_response_renders_items_without_none() -> None:
+    assert await body(3) == '{"items":[{"id":0},{"id":1,"note":"odd"},{"id":2}]}'
+    assert await body(0) == '{"items":[]}'
+
+
+async def test_json_list_response_raises_before_the_response_starts() -> None:
+    # a failing first page is a plain exception, mapped to an error status
+    with pytest.raises(RuntimeError):
+        await json_list_response(key="items", items=items(3, fail_at=0))
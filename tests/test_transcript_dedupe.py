@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+import datetime as dt
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from vidoso.repo.jobs import JobsRepo
+from vidoso.repo.schemas import JobDb, JobStatus, TranscriptDb, TranscriptStatus
+from vidoso.repo.segments import SegmentsRepo
+from vidoso.repo.transcripts import TranscriptsRepo
+from vidoso.services.encode_batcher import EncodeBatcher
+from vidoso.services.stream_processor import (
+    IngestOutcome,
+    StreamProcessorService,
+    transcript_key,
+)
+from vidoso.services.transcription import transcript_segment
+
+
+class Transcriber:
+    # `segments` segments for any audio, counting the transcriptions. each one
+    # takes `delay` seconds
+    def __init__(self, segments: int = 6, delay: float = 0) -> None:
+        self.segments = segments
+        self.delay = delay
+        self.calls = 0
+
+    def iter_segments(self, audio: str, language: str = "en") -> Iterator[dict]:
+        self.calls += 1
+        for i in range(self.segments):
+            time.sleep(self.delay)
+            yield transcript_segment(i, i * 5, i * 5 + 5, f"segment {i}")
+
+
+class AudioCache:
+    def fetch(self, stream_url: str) -> Path:
+        return Path(os.devnull)
+
+    @contextlib.contextmanager
+    def pin(self, path: Path) -> Iterator[Path]:
+        yield path
+
+
+def encode(texts: list[str]) -> np.ndarray:
+    return np.array([[len(text), i, 1, 0] for i, text in enumerate(texts)], "f4")
+
+
+def stream_processor(
+    jobs_repo: JobsRepo,
+    segments_repo: SegmentsRepo,
+    transcripts_repo: TranscriptsRepo,
+    transcriber: Transcriber,
+    **kwargs: Any,
+) -> StreamProcessorService:
+    return StreamProcessorService(
+        jobs_repo=jobs_repo,
+        segments_repo=segments_repo,
+        transcriber=transcriber,
+        encode_batcher=EncodeBatcher(encode=encode, max_batch_size=8, max_wait_ms=1),
+        audio_cache=AudioCache(),
+        transcripts_repo=transcripts_repo,
+        transcript_version="test",
+        embed_batch_size=2,
+        **kwargs,
+    )
+
+
+def make_job(job_id: str, user: str, stream_url: str) -> JobDb:
+    return JobDb(
+        job_id=job_id,
+        user=user,
+        created_at=dt.datetime.now(),
+        status=JobStatus.PROCESSING,
+        stream_url=stream_url,
+    )
+
+
+async def test_a_stream_is_transcribed_once(
+    jobs_repo: JobsRepo,
+    segments_repo: SegmentsRepo,
+    transcripts_repo: TranscriptsRepo,
+) -> None:
+    transcriber = Transcriber()
+    processor = stream_processor(
+        jobs_repo, segments_repo, transcripts_repo, transcriber
+    )
+    first = make_job("job-0", "u", "https://www.youtube.com/watch?v=abc&t=10")
+    # the same video
+    second = make_job("job-1", "v", "https://youtu.be/abc")
+
+    assert await processor.process_job(first) == IngestOutcome.TRANSCRIBED
+    assert await processor.process_job(second) == IngestOutcome.COPIED
+    # a resubmission of a user's stream ends up with the same segments
+    assert await processor.process_job(second) == IngestOutcome.COPIED
+
+    assert transcriber.calls == 1
+    assert first.segments_done == second.segments_done == 6
+    segments = await segments_repo.get_multi_by_user(user="v")
+    assert sorted(s.text for s in segments.segments) == [
+        f"segment {i}" for i in range(6)
+    ]
+    assert all(s.embedding is not None for s in segments.segments)
+
+
+async def test_jobs_wait_for_a_running_transcription(
+    jobs_repo: JobsRepo,
+    segments_repo: SegmentsRepo,
+    transcripts_repo: TranscriptsRepo,
+) -> None:
+    processor = stream_processor(
+        jobs_repo, segments_repo, transcripts_repo, Transcriber(delay=0.1)
+    )
+    stream_url = "https://www.youtube.com/watch?v=abc"
+
+    running = asyncio.create_task(
+        processor.process_job(make_job("job-0", "u", stream_url))
+    )
+    await asyncio.sleep(0.05)
+
+    assert (
+        await processor.process_job(make_job("job-1", "v", stream_url))
+        == IngestOutcome.IN_PROGRESS
+    )
+    assert await running == IngestOutcome.TRANSCRIBED
+
+
+async def test_a_stale_claim_is_taken_over(
+    jobs_repo: JobsRepo,
+    segments_repo: SegmentsRepo,
+    transcripts_repo: TranscriptsRepo,
+) -> None:
+    stream_url = "https://www.youtube.com/watch?v=abc"
+    # claimed by a job whose worker died an hour ago
+    dead = TranscriptDb(
+        transcript_key=transcript_key(stream_url, "test"),
+        transcript_id="t-dead",
+        stream_url=stream_url,
+        status=TranscriptStatus.PROCESSING,
+        job_id="job-dead",
+        updated_at=dt.datetime.now() - dt.timedelta(hours=1),
+    )
+    assert await transcripts_repo.claim(dead, stale_before=dt.datetime.now()) is None
+    processor = stream_processor(
+        jobs_repo,
+        segments_repo,
+        transcripts_repo,
+        Transcriber(),
+        claim_ttl_seconds=600,
+    )
+
+    outcome = await processor.process_job(make_job("job-0", "u", stream_url))
+
+    assert outcome == IngestOutcome.TRANSCRIBED
+    transcript = await transcripts_repo.get_by_transcript_key(dead.transcript_key)
+    assert transcript.job_id == "job-0"
+    assert transcript.status == TranscriptStatus.DONE
+    # the dead job's heartbeat no longer lands
+    assert not await transcripts_repo.refresh_claim(dead)
+
+
+async def test_a_running_transcription_keeps_its_claim(
+    jobs_repo: JobsRepo,
+    segments_repo: SegmentsRepo,
+    transcripts_repo: TranscriptsRepo,
+) -> None:
+    # the transcription runs longer than the claim ttl, its written batches
+    # refresh the claim
+    ttl = 0.6
+    processor = stream_processor(
+        jobs_repo,
+        segments_repo,
+        transcripts_repo,
+        Transcriber(segments=8, delay=0.2),
+        claim_ttl_seconds=ttl,
+    )
+    stream_url = "https://www.youtube.com/watch?v=abc"
+    key = transcript_key(stream_url, "test")
+
+    running = asyncio.create_task(
+        processor.process_job(make_job("job-0", "u", stream_url))
+    )
+    claimed = time.time()
+    # until a written batch refreshed the claim
+    async with asyncio.timeout(5):
+        while True:
+            transcript = await transcripts_repo.get_by_transcript_key(key)
+            if transcript and transcript.updated_at.timestamp() > claimed + ttl:
+                break
+            await asyncio.sleep(0.02)
+
+    waiting = stream_processor(
+        jobs_repo,
+        segments_repo,
+        transcripts_repo,
+        Transcriber(),
+        claim_ttl_seconds=ttl,
+    )
+    assert (
+        await waiting.process_job(make_job("job-1", "v", stream_url))
+        == IngestOutcome.IN_PROGRESS
+    )
+    assert await running == IngestOutcome.TRANSCRIBED
+
+
+async def test_a_transcription_taken_over_waits_for_the_new_claim(
+    jobs_repo: JobsRepo,
+    segments_repo: SegmentsRepo,
+    transcripts_repo: TranscriptsRepo,
+) -> None:
+    processor = stream_processor(
+        jobs_repo, segments_repo, transcripts_repo, Transcriber(delay=0.1)
+    )
+    stream_url = "https://www.youtube.com/watch?v=abc"
+    key = transcript_key(stream_url, "test")
+
+    running = asyncio.create_task(
+        processor.process_job(make_job("job-0", "u", stream_url))
+    )
+    await asyncio.sleep(0.15)
+    # another worker took the claim for stale, e.g. after a long gc pause
+    takeover = TranscriptDb(
+        transcript_key=key,
+        transcript_id="t-1",
+        stream_url=stream_url,
+        status=TranscriptStatus.PROCESSING,
+        job_id="job-1",
+        updated_at=dt.datetime.now(),
+    )
+    stale_before = dt.datetime.now() + dt.timedelta(hours=1)
+    assert await transcripts_repo.claim(takeover, stale_before=stale_before) is None
+
+    assert await running == IngestOutcome.IN_PROGRESS
+    transcript = await transcripts_repo.get_by_transcript_key(key)
+    assert transcript.job_id == "job-1"
+    assert transcript.status == TranscriptStatus.PROCESSING
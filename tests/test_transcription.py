@@ -0,0 +1,45 @@
+import pytest
+
+from vidoso.services.transcription import quantize_whisper
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+
+
+def tiny_whisper() -> "whisper.Whisper":
+    # random weights, nothing downloaded
+    torch.manual_seed(0)
+    dims = whisper.model.ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=16,
+        n_audio_state=32,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=64,
+        n_text_ctx=8,
+        n_text_state=32,
+        n_text_head=2,
+        n_text_layer=1,
+    )
+    whisper_model = whisper.model.Whisper(dims)
+    # allocated with torch.empty, loaded from the checkpoint otherwise
+    torch.nn.init.normal_(whisper_model.decoder.positional_embedding, std=0.02)
+    return whisper_model
+
+
+def test_quantize_whisper_converts_every_linear_layer() -> None:
+    whisper_model = tiny_whisper()
+    mel = torch.randn(1, 80, 32)
+    tokens = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        expected = whisper_model(mel, tokens)
+
+    quantized = quantize_whisper(whisper_model)
+
+    modules = list(quantized.modules())
+    assert [m for m in modules if isinstance(m, torch.nn.Linear)] == []
+    assert any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in modules)
+    with torch.no_grad():
+        logits = quantized(mel, tokens)
+    assert logits.shape == expected.shape
+    assert torch.allclose(logits, expected, atol=0.5)